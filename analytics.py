@@ -0,0 +1,192 @@
+from datetime import date
+
+# numpy 是可选依赖，第一次使用时才导入（命令行模式用不到统计分析，不必付出导入时间）
+np = None
+_numpy_checked = False
+
+
+def available():
+    """numpy 是否可用（第一次调用时导入），没有安装时统计分析不可用，其余功能不受影响"""
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            pass
+    return np is not None
+
+
+def toOrdinal(date_str):
+    return date.fromisoformat(date_str).toordinal()
+
+
+def weekdayOf(ordinals):
+    """日期序号对应的星期（0=星期一），公元1年1月1日是星期一"""
+    return (ordinals - 1) % 7
+
+
+class CompletionMatrix:
+    """任务 × 日期的完成矩阵，统计分析全部基于它做向量运算
+
+    行是任务，列是从最早日期开始的连续日期，值为是否完成。只建立一次，
+    之后打卡时原地修改一个元素；行和列按倍数预留空间，添加任务或日期
+    变化时很少需要重新分配。
+    """
+
+    def __init__(self, completions, start_date, today=None):
+        # completions: {任务id: 按顺序排列的完成日期序号}
+        if not available():
+            raise RuntimeError('统计分析需要安装 numpy')
+        self.today = today if today is not None else date.today().toordinal()
+        self.start = toOrdinal(start_date)
+        earliest = min([self.start] + [ordinals[0] for ordinals in completions.values() if ordinals])
+        self.first = min(earliest, self.today)
+        columns = self.today - self.first + 1
+        self.ids = list(completions)
+        self.rows = {task_id: row for row, task_id in enumerate(self.ids)}
+        # 多预留一段日期，跨天后不必立即扩容
+        self.data = np.zeros((max(len(self.ids), 8), columns + 64), dtype=bool)
+        for row, task_id in enumerate(self.ids):
+            ordinals = np.asarray(completions[task_id], dtype=np.int64) - self.first
+            self.data[row, ordinals[ordinals >= 0]] = True
+
+    # 维护
+
+    def _column(self, o):
+        col = o - self.first
+        if col < 0:
+            # 比最早日期还早，在前面补列
+            self.data = np.concatenate(
+                [np.zeros((self.data.shape[0], -col), dtype=bool), self.data], axis=1)
+            self.first = o
+            col = 0
+        elif col >= self.data.shape[1]:
+            self._grow(columns=max(col + 1, self.data.shape[1] * 2))
+        return col
+
+    def _grow(self, rows=None, columns=None):
+        old = self.data
+        self.data = np.zeros((rows or old.shape[0], columns or old.shape[1]), dtype=bool)
+        self.data[:old.shape[0], :old.shape[1]] = old
+
+    def set(self, task_id, date_str, done):
+        row = self.rows.get(task_id)
+        if row is None:
+            return
+        self.data[row, self._column(toOrdinal(date_str))] = done
+
+    def setToday(self, today):
+        self.today = today
+        self._column(today)
+
+    def setStart(self, start_date):
+        self.start = toOrdinal(start_date)
+        self._column(self.start)
+
+    def addTask(self, task_id, ordinals=()):
+        """添加一行（撤销删除时带上按顺序排列的完成日期序号）"""
+        if task_id in self.rows:
+            return
+        if len(self.ids) == self.data.shape[0]:
+            self._grow(rows=self.data.shape[0] * 2)
+        self.rows[task_id] = len(self.ids)
+        self.ids.append(task_id)
+        self.data[self.rows[task_id]] = False
+        if len(ordinals):
+            self._column(ordinals[0])
+            self._column(ordinals[-1])
+            self.data[self.rows[task_id], np.asarray(ordinals, dtype=np.int64) - self.first] = True
+
+    def removeTask(self, task_id):
+        """删除一行：把最后一行移到这里"""
+        row = self.rows.pop(task_id, None)
+        if row is None:
+            return
+        last = len(self.ids) - 1
+        if row != last:
+            self.data[row] = self.data[last]
+            self.ids[row] = self.ids[last]
+            self.rows[self.ids[row]] = row
+        self.ids.pop()
+
+    # 查询
+
+    def window(self, days):
+        """最近 days 天（到今天为止）的子矩阵，返回 (矩阵, 每列是否在初始日期之后, 每列的日期序号)"""
+        end = self.today - self.first + 1
+        begin = end - days
+        ordinals = np.arange(self.today - days + 1, self.today + 1)
+        if begin < 0:
+            # 早于最早日期的部分补零
+            matrix = np.zeros((len(self.ids), days), dtype=bool)
+            matrix[:, -begin:] = self.data[:len(self.ids), :end]
+        else:
+            matrix = self.data[:len(self.ids), begin:end]
+        return matrix, ordinals >= self.start, ordinals
+
+    def completionRates(self, days):
+        """每个任务最近 days 天的完成率"""
+        matrix, valid, _ = self.window(days)
+        counted = max(int(valid.sum()), 1)
+        return matrix[:, valid].sum(axis=1) / counted
+
+    def heatmap(self, task_id, weeks=53):
+        """某个任务最近 weeks 周的日历热力图，形状 (weeks, 7)，星期一在前
+
+        1 表示完成，0 表示未完成，初始日期之前和今天之后为 nan。
+        """
+        monday = self.today - weekdayOf(self.today)
+        days = weeks * 7
+        first = monday - (weeks - 1) * 7
+        matrix, valid, ordinals = self.window(self.today - first + 1)
+        values = np.full(days, np.nan)
+        shown = len(ordinals)
+        values[:shown] = np.where(valid, matrix[self.rows[task_id]], np.nan)
+        return values.reshape(weeks, 7)
+
+    def weekdayRates(self, days=365):
+        """每个任务在星期一到星期日的完成率，形状 (任务数, 7)"""
+        matrix, valid, ordinals = self.window(days)
+        onehot = np.zeros((days, 7), dtype=np.int32)
+        onehot[np.arange(days), weekdayOf(ordinals)] = 1
+        onehot[~valid] = 0
+        counts = matrix.astype(np.int32) @ onehot
+        totals = onehot.sum(axis=0)
+        return counts / np.maximum(totals, 1)
+
+    def rollingRates(self, window, days=365):
+        """每个任务以 window 天为窗口的滚动完成率，形状 (任务数, days)"""
+        matrix, valid, _ = self.window(days + window - 1)
+        zero = np.zeros((matrix.shape[0], 1), dtype=np.int32)
+        done = np.concatenate([zero, np.cumsum(matrix, axis=1, dtype=np.int32)], axis=1)
+        counted = np.concatenate([[0], np.cumsum(valid, dtype=np.int32)])
+        totals = counted[window:] - counted[:-window]
+        return (done[:, window:] - done[:, :-window]) / np.maximum(totals, 1)
+
+    def correlation(self, days=365):
+        """任务之间每天是否完成的相关系数矩阵（从不变化的任务相关系数记为 0）"""
+        matrix, valid, _ = self.window(days)
+        values = matrix[:, valid].astype(np.float64)
+        if values.shape[1] == 0:
+            return np.zeros((len(self.ids), len(self.ids)))
+        values -= values.mean(axis=1, keepdims=True)
+        norms = np.sqrt((values * values).sum(axis=1))
+        norms[norms == 0] = np.inf
+        values /= norms[:, None]
+        return values @ values.T
+
+    def topPairs(self, days=365, count=10):
+        """相关性最强（绝对值最大）的任务对 [(任务id, 任务id, 相关系数)]"""
+        n = len(self.ids)
+        if n < 2:
+            return []
+        corr = self.correlation(days)
+        upper_a, upper_b = np.triu_indices(n, k=1)
+        scores = np.abs(corr[upper_a, upper_b])
+        count = min(count, len(scores))
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[upper_a[i]], self.ids[upper_b[i]], float(corr[upper_a[i], upper_b[i]]))
+                for i in best]
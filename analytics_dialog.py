@@ -0,0 +1,213 @@
+import math
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QComboBox, QWidget,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView
+)
+from PyQt5.QtCore import Qt, QPointF, QRectF
+from PyQt5.QtGui import QColor, QPainter, QPainterPath, QPen
+from theme import EYE_CARE
+
+WEEKDAY_NAMES = ['一', '二', '三', '四', '五', '六', '日']
+
+# 统计的时间范围（天）
+RANGES = [(30, '最近30天'), (90, '最近90天'), (365, '最近一年'), (365 * 3, '最近三年')]
+
+
+class ChartWidget(QWidget):
+    """统计图的基类：保存要显示的数组，绘制时只读取，不做计算"""
+
+    def __init__(self, colors=EYE_CARE, parent=None):
+        super().__init__(parent)
+        self.colors = colors
+        self.values = None
+
+    def setValues(self, values):
+        self.values = values
+        self.update()
+
+    def _color(self, name):
+        return QColor(self.colors[name])
+
+
+class HeatmapWidget(ChartWidget):
+    """某个任务最近一年的日历热力图，每列一周，星期一在上"""
+
+    def __init__(self, colors=EYE_CARE, parent=None):
+        super().__init__(colors, parent)
+        self.setMinimumHeight(110)
+
+    def paintEvent(self, event):
+        if self.values is None:
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        weeks = self.values.shape[0]
+        label_width = 18
+        cell = min((self.width() - label_width) / weeks, self.height() / 7)
+        painter.setPen(self._color('muted'))
+        for day in (0, 2, 4, 6):
+            painter.drawText(QRectF(0, day * cell, label_width, cell), Qt.AlignCenter, WEEKDAY_NAMES[day])
+        painter.setPen(Qt.NoPen)
+        done, missed = self._color('success'), self._color('border')
+        for week in range(weeks):
+            for day in range(7):
+                value = self.values[week, day]
+                if math.isnan(value):
+                    continue
+                painter.setBrush(done if value else missed)
+                painter.drawRoundedRect(QRectF(label_width + week * cell + 1, day * cell + 1,
+                                               cell - 2, cell - 2), 2, 2)
+
+
+class WeekdayChart(ChartWidget):
+    """星期一到星期日的完成率柱状图"""
+
+    def __init__(self, colors=EYE_CARE, parent=None):
+        super().__init__(colors, parent)
+        self.setMinimumHeight(140)
+
+    def paintEvent(self, event):
+        if self.values is None:
+            return
+        painter = QPainter(self)
+        label_height = painter.fontMetrics().height() + 2
+        chart_height = self.height() - 2 * label_height
+        slot = self.width() / 7
+        for day, rate in enumerate(self.values):
+            bar_height = chart_height * rate
+            left = day * slot + slot * 0.2
+            painter.fillRect(QRectF(left, label_height + chart_height - bar_height, slot * 0.6, bar_height),
+                             self._color('accent'))
+            painter.setPen(self._color('text'))
+            painter.drawText(QRectF(day * slot, self.height() - label_height, slot, label_height),
+                             Qt.AlignCenter, WEEKDAY_NAMES[day])
+            painter.drawText(QRectF(day * slot, label_height + chart_height - bar_height - label_height,
+                                    slot, label_height), Qt.AlignCenter, f'{rate:.0%}')
+
+
+class RateChart(ChartWidget):
+    """滚动完成率折线图：values 是 [(名称, 颜色名, 数组)]"""
+
+    def __init__(self, colors=EYE_CARE, parent=None):
+        super().__init__(colors, parent)
+        self.setMinimumHeight(140)
+
+    def paintEvent(self, event):
+        if not self.values:
+            return
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        width, height = self.width() - 1, self.height() - 1
+        # 图例在上方，折线画在图例下面
+        top = 18 * len(self.values)
+
+        def y(rate):
+            return top + (height - top) * (1 - rate)
+        painter.setPen(QPen(self._color('border'), 1, Qt.DashLine))
+        for level in (0, 0.5, 1):
+            painter.drawLine(QPointF(0, y(level)), QPointF(width, y(level)))
+        for index, (name, color, series) in enumerate(self.values):
+            step = width / max(len(series) - 1, 1)
+            path = QPainterPath(QPointF(0, y(series[0])))
+            for i in range(1, len(series)):
+                path.lineTo(i * step, y(series[i]))
+            painter.setPen(QPen(self._color(color), 2))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawPath(path)
+            painter.drawText(QRectF(6, index * 18, width, 18), Qt.AlignLeft | Qt.AlignVCenter,
+                             f'{name}: {series[-1]:.0%}')
+
+
+class AnalyticsDialog(QDialog):
+    """统计分析：完成热力图、星期分布、滚动完成率和任务之间的相关性
+
+    全部图表都来自 ClockInStore.completionMatrix() 的向量运算，
+    打卡后调用 refresh() 只重新计算当前显示的内容。
+    """
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.setWindowTitle('统计分析')
+        self.resize(760, 720)
+        self.initUI()
+
+    def initUI(self):
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel('任务:'))
+        self.task_combo = QComboBox()
+        self.task_combo.currentIndexChanged.connect(self.refresh)
+        controls.addWidget(self.task_combo, 1)
+        controls.addWidget(QLabel('范围:'))
+        self.range_combo = QComboBox()
+        for days, label in RANGES:
+            self.range_combo.addItem(label, days)
+        self.range_combo.setCurrentIndex(2)
+        self.range_combo.currentIndexChanged.connect(self.refresh)
+        controls.addWidget(self.range_combo)
+        layout.addLayout(controls)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        layout.addWidget(QLabel('最近一年'))
+        self.heatmap = HeatmapWidget()
+        layout.addWidget(self.heatmap)
+
+        charts = QGridLayout()
+        charts.addWidget(QLabel('星期分布'), 0, 0)
+        charts.addWidget(QLabel('滚动完成率'), 0, 1)
+        self.weekday_chart = WeekdayChart()
+        self.rate_chart = RateChart()
+        charts.addWidget(self.weekday_chart, 1, 0)
+        charts.addWidget(self.rate_chart, 1, 1)
+        layout.addLayout(charts)
+
+        layout.addWidget(QLabel('相关性最强的任务'))
+        self.pairs_table = QTableWidget(0, 3)
+        self.pairs_table.setHorizontalHeaderLabels(['任务', '任务', '相关系数'])
+        self.pairs_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.pairs_table.verticalHeader().setVisible(False)
+        self.pairs_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.pairs_table)
+
+        self.loadTasks()
+
+    def loadTasks(self):
+        """任务增删或改名后重新填充任务列表，尽量保持当前选择"""
+        current = self.task_combo.currentData()
+        self.names = {task['id']: task['name'] for task in self.store.tasks()}
+        self.task_combo.blockSignals(True)
+        self.task_combo.clear()
+        for task_id, name in self.names.items():
+            self.task_combo.addItem(name, task_id)
+        index = self.task_combo.findData(current)
+        self.task_combo.setCurrentIndex(max(index, 0))
+        self.task_combo.blockSignals(False)
+        self.refresh()
+
+    def refresh(self):
+        matrix = self.store.completionMatrix()
+        task_id = self.task_combo.currentData()
+        if matrix is None or task_id not in matrix.rows:
+            return
+        days = self.range_combo.currentData()
+        row = matrix.rows[task_id]
+
+        rates = matrix.completionRates(days)
+        rank = int((rates > rates[row]).sum()) + 1
+        self.summary_label.setText(f'完成率 {rates[row]:.0%}，在 {len(rates)} 个任务中排第 {rank}，'
+                                   f'全部任务平均 {rates.mean():.0%}')
+        self.heatmap.setValues(matrix.heatmap(task_id))
+        self.weekday_chart.setValues(matrix.weekdayRates(days)[row])
+        self.rate_chart.setValues([('7天', 'accent', matrix.rollingRates(7, days)[row]),
+                                   ('30天', 'warning', matrix.rollingRates(30, days)[row])])
+
+        pairs = matrix.topPairs(days)
+        self.pairs_table.setRowCount(len(pairs))
+        for i, (a, b, r) in enumerate(pairs):
+            self.pairs_table.setItem(i, 0, QTableWidgetItem(self.names.get(a, str(a))))
+            self.pairs_table.setItem(i, 1, QTableWidgetItem(self.names.get(b, str(b))))
+            self.pairs_table.setItem(i, 2, QTableWidgetItem(f'{r:+.2f}'))
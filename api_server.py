@@ -0,0 +1,503 @@
+"""本地 HTTP/JSON 接口：让脚本、快捷指令等本机工具打卡
+
+无界面运行：
+    python api_server.py                      # 使用最近使用的用户，端口 8765
+    python api_server.py --port 9000 --profile 小明 --token 密码
+
+在界面中运行：python main.py --api[=端口]，或者菜单“文件 > 本地HTTP接口”。
+
+接口（日期格式 YYYY-MM-DD，也可以写 today；任务可以用id或名称，数字先按id查找）：
+    GET    /health
+    GET    /tasks?date=                       任务列表和某天的完成状态
+    POST   /tasks              {"name"}       添加任务
+    GET    /tasks/<任务>                       任务和打卡统计
+    GET    /tasks/<任务>/history?from=&to=     某个任务一段时间的打卡和完成情况
+    GET    /completions/<任务>/<日期>
+    PUT    /completions/<任务>/<日期>          打卡
+    DELETE /completions/<任务>/<日期>          取消打卡
+    GET    /notes/<任务>/<日期>
+    PUT    /notes/<任务>/<日期>  {"text"}       修改完成情况
+    GET    /days/<日期>                         某天完成的任务和完成情况
+    GET    /history?from=&to=&limit=          按日期顺序的历史记录
+"""
+import argparse
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import parse_qs, unquote, urlsplit
+
+DEFAULT_PORT = 8765
+FLAG = '--api'
+MAX_BODY = 1 << 20
+# 一批最多执行的请求数
+MAX_BATCH = 256
+# 一次查询最多返回的天数 / 行数
+MAX_DAYS = 366 * 10
+MAX_ROWS = 10000
+
+REASONS = {200: 'OK', 400: 'Bad Request', 401: 'Unauthorized', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def portFromArgv(argv):
+    """从命令行参数中取出 --api[=端口]，返回 (端口，没有该选项时为 None, 剩余参数)
+
+    端口不是 1-65535 之间的整数时抛出 ValueError。
+    """
+    rest = []
+    port = None
+    for arg in argv:
+        if arg == FLAG:
+            port = DEFAULT_PORT
+        elif arg.startswith(FLAG + '='):
+            value = arg[len(FLAG) + 1:]
+            try:
+                port = int(value)
+            except ValueError:
+                port = 0
+            if not 0 < port < 65536:
+                raise ValueError(f'端口不正确: {value}（应为 1-65535 之间的整数）')
+        else:
+            rest.append(arg)
+    return port, rest
+
+
+# 参数
+
+def resolveTask(store, ref):
+    """按id或名称找到任务：数字先按id查找，没有这个id时按名称（和命令行一样）"""
+    task = store.task(int(ref)) if ref.isdigit() else None
+    if task is None:
+        task = next((t for t in store.tasks() if t['name'] == ref), None)
+    if task is None:
+        raise ApiError(404, f'任务不存在: {ref}')
+    return task
+
+
+def resolveDate(value, default=None):
+    if value in (None, ''):
+        value = default
+    if value in (None, 'today'):
+        return date.today().isoformat()
+    try:
+        return date.fromisoformat(value).isoformat()
+    except (TypeError, ValueError):
+        raise ApiError(400, f'日期格式不正确: {value}')
+
+
+def resolveRange(query, default_days=30):
+    """?from=&to=，默认最近 default_days 天"""
+    last = resolveDate(query.get('to'))
+    first = resolveDate(query.get('from'),
+                        (date.fromisoformat(last) - timedelta(days=default_days - 1)).isoformat())
+    if first > last:
+        raise ApiError(400, '开始日期晚于结束日期')
+    if (date.fromisoformat(last) - date.fromisoformat(first)).days >= MAX_DAYS:
+        raise ApiError(400, f'日期范围不能超过 {MAX_DAYS} 天')
+    return first, last
+
+
+def resolveLimit(query, default=1000):
+    try:
+        limit = int(query.get('limit', default))
+    except ValueError:
+        raise ApiError(400, 'limit 必须是整数')
+    return max(1, min(limit, MAX_ROWS))
+
+
+# 处理函数：handler(store, ops, args, query, data)，修改数据的处理函数把执行的修改追加到 ops
+
+def health(store, ops, args, query, data):
+    return {'status': 'ok', 'start_date': store.startDate(), 'tasks': len(store.tasks())}
+
+
+def listTasks(store, ops, args, query, data):
+    date_str = resolveDate(query.get('date'))
+    return {'date': date_str,
+            'tasks': [{'id': task['id'], 'name': task['name'],
+                       'completed': store.isCompleted(task['id'], date_str),
+                       'note': store.note(task['id'], date_str)} for task in store.tasks()]}
+
+
+def addTask(store, ops, args, query, data):
+    name = data.get('name')
+    if not isinstance(name, str) or not name.strip():
+        raise ApiError(400, '缺少任务名称 name')
+    task_id = store.addTask(name.strip())
+    ops.append({'op': 'add', 'task': task_id})
+    return {'id': task_id, 'name': name.strip()}
+
+
+def getTask(store, ops, args, query, data):
+    task = resolveTask(store, args[0])
+    if store.stats is None:
+        store.buildStats()
+    return {'id': task['id'], 'name': task['name'], 'stats': store.taskStats(task['id'])}
+
+
+def taskHistory(store, ops, args, query, data):
+    task = resolveTask(store, args[0])
+    first, last = resolveRange(query)
+    days = []
+    day, end = date.fromisoformat(first), date.fromisoformat(last)
+    while day <= end:
+        date_str = day.isoformat()
+        done, note = store.isCompleted(task['id'], date_str), store.note(task['id'], date_str)
+        if done or note:
+            days.append({'date': date_str, 'completed': done, 'note': note})
+        day += timedelta(days=1)
+    return {'id': task['id'], 'name': task['name'], 'from': first, 'to': last, 'days': days}
+
+
+def getCompletion(store, ops, args, query, data):
+    task = resolveTask(store, args[0])
+    date_str = resolveDate(args[1])
+    return {'task': task['id'], 'date': date_str, 'completed': store.isCompleted(task['id'], date_str),
+            'note': store.note(task['id'], date_str)}
+
+
+def setCompletion(done):
+    def handler(store, ops, args, query, data):
+        task = resolveTask(store, args[0])
+        date_str = resolveDate(args[1])
+        changed = store.isCompleted(task['id'], date_str) != done
+        if changed:
+            store.setCompleted(task['id'], date_str, done)
+            ops.append({'op': 'check' if done else 'uncheck', 'task': task['id'], 'date': date_str})
+        return {'task': task['id'], 'date': date_str, 'completed': done, 'changed': changed}
+    return handler
+
+
+def getNote(store, ops, args, query, data):
+    task = resolveTask(store, args[0])
+    date_str = resolveDate(args[1])
+    return {'task': task['id'], 'date': date_str, 'text': store.note(task['id'], date_str)}
+
+
+def setNote(store, ops, args, query, data):
+    task = resolveTask(store, args[0])
+    date_str = resolveDate(args[1])
+    text = data.get('text')
+    if not isinstance(text, str):
+        raise ApiError(400, '缺少完成情况 text')
+    if store.note(task['id'], date_str) != text:
+        store.setNote(task['id'], date_str, text)
+        ops.append({'op': 'note', 'task': task['id'], 'date': date_str})
+    return {'task': task['id'], 'date': date_str, 'text': text}
+
+
+def getDay(store, ops, args, query, data):
+    date_str = resolveDate(args[0])
+    notes = store.notesOn(date_str)
+    names = {task['id']: task['name'] for task in store.tasks()}
+    return {'date': date_str, 'completed': store.tasksCompletedOn(date_str),
+            'notes': {names[task_id]: text for task_id, text in notes.items() if task_id in names}}
+
+
+def history(store, ops, args, query, data):
+    first, last = resolveRange(query, 365)
+    limit = resolveLimit(query)
+    names = {task['id']: task['name'] for task in store.tasks()}
+    rows = []
+    # iterHistory 按日期顺序返回，超过结束日期就停止
+    for task_id, date_str, done, note in store.iterHistory():
+        if date_str > last:
+            break
+        if date_str < first or task_id not in names:
+            continue
+        rows.append({'task': names[task_id], 'date': date_str, 'completed': done, 'note': note})
+        if len(rows) >= limit:
+            break
+    return {'from': first, 'to': last, 'rows': rows}
+
+
+# (方法, 路径, 处理函数, 是否修改数据)，路径中的 * 匹配任意一段
+ROUTES = [
+    ('GET', ('health',), health, False),
+    ('GET', ('tasks',), listTasks, False),
+    ('POST', ('tasks',), addTask, True),
+    ('GET', ('tasks', '*'), getTask, False),
+    ('GET', ('tasks', '*', 'history'), taskHistory, False),
+    ('GET', ('completions', '*', '*'), getCompletion, False),
+    ('PUT', ('completions', '*', '*'), setCompletion(True), True),
+    ('DELETE', ('completions', '*', '*'), setCompletion(False), True),
+    ('GET', ('notes', '*', '*'), getNote, False),
+    ('PUT', ('notes', '*', '*'), setNote, True),
+    ('GET', ('days', '*'), getDay, False),
+    ('GET', ('history',), history, False),
+]
+
+
+def route(method, parts):
+    """返回 (处理函数, 路径参数, 是否修改数据)"""
+    allowed = False
+    for route_method, pattern, handler, mutates in ROUTES:
+        if len(pattern) != len(parts) or any(p != '*' and p != part for p, part in zip(pattern, parts)):
+            continue
+        if route_method == method:
+            return handler, [part for p, part in zip(pattern, parts) if p == '*'], mutates
+        allowed = True
+    if allowed:
+        raise ApiError(405, f'不支持的方法: {method}')
+    raise ApiError(404, '接口不存在: /' + '/'.join(parts))
+
+
+class SingleWriter:
+    """所有对 store 的访问排成一个队列，由一个协程按批取出执行
+
+    owner(fn) 把 fn 交给拥有 store 的线程执行并返回 concurrent.futures.Future：
+    界面中是 Qt 主线程（和界面的修改依次执行），无界面时是一个单独的线程。
+    同一批中的修改放在一个 store.batch() 里，执行完后调用一次 commit(store, ops) 写入，
+    并发的请求越多，每次写入合并的修改越多。
+    """
+
+    def __init__(self, get_store, owner, commit):
+        self.get_store = get_store
+        self.owner = owner
+        self.commit = commit
+        self.queue = None
+        self.batches = 0
+        self.calls = 0
+
+    async def call(self, handler, mutates, *args):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((handler, mutates, args, future))
+        return await future
+
+    async def run(self):
+        self.queue = asyncio.Queue()
+        while True:
+            items = [await self.queue.get()]
+            while len(items) < MAX_BATCH and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            try:
+                results = await asyncio.wrap_future(self.owner(lambda: self._execute(items)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                results = [(None, e)] * len(items)
+            self.batches += 1
+            self.calls += len(items)
+            for (handler, mutates, args, future), (value, error) in zip(items, results):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(value)
+
+    def _execute(self, items):
+        """在 store 所属的线程中执行一批请求，返回 [(结果, 异常)]"""
+        store = self.get_store()
+        ops = []
+        if not any(mutates for _, mutates, _, _ in items):
+            return [self._run(store, ops, handler, args) for handler, _, args, _ in items]
+        # 接口的修改不进入界面的撤销记录
+        with store.batch(), store.externalChanges():
+            results = [self._run(store, ops, handler, args) for handler, _, args, _ in items]
+        if ops:
+            self.commit(store, ops)
+        return results
+
+    @staticmethod
+    def _run(store, ops, handler, args):
+        try:
+            return handler(store, ops, *args), None
+        except Exception as e:
+            return None, e
+
+
+class ApiServer:
+    """只监听本机的 asyncio HTTP 服务器（HTTP/1.1，支持长连接）
+
+    get_store() 返回当前的 ClockInStore（切换用户后返回新的 store），
+    owner 和 commit 见 SingleWriter；不指定 owner 时使用一个单独的线程，
+    不指定 commit 时每批修改后调用 store.flush()。
+    设置 token 后请求必须带 Authorization: Bearer <token>。
+    """
+
+    def __init__(self, get_store, owner=None, commit=None, host='127.0.0.1', port=DEFAULT_PORT, token=None):
+        self._executor = None
+        if owner is None:
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix='api-store')
+            owner = self._executor.submit
+        self.writer = SingleWriter(get_store, owner, commit or (lambda store, ops: store.flush()))
+        self.host = host
+        self.port = port
+        self.token = token
+        self.requests = 0
+        self.errors = 0
+        self._loop = None
+        self._thread = None
+        self._stop = None
+
+    # 运行
+
+    async def serve(self, ready=None):
+        """在当前事件循环中运行，直到 stop()"""
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        writer_task = asyncio.ensure_future(self.writer.run())
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready()
+        try:
+            await self._stop.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            writer_task.cancel()
+            try:
+                await writer_task
+            except asyncio.CancelledError:
+                pass
+
+    def start(self):
+        """在后台线程中运行（界面中使用），端口被占用等错误在这里抛出"""
+        started = threading.Event()
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(self.serve(started.set))
+            except Exception as e:
+                errors.append(e)
+                started.set()
+        self._thread = threading.Thread(target=run, name='api-server', daemon=True)
+        self._thread.start()
+        started.wait()
+        if errors:
+            self._thread.join()
+            self._thread = None
+            raise errors[0]
+        return self.port
+
+    def stop(self, timeout=5):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def isRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    # HTTP
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                parts = request_line.decode('latin-1').split()
+                if len(parts) != 3:
+                    self._respond(writer, 400, {'error': '请求格式不正确'}, False)
+                    break
+                method, target, version = parts
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    self._respond(writer, 400, {'error': 'Content-Length 不正确'}, False)
+                    break
+                if length > MAX_BODY:
+                    self._respond(writer, 413, {'error': '请求内容太大'}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self.dispatch(method, target, headers, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                self._respond(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers, body):
+        """处理一个请求，返回 (状态码, JSON对象)"""
+        self.requests += 1
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if self.token and headers.get('authorization') != f'Bearer {self.token}':
+                raise ApiError(401, '需要正确的 token')
+            handler, args, mutates = route(method.upper(), parts)
+            try:
+                data = json.loads(body) if body else {}
+            except ValueError:
+                raise ApiError(400, '请求内容不是有效的JSON')
+            if not isinstance(data, dict):
+                raise ApiError(400, '请求内容必须是JSON对象')
+            return 200, await self.writer.call(handler, mutates, args, query, data)
+        except ApiError as e:
+            self.errors += 1
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            self.errors += 1
+            return 500, {'error': f'{type(e).__name__}: {e}'}
+
+    @staticmethod
+    def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        head = (f'HTTP/1.1 {status} {REASONS.get(status, "")}\r\n'
+                'Content-Type: application/json; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + body)
+
+
+def main(argv=None):
+    from profiles import ProfileManager
+
+    parser = argparse.ArgumentParser(description='打卡数据的本地HTTP接口')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--profile', help='用户名（默认是最近使用的用户）')
+    parser.add_argument('--token', help='请求需要带 Authorization: Bearer <token>')
+    args = parser.parse_args(argv)
+
+    # store 只在写入线程中打开、使用和关闭（SQLite 连接不能跨线程使用）
+    executor = ThreadPoolExecutor(1, thread_name_prefix='api-store')
+    profiles = ProfileManager()
+    store = executor.submit(profiles.openDetached, args.profile).result()
+
+    def currentStore():
+        # 命令行可能同时修改同一份数据，每批请求前先合并其他进程的修改
+        store.pollExternalChanges()
+        return store
+
+    server = ApiServer(currentStore, executor.submit, port=args.port, token=args.token)
+    print(f'用户 {args.profile or profiles.active}: http://127.0.0.1:{args.port}/  (Ctrl+C 结束)', flush=True)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.submit(store.close).result()
+        executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, QLabel, QDateEdit, QListWidget,
+    QListWidgetItem, QPushButton, QRadioButton, QDialogButtonBox
+)
+from PyQt5.QtCore import Qt, QDate
+
+
+class BackfillDialog(QDialog):
+    """批量补打卡：选择日期范围和任务，一次全部标记为完成或取消"""
+
+    def __init__(self, store, first, last=None, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.setWindowTitle('批量补打卡')
+        self.resize(420, 520)
+
+        layout = QVBoxLayout(self)
+        form = QFormLayout()
+        self.first_edit = self._dateEdit(first)
+        self.last_edit = self._dateEdit(last if last is not None else first)
+        form.addRow('开始日期:', self.first_edit)
+        form.addRow('结束日期:', self.last_edit)
+        layout.addLayout(form)
+
+        mode_layout = QHBoxLayout()
+        self.check_radio = QRadioButton('标记为完成')
+        self.check_radio.setChecked(True)
+        self.uncheck_radio = QRadioButton('取消打卡')
+        mode_layout.addWidget(self.check_radio)
+        mode_layout.addWidget(self.uncheck_radio)
+        mode_layout.addStretch()
+        layout.addLayout(mode_layout)
+
+        select_layout = QHBoxLayout()
+        select_layout.addWidget(QLabel('任务:'))
+        select_layout.addStretch()
+        all_btn = QPushButton('全选')
+        all_btn.clicked.connect(lambda: self.setAllChecked(True))
+        none_btn = QPushButton('全不选')
+        none_btn.clicked.connect(lambda: self.setAllChecked(False))
+        select_layout.addWidget(all_btn)
+        select_layout.addWidget(none_btn)
+        layout.addLayout(select_layout)
+
+        self.task_list = QListWidget()
+        for task in store.tasks():
+            item = QListWidgetItem(task['name'])
+            item.setData(Qt.UserRole, task['id'])
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            self.task_list.addItem(item)
+        self.task_list.itemChanged.connect(self.updateSummary)
+        layout.addWidget(self.task_list)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+        self.first_edit.dateChanged.connect(self.updateSummary)
+        self.last_edit.dateChanged.connect(self.updateSummary)
+        self.updateSummary()
+
+    def _dateEdit(self, date_str):
+        edit = QDateEdit(QDate.fromString(date_str, 'yyyy-MM-dd'))
+        edit.setDisplayFormat('yyyy-MM-dd')
+        edit.setCalendarPopup(True)
+        return edit
+
+    def setAllChecked(self, checked):
+        self.task_list.blockSignals(True)
+        for i in range(self.task_list.count()):
+            self.task_list.item(i).setCheckState(Qt.Checked if checked else Qt.Unchecked)
+        self.task_list.blockSignals(False)
+        self.updateSummary()
+
+    def taskIds(self):
+        return [self.task_list.item(i).data(Qt.UserRole) for i in range(self.task_list.count())
+                if self.task_list.item(i).checkState() == Qt.Checked]
+
+    def updateSummary(self):
+        days = abs(self.first_edit.date().daysTo(self.last_edit.date())) + 1
+        tasks = len(self.taskIds())
+        self.summary_label.setText(f'{days} 天 × {tasks} 个任务')
+
+    def selection(self):
+        """返回 (任务id列表, 开始日期, 结束日期, 是否完成)"""
+        first = self.first_edit.date().toString('yyyy-MM-dd')
+        last = self.last_edit.date().toString('yyyy-MM-dd')
+        if first > last:
+            first, last = last, first
+        return self.taskIds(), first, last, self.check_radio.isChecked()
@@ -0,0 +1,283 @@
+"""数据层性能测试：用合成的长历史数据测量无界面存储接口
+
+用法：
+    python benchmarks/bench_store.py                       # 10年 × 500个任务
+    python benchmarks/bench_store.py --years 2 --tasks 50  # 快速运行
+    python benchmarks/bench_store.py --backend sqlite --json result.json
+    python benchmarks/bench_store.py --backend shards
+
+测量加载、保存、打卡、编辑完成情况、撤销、日历刷新、按日期查询、查看历史完成情况、
+统计分析、搜索和导入导出的耗时、吞吐量和峰值内存（tracemalloc），
+数据写在临时目录中，不影响真实数据。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import analytics  # noqa: E402
+from calendar_highlight import adjacentMonths, monthRange  # noqa: E402
+from interchange import exportHistory, importHistory  # noqa: E402
+from store import ClockInStore  # noqa: E402
+
+NOTE_WORDS = ['跑步', '五公里', '读书', '三十页', '背单词', '早起', '冥想', '十分钟',
+              '状态不错', '有点累', '坚持', '完成', '拉伸', '复习', '写作']
+
+
+def syntheticData(years, tasks, completion_rate, note_rate, seed=1):
+    """生成 years 年 × tasks 个任务的打卡历史"""
+    rnd = random.Random(seed)
+    end = date.today()
+    start = end - timedelta(days=years * 365 - 1)
+    days = [(start + timedelta(days=i)).isoformat() for i in range(years * 365)]
+    task_list = []
+    for task_id in range(1, tasks + 1):
+        completed = [d for d in days if rnd.random() < completion_rate]
+        notes = {d: ''.join(rnd.choice(NOTE_WORDS) for _ in range(rnd.randint(2, 8)))
+                 for d in completed if rnd.random() < note_rate}
+        task_list.append({'id': task_id, 'name': f'任务 {task_id}', 'days': 0,
+                          'completed': completed, 'notes': notes})
+    return {'start_date': days[0], 'tasks': task_list}, days
+
+
+def timeit(func, repeat):
+    """返回 (总耗时ms, 每秒次数)"""
+    start = time.perf_counter()
+    for i in range(repeat):
+        func(i)
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000, repeat / elapsed if elapsed else float('inf')
+
+
+def peakMemory(func):
+    """执行 func 期间 Python 对象的峰值内存（字节）"""
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def prepare(workdir, backend, data):
+    """把合成数据写成指定后端的数据文件"""
+    data_file = os.path.join(workdir, 'clock_in_data.json')
+    with open(data_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    # 先打开一次：迁移到对应后端，JSON后端会在这时把旧的完成情况归档
+    store = ClockInStore.open(data_file)
+    if backend == 'sqlite':
+        store.migrateToSqlite()
+    elif backend == 'shards':
+        store.migrateToShards()
+    store.close()
+    if backend != 'json':
+        os.remove(data_file)
+    return data_file
+
+
+def run(args):
+    results = []
+
+    def record(name, total_ms, ops, per_sec=None, peak=None):
+        results.append({'name': name, 'total_ms': total_ms, 'ops': ops,
+                        'ops_per_sec': per_sec, 'peak_bytes': peak})
+
+    def bench(name, func, repeat):
+        total_ms, per_sec = timeit(func, repeat)
+        record(name, total_ms, repeat, per_sec)
+
+    t0 = time.perf_counter()
+    data, days = syntheticData(args.years, args.tasks, args.completion_rate, args.note_rate)
+    completions = sum(len(t['completed']) for t in data['tasks'])
+    notes = sum(len(t['notes']) for t in data['tasks'])
+    print(f'合成数据: {args.years}年 × {args.tasks}个任务, {completions} 次打卡, '
+          f'{notes} 条完成情况 ({(time.perf_counter() - t0):.1f}s)')
+
+    workdir = tempfile.mkdtemp(prefix='clockin-bench-')
+    try:
+        data_file = prepare(workdir, args.backend, data)
+        del data
+        size = sum(os.path.getsize(os.path.join(root, n))
+                   for root, _, names in os.walk(workdir) for n in names)
+        print(f'数据文件: {size / 1024 / 1024:.1f} MB ({args.backend})')
+
+        # 加载（分别测耗时和峰值内存，tracemalloc 会拖慢执行）
+        start = time.perf_counter()
+        ClockInStore.open(data_file).close()
+        load_ms = (time.perf_counter() - start) * 1000
+        store, load_peak = peakMemory(lambda: ClockInStore.open(data_file))
+        record('loadData', load_ms, 1, peak=load_peak)
+
+        rnd = random.Random(2)
+        tasks = [t['id'] for t in store.tasks()]
+        today = days[-1]
+        n = args.ops
+
+        # 建立打卡统计（首屏之后执行一次），以及打卡后读取统计
+        stats_ms, _ = timeit(lambda i: store.buildStats(), 1)
+        _, stats_peak = peakMemory(store.buildStats)
+        record('stats build', stats_ms, 1, peak=stats_peak)
+
+        def statsRead(i):
+            store.setCompleted(tasks[i % len(tasks)], today, i % 2 == 0)
+            store.taskStats(tasks[i % len(tasks)], today)
+        bench('stats update', statsRead, n)
+
+        # 统计分析：建立完成矩阵，以及打卡后刷新一年范围的全部图表
+        if analytics.available():
+            matrix_ms, _ = timeit(lambda i: store.completionMatrix(today), 1)
+            record('analytics build', matrix_ms, 1)
+
+            def analyticsRefresh(i):
+                store.setCompleted(tasks[i % len(tasks)], today, i % 2 == 0)
+                matrix = store.completionMatrix(today)
+                matrix.completionRates(365)
+                matrix.heatmap(tasks[i % len(tasks)])
+                matrix.weekdayRates(365)
+                matrix.rollingRates(7, 365)
+                matrix.rollingRates(30, 365)
+                matrix.topPairs(365)
+            bench('analytics refresh', analyticsRefresh, min(n, 50))
+
+        # 打卡 / 取消打卡（只改内存）
+        def checkin(i):
+            store.setCompleted(rnd.choice(tasks), today, i % 2 == 0)
+        bench('check-in', checkin, n)
+
+        # 编辑完成情况（模拟逐字输入）
+        def noteEdit(i):
+            store.setNote(tasks[i % len(tasks)], today, '今天' + '很好' * (i % 20))
+        bench('notes edit', noteEdit, n)
+
+        # 保存：一次打卡后的写入，以及合并快照（saveData 最慢的情况）
+        def saveOne(i):
+            store.setCompleted(tasks[i % len(tasks)], today, True)
+            store.flush()
+        bench('saveData (append)', saveOne, min(n, 200))
+
+        # 批量补打卡：20个任务 × 一周，交替标记和取消，每次只写入一次
+        week = [(date.today() - timedelta(days=d)).isoformat() for d in (13, 7)]
+
+        def backfill(i):
+            store.setCompletedRange(tasks[:20], week[0], week[1], i % 2 == 0)
+            store.flush()
+        bench('backfill (20 x 7)', backfill, min(n, 100))
+
+        # 其他进程修改数据文件：另一个 store 打卡并写入，这里合并新增的部分
+        other = ClockInStore.open(data_file)
+
+        def mergeExternal(i):
+            other.setCompleted(tasks[i % 20], week[1], i % 2 == 0)
+            other.flush()
+            store.pollExternalChanges()
+        bench('external merge', mergeExternal, min(n, 200))
+        other.close()
+
+        # 删除任务再撤销：放回全部打卡记录和完成情况，统计和完成矩阵只更新这一个任务
+        def deleteUndo(i):
+            store.deleteTask(tasks[i % len(tasks)])
+            store.undo()
+        bench('delete + undo', deleteUndo, min(n, 50))
+
+        def fullSave(i=0):
+            if store.usesSqlite():
+                store.storage.conn.execute('PRAGMA wal_checkpoint(FULL)')
+            else:
+                store.storage.compact()
+        full_ms, _ = timeit(fullSave, 1)
+        _, full_peak = peakMemory(fullSave)
+        record('saveData (snapshot)', full_ms, 1, peak=full_peak)
+
+        # 日历刷新：从本月开始逐月向前翻页，一直翻到最早的月份，
+        # 一个月份页需要查询前后三个月
+        months = args.years * 12
+
+        def pageAt(i):
+            y, m = divmod(date.today().year * 12 + date.today().month - 1 - i % months, 12)
+            return y, m + 1
+
+        def calendarRefresh(i):
+            for yy, mm in adjacentMonths(*pageAt(i)):
+                store.completedDatesBetween(*monthRange(yy, mm))
+        bench('calendar refresh', calendarRefresh, min(n, months))
+
+        # 点击日历上的日期（翻到某一页后点击该月的某一天）
+        def dateLookup(i):
+            y, m = pageAt(i // 10)
+            store.tasksCompletedOn(f'{y:04d}-{m:02d}-{rnd.randint(1, 28):02d}')
+        bench('date lookup', dateLookup, min(n, 2000))
+
+        # 查看历史完成情况（JSON后端一年以前的内容在压缩归档中）
+        def noteLookup(i):
+            store.note(rnd.choice(tasks), rnd.choice(days))
+        bench('note lookup', noteLookup, min(n, 2000))
+
+        # 搜索完成情况：第一次搜索时建立索引，之后的查询和编辑都是增量的
+        search_ms, _ = timeit(lambda i: store.searchNotes('跑步'), 1)
+        record('search build', search_ms, 1)
+
+        def searchQuery(i):
+            store.searchNotes(rnd.choice(NOTE_WORDS) + rnd.choice(NOTE_WORDS)[:1])
+        bench('search query', searchQuery, min(n, 200))
+
+        def searchedNoteEdit(i):
+            store.setNote(tasks[i % len(tasks)], today, '今天' + rnd.choice(NOTE_WORDS) * (i % 5))
+        bench('notes edit (indexed)', searchedNoteEdit, n)
+
+        # 逐行导出全部历史记录，再导入到一个新的数据文件（一次批量写入）
+        history_path = os.path.join(workdir, 'history.csv')
+        start = time.perf_counter()
+        rows = exportHistory(store, history_path)
+        export_ms = (time.perf_counter() - start) * 1000
+        _, export_peak = peakMemory(lambda: exportHistory(store, history_path))
+        record('history export', export_ms, rows, rows / export_ms * 1000, export_peak)
+        store.close()
+
+        target = ClockInStore.open(os.path.join(workdir, 'imported.json'))
+        start = time.perf_counter()
+        importHistory(target, history_path)
+        target.flush()
+        import_ms = (time.perf_counter() - start) * 1000
+        record('history import', import_ms, rows, rows / import_ms * 1000)
+        target.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'操作':<22}{'总耗时(ms)':>12}{'次数':>8}{'次/秒':>12}{'峰值内存(MB)':>14}")
+    for r in results:
+        per_sec = f"{r['ops_per_sec']:.0f}" if r['ops_per_sec'] else '-'
+        peak = f"{r['peak_bytes'] / 1024 / 1024:.1f}" if r['peak_bytes'] else '-'
+        print(f"{r['name']:<22}{r['total_ms']:>12.1f}{r['ops']:>8}{per_sec:>12}{peak:>14}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据层性能测试')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=500)
+    parser.add_argument('--completion-rate', type=float, default=0.6)
+    parser.add_argument('--note-rate', type=float, default=0.5, help='打卡日中写了完成情况的比例')
+    parser.add_argument('--ops', type=int, default=5000, help='每项操作的执行次数')
+    parser.add_argument('--backend', choices=['json', 'sqlite', 'shards'], default='json')
+    parser.add_argument('--json', metavar='PATH', help='把结果写入JSON文件，便于对比版本')
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
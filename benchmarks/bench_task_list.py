@@ -0,0 +1,132 @@
+"""任务列表构建性能对比：每行一组控件 vs 模型/委托
+
+用法（无需显示器）：
+    python benchmarks/bench_task_list.py --tasks 500
+
+每种方式在独立的子进程中运行，输出构建耗时和进程内存增量。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def currentRss():
+    """当前进程占用的物理内存（字节），不支持的平台返回0"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    except ImportError:
+        return 0
+
+
+class FakeStorage:
+    """只包含任务列表需要的查询"""
+
+    def __init__(self, count):
+        self._tasks = [{'id': i + 1, 'name': f'任务 {i + 1}'} for i in range(count)]
+
+    def startDate(self):
+        return '2024-01-01'
+
+    def tasks(self):
+        return self._tasks
+
+    def isCompleted(self, task_id, date):
+        return task_id % 3 == 0
+
+    def note(self, task_id, date):
+        return f'第 {task_id} 个任务的完成情况' if task_id % 2 else ''
+
+    def taskStats(self, task_id, today=None):
+        return None
+
+
+def buildWidgets(view, storage, font_size=16):
+    """旧版 loadTasks 的做法：每行一个控件树和多份样式表"""
+    from PyQt5.QtWidgets import QListWidgetItem, QWidget, QHBoxLayout, QCheckBox, QLabel, QTextEdit
+    for task in storage.tasks():
+        item = QListWidgetItem()
+        task_widget = QWidget()
+        task_layout = QHBoxLayout()
+        checkbox_container = QWidget()
+        checkbox_layout = QHBoxLayout()
+        checkbox = QCheckBox()
+        task_label = QLabel(f"{task['name']} <span style='color: #E74C3C; font-weight: bold;'>1天</span>")
+        task_label.setStyleSheet(f'QLabel {{ color: #2C3E50; font-size: {font_size}px; padding: 5px; }}')
+        checkbox.setStyleSheet(f'QCheckBox::indicator {{ width: {font_size + 6}px; height: {font_size + 6}px; }}')
+        checkbox.setChecked(storage.isCompleted(task['id'], ''))
+        checkbox_layout.addWidget(checkbox)
+        checkbox_layout.addWidget(task_label)
+        checkbox_container.setLayout(checkbox_layout)
+        task_layout.addWidget(checkbox_container)
+        notes_edit = QTextEdit()
+        notes_edit.setMaximumHeight(80)
+        notes_edit.setText(storage.note(task['id'], ''))
+        notes_edit.setStyleSheet(f'QTextEdit {{ background-color: #F0F4F8; font-size: {font_size - 2}px; }}')
+        task_layout.addWidget(notes_edit)
+        task_widget.setLayout(task_layout)
+        item.setSizeHint(task_widget.sizeHint())
+        view.addItem(item)
+        view.setItemWidget(item, task_widget)
+
+
+def runMode(mode, count):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication, QListWidget, QListView
+    app = QApplication([])
+    storage = FakeStorage(count)
+
+    rss_before = currentRss()
+    start = time.perf_counter()
+    if mode == 'widgets':
+        view = QListWidget()
+        buildWidgets(view, storage)
+    else:
+        from task_model import TaskListModel, TaskItemDelegate
+        view = QListView()
+        view.setUniformItemSizes(True)
+        model = TaskListModel(storage, view)
+        view.setModel(model)
+        view.setItemDelegate(TaskItemDelegate(view))
+        model.reload()
+    view.resize(900, 600)
+    view.show()
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    rss_after = currentRss()
+    return {'mode': mode, 'tasks': count, 'build_ms': elapsed * 1000,
+            'rss_delta_kb': (rss_after - rss_before) // 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=500)
+    parser.add_argument('--mode', choices=['widgets', 'model'])
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(runMode(args.mode, args.tasks)))
+        return
+
+    print(f"{'方式':<10}{'任务数':>8}{'构建耗时(ms)':>16}{'内存增量(KB)':>16}")
+    for mode in ('widgets', 'model'):
+        out = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+                                       '--mode', mode, '--tasks', str(args.tasks)])
+        result = json.loads(out.decode().strip().splitlines()[-1])
+        print(f"{result['mode']:<10}{result['tasks']:>8}{result['build_ms']:>16.1f}{result['rss_delta_kb']:>16}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""本地HTTP接口的压力测试：多个长连接并发读写，统计吞吐量和延迟
+
+用法：
+    python benchmarks/loadtest_api.py                          # 在临时目录启动一个接口实例
+    python benchmarks/loadtest_api.py --concurrency 64 --requests 20000 --backend sqlite
+    python benchmarks/loadtest_api.py --url http://127.0.0.1:8765   # 测试已经运行的实例（只读）
+
+默认在临时目录中启动无界面的接口（和 api_server.py 一样，store 只在一个写入线程中访问），
+写请求只打卡和修改完成情况。结束后重新打开数据文件，检查每个成功的写请求都已经写入磁盘。
+测试已经运行的实例时默认只发送读请求，加 --writes 才会修改数据。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from urllib.parse import quote, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api_server import ApiServer  # noqa: E402
+from store import ClockInStore  # noqa: E402
+
+
+class Client:
+    """一个长连接的最小 HTTP/1.1 客户端"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        self.writer.write(f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+                          f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def worker(client_id, client, tasks, args, latencies, statuses, written, counter):
+    rnd = random.Random(client_id)
+    today = date.today()
+    while True:
+        n = counter[0]
+        if n >= args.requests:
+            return
+        counter[0] += 1
+        task_id = rnd.choice(tasks)
+        if args.writes and rnd.random() < args.write_ratio:
+            # 每个请求写不同的 (任务, 日期)，结束后可以逐条检查
+            date_str = (today - timedelta(days=n % 3650)).isoformat()
+            if rnd.random() < 0.5:
+                method, path, payload = 'PUT', f'/completions/{task_id}/{date_str}', None
+                key = ('check', task_id, date_str)
+            else:
+                text = f'压测 {client_id}-{n}'
+                method, path, payload = 'PUT', f'/notes/{task_id}/{date_str}', {'text': text}
+                key = ('note', task_id, date_str)
+        else:
+            choice = rnd.random()
+            if choice < 0.5:
+                method, path = 'GET', '/tasks'
+            elif choice < 0.8:
+                method, path = 'GET', f'/days/{(today - timedelta(days=rnd.randrange(365))).isoformat()}'
+            else:
+                method, path = 'GET', f'/completions/{task_id}/today'
+            payload, key = None, None
+        start = time.perf_counter()
+        status, _ = await client.request(method, quote(path), payload)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+        if key is not None and status == 200:
+            written.setdefault(key, set()).add(payload['text'] if payload else True)
+
+
+async def runLoad(host, port, args):
+    setup = Client(host, port)
+    status, result = await setup.request('GET', '/tasks')
+    setup.close()
+    if status != 200:
+        raise SystemExit(f'无法访问接口: {status} {result}')
+    tasks = [task['id'] for task in result['tasks']]
+    clients = [Client(host, port) for _ in range(args.concurrency)]
+    latencies, statuses, written, counter = [], {}, {}, [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i, client, tasks, args, latencies, statuses, written, counter)
+                           for i, client in enumerate(clients)))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.close()
+    return elapsed, latencies, statuses, written
+
+
+def syntheticStore(path, tasks):
+    store = ClockInStore.open(path)
+    for task in list(store.tasks()):
+        store.deleteTask(task['id'])
+    for i in range(tasks):
+        store.addTask(f'任务{i + 1}')
+    store.flush()
+    return store
+
+
+def verify(path, written):
+    """重新打开数据文件，返回没有写入磁盘的写请求数"""
+    store = ClockInStore.open(path)
+    missing = 0
+    for (kind, task_id, date_str), values in written.items():
+        if kind == 'check':
+            missing += not store.isCompleted(task_id, date_str)
+        else:
+            # 同一格的完成情况可能被并发修改多次，最后的内容是其中之一即可
+            missing += store.note(task_id, date_str) not in values
+    store.close()
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地HTTP接口压力测试')
+    parser.add_argument('--url', help='已经运行的接口地址（默认在临时目录启动一个）')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--writes', action='store_true', help='测试已经运行的实例时也发送写请求')
+    parser.add_argument('--tasks', type=int, default=20, help='临时实例的任务数')
+    parser.add_argument('--backend', choices=['json', 'sqlite', 'shards'], default='json')
+    args = parser.parse_args()
+
+    workdir = executor = server = store = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port
+    else:
+        args.writes = True
+        workdir = tempfile.mkdtemp(prefix='clockin_api_')
+        path = os.path.join(workdir, 'clock_in_data.json')
+        # store 只在写入线程中打开和访问
+        executor = ThreadPoolExecutor(1, thread_name_prefix='api-store')
+        store = executor.submit(syntheticStore, path, args.tasks).result()
+        if args.backend != 'json':
+            executor.submit(store.migrateToSqlite if args.backend == 'sqlite' else store.migrateToShards).result()
+        server = ApiServer(lambda: store, executor.submit, port=0)
+        host, port = '127.0.0.1', server.start()
+
+    try:
+        elapsed, latencies, statuses, written = asyncio.run(runLoad(host, port, args))
+        total = len(latencies)
+        print(f'{total} 个请求，{args.concurrency} 个并发连接，写请求比例 {args.write_ratio if args.writes else 0:.0%}')
+        print(f'耗时 {elapsed:.2f} s，{total / elapsed:.0f} 次/秒')
+        print(f'延迟 p50 {percentile(latencies, 0.5):.1f} ms，p95 {percentile(latencies, 0.95):.1f} ms，'
+              f'p99 {percentile(latencies, 0.99):.1f} ms，最长 {max(latencies):.1f} ms')
+        print('状态码: ' + ', '.join(f'{status}: {count}' for status, count in sorted(statuses.items())))
+        if server is not None:
+            print(f'写入线程执行 {server.writer.batches} 批（平均每批 {server.writer.calls / max(server.writer.batches, 1):.1f} 个请求）')
+            server.stop()
+            executor.submit(store.close).result()
+            missing = verify(path, written)
+            print(f'检查 {len(written)} 个写请求: ' + ('全部已写入' if not missing else f'{missing} 个没有写入'))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import calendar as pycalendar
+from collections import OrderedDict
+from PyQt5.QtCore import QDate
+from PyQt5.QtGui import QFont, QColor, QTextCharFormat
+
+
+def toQDate(date_str):
+    return QDate.fromString(date_str, 'yyyy-MM-dd')
+
+
+def monthRange(year, month):
+    """返回某月第一天和最后一天的日期字符串"""
+    last_day = pycalendar.monthrange(year, month)[1]
+    return f'{year:04d}-{month:02d}-01', f'{year:04d}-{month:02d}-{last_day:02d}'
+
+
+def adjacentMonths(year, month):
+    """日历页会显示上月末和下月初的几天，返回这三个月"""
+    prev_month = (year, month - 1) if month > 1 else (year - 1, 12)
+    next_month = (year, month + 1) if month < 12 else (year + 1, 1)
+    return [prev_month, (year, month), next_month]
+
+
+class MonthHighlightCache:
+    """按月缓存需要高亮的日期，超出容量时淘汰最久未使用的月份"""
+
+    def __init__(self, loader, capacity=24):
+        # loader(first, last) 返回范围内需要高亮的日期集合
+        self.loader = loader
+        self.capacity = capacity
+        self._months = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, year, month):
+        key = (year, month)
+        dates = self._months.get(key)
+        if dates is not None:
+            self._months.move_to_end(key)
+            self.hits += 1
+            return dates
+        self.misses += 1
+        dates = set(self.loader(*monthRange(year, month)))
+        self._months[key] = dates
+        if len(self._months) > self.capacity:
+            self._months.popitem(last=False)
+        return dates
+
+    def update(self, date_str, done):
+        """某天状态变化后更新已缓存的月份（未缓存的月份下次再加载）"""
+        dates = self._months.get((int(date_str[:4]), int(date_str[5:7])))
+        if dates is None:
+            return
+        if done:
+            dates.add(date_str)
+        else:
+            dates.discard(date_str)
+
+    def clear(self):
+        self._months.clear()
+
+
+class CalendarHighlighter:
+    """日历高亮的增量更新
+
+    只格式化当前显示的月份页。记住已经高亮的日期，每次只对新增和取消的
+    日期调用 setDateTextFormat，所有高亮日期共用同一个格式对象。
+    """
+
+    def __init__(self, calendar, loader, cache_months=24):
+        self.calendar = calendar
+        self.cache = MonthHighlightCache(loader, cache_months)
+        self.highlighted = set()
+        self.page_months = set()
+        self.format_updates = 0
+
+        # 完成日期的格式 - 使用护眼绿色
+        self.done_format = QTextCharFormat()
+        self.done_format.setBackground(QColor(76, 175, 80))  # 护眼绿色
+        self.done_format.setForeground(QColor(255, 255, 255))  # 白色文字
+        self.done_format.setFontWeight(QFont.Bold)  # 加粗
+        self.plain_format = QTextCharFormat()
+
+    def showPage(self, year, month):
+        """显示某个月份页的高亮"""
+        months = adjacentMonths(year, month)
+        dates = set()
+        for y, m in months:
+            dates |= self.cache.get(y, m)
+        self.page_months = set(months)
+        self.sync(dates)
+
+    def refresh(self):
+        """数据整体变化后清空缓存并重新格式化当前页"""
+        self.cache.clear()
+        self.showPage(self.calendar.yearShown(), self.calendar.monthShown())
+
+    def sync(self, dates):
+        """把高亮日期更新为 dates，只修改有差异的日期"""
+        dates = set(dates)
+        for date_str in self.highlighted - dates:
+            self._setFormat(date_str, self.plain_format)
+        for date_str in dates - self.highlighted:
+            self._setFormat(date_str, self.done_format)
+        self.highlighted = dates
+
+    def setDate(self, date_str, done):
+        """更新单个日期的高亮状态"""
+        self.cache.update(date_str, done)
+        if (int(date_str[:4]), int(date_str[5:7])) not in self.page_months:
+            return
+        if done == (date_str in self.highlighted):
+            return
+        if done:
+            self.highlighted.add(date_str)
+            self._setFormat(date_str, self.done_format)
+        else:
+            self.highlighted.discard(date_str)
+            self._setFormat(date_str, self.plain_format)
+
+    def setDates(self, changes):
+        """批量修改后更新多个日期：changes 是 {日期: 是否高亮}，只对当前页做一次差异更新"""
+        dates = set(self.highlighted)
+        for date_str, done in changes.items():
+            self.cache.update(date_str, done)
+            if (int(date_str[:4]), int(date_str[5:7])) not in self.page_months:
+                continue
+            if done:
+                dates.add(date_str)
+            else:
+                dates.discard(date_str)
+        self.sync(dates)
+
+    def _setFormat(self, date_str, fmt):
+        qdate = toQDate(date_str)
+        if qdate.isValid():
+            self.calendar.setDateTextFormat(qdate, fmt)
+            self.format_updates += 1
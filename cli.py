@@ -0,0 +1,190 @@
+"""命令行模式：不启动界面、不导入 PyQt，直接读写同一份打卡数据
+
+    python main.py status [--date 日期]
+    python main.py tasks
+    python main.py checkin <任务> [--date 日期]
+    python main.py checkout <任务> [--date 日期]
+    python main.py note <任务> <内容...> [--date 日期]
+    python main.py history [--month [YYYY-MM]] [--days N] [--task 任务]
+
+任务可以用id、名称或名称中唯一的一部分；每个命令都可以加 --profile 用户名。
+打卡和完成情况与界面中勾选、编辑完成情况的效果相同，命令结束前写入磁盘。
+界面正在运行时命令转发给它执行，界面上立即显示结果。
+"""
+import argparse
+import calendar
+import os
+import sys
+from datetime import date, timedelta
+from profiles import ProfileManager
+from single_instance import addressFor, forward
+
+
+class CliError(Exception):
+    pass
+
+
+def parseDate(value):
+    if value in (None, 'today'):
+        return date.today().isoformat()
+    if value == 'yesterday':
+        return (date.today() - timedelta(days=1)).isoformat()
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise CliError(f'日期格式不正确: {value}（应为 YYYY-MM-DD）')
+
+
+def findTask(store, ref):
+    """按id、完整名称或名称中唯一的一部分找到任务"""
+    tasks = store.tasks()
+    if ref.isdigit():
+        task = store.task(int(ref))
+        if task is not None:
+            return task
+    for task in tasks:
+        if task['name'] == ref:
+            return task
+    found = [task for task in tasks if ref.lower() in task['name'].lower()]
+    if len(found) == 1:
+        return found[0]
+    if not found:
+        raise CliError(f'找不到任务: {ref}')
+    raise CliError(f'“{ref}”对应多个任务: ' + '、'.join(task['name'] for task in found))
+
+
+# 命令
+
+def status(store, args, out, ops):
+    date_str = parseDate(args.date)
+    print(f'{date_str}  打卡第 {store.daysPassed(date_str)} 天', file=out)
+    for task in store.tasks():
+        mark = '✓' if store.isCompleted(task['id'], date_str) else '·'
+        note = store.note(task['id'], date_str)
+        print(f"  [{mark}] {task['id']:>3}  {task['name']}" + (f'  — {note}' if note else ''), file=out)
+
+
+def tasks(store, args, out, ops):
+    for task in store.tasks():
+        print(f"{task['id']:>3}  {task['name']}", file=out)
+
+
+def setCompletion(done):
+    def command(store, args, out, ops):
+        task = findTask(store, args.task)
+        date_str = parseDate(args.date)
+        if store.isCompleted(task['id'], date_str) == done:
+            print(f"{date_str} {task['name']} {'已经打过卡' if done else '本来就没有打卡'}", file=out)
+            return
+        store.setCompleted(task['id'], date_str, done)
+        ops.append({'op': 'check' if done else 'uncheck', 'task': task['id'], 'date': date_str})
+        print(f"{date_str} {task['name']} {'已打卡 ✓' if done else '已取消打卡'}", file=out)
+    return command
+
+
+def note(store, args, out, ops):
+    task = findTask(store, args.task)
+    date_str = parseDate(args.date)
+    text = ' '.join(args.text)
+    store.setNote(task['id'], date_str, text)
+    ops.append({'op': 'note', 'task': task['id'], 'date': date_str})
+    print(f"{date_str} {task['name']} 完成情况: {text}" if text else f"{date_str} {task['name']} 已清空完成情况", file=out)
+
+
+def history(store, args, out, ops):
+    if args.month is not None:
+        if args.month == '':
+            first = date.today().replace(day=1)
+        else:
+            try:
+                year, month = map(int, args.month.split('-'))
+                first = date(year, month, 1)
+            except ValueError:
+                raise CliError(f'月份格式不正确: {args.month}（应为 YYYY-MM）')
+        last = first.replace(day=calendar.monthrange(first.year, first.month)[1])
+    else:
+        last = date.today()
+        first = last - timedelta(days=args.days - 1)
+    task = findTask(store, args.task) if args.task else None
+    names = {t['id']: t['name'] for t in store.tasks()}
+    completed = set(store.completedDatesBetween(first.isoformat(), last.isoformat()))
+    day = first
+    count = 0
+    while day <= last:
+        date_str = day.isoformat()
+        if task is not None:
+            done = store.isCompleted(task['id'], date_str)
+            text = store.note(task['id'], date_str)
+            count += done
+            print(f"{date_str}  {'✓' if done else '·'}" + (f'  {text}' if text else ''), file=out)
+        else:
+            done_names = store.tasksCompletedOn(date_str) if date_str in completed else []
+            count += bool(done_names)
+            print(f"{date_str}  {len(done_names)}/{len(names)}  " + '、'.join(done_names), file=out)
+        day += timedelta(days=1)
+    days = (last - first).days + 1
+    print(f"{'完成' if task is not None else '有打卡的日期'} {count}/{days} 天", file=out)
+
+
+COMMANDS = {
+    'status': status,
+    'tasks': tasks,
+    'checkin': setCompletion(True),
+    'checkout': setCompletion(False),
+    'note': note,
+    'history': history,
+}
+
+
+def buildParser():
+    parser = argparse.ArgumentParser(prog='main.py', description='每日打卡（命令行模式，不带命令时启动界面）')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--profile', help='用户名（默认是最近使用的用户）')
+    commands = parser.add_subparsers(dest='command', metavar='命令')
+    commands.required = True
+
+    status_parser = commands.add_parser('status', parents=[common], help='某天（默认今天）各任务的完成情况')
+    status_parser.add_argument('--date')
+    commands.add_parser('tasks', parents=[common], help='列出任务')
+    for name, help_text in (('checkin', '打卡'), ('checkout', '取消打卡')):
+        sub = commands.add_parser(name, parents=[common], help=help_text)
+        sub.add_argument('task', help='任务id、名称或名称的一部分')
+        sub.add_argument('--date', help='日期，默认今天（也可以是 yesterday）')
+    note_parser = commands.add_parser('note', parents=[common], help='记录完成情况（内容为空时清空）')
+    note_parser.add_argument('task')
+    note_parser.add_argument('text', nargs='*')
+    note_parser.add_argument('--date')
+    history_parser = commands.add_parser('history', parents=[common], help='按日期列出打卡记录')
+    history_parser.add_argument('--month', nargs='?', const='', help='某月（默认本月），格式 YYYY-MM')
+    history_parser.add_argument('--days', type=int, default=7, help='最近几天（默认7天）')
+    history_parser.add_argument('--task', help='只看一个任务')
+    return parser
+
+
+def execute(store, args, out, err):
+    """在 store 上执行已经解析的命令，返回 (退出码, 执行的修改)"""
+    ops = []
+    try:
+        COMMANDS[args.command](store, args, out, ops)
+        return 0, ops
+    except CliError as e:
+        print(e, file=err)
+        return 1, ops
+
+
+def main(argv):
+    args = buildParser().parse_args(argv)
+    # 界面已经在运行时交给它执行（结果立即显示在界面上，也不会两个进程同时写数据文件）
+    reply = forward({'argv': argv}, addressFor(os.getcwd()))
+    if reply is not None:
+        sys.stdout.write(reply.get('output', ''))
+        sys.stderr.write(reply.get('error', ''))
+        return reply.get('code', 0)
+    profiles = ProfileManager()
+    if args.profile is not None and args.profile not in profiles.names():
+        print(f'用户不存在: {args.profile}', file=sys.stderr)
+        return 1
+    # 指定的用户只在这一次使用，不改变界面下次打开的用户；
+    # 结束时关闭并写入修改（和界面一样是日志追加或数据库事务）
+    with profiles.borrow(args.profile) as store:
+        return execute(store, args, sys.stdout, sys.stderr)[0]
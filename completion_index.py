@@ -0,0 +1,206 @@
+from datetime import date, timedelta
+
+# 每个字节值对应的1的个数，配合 bytes.translate 快速统计
+_POPCOUNT_TABLE = bytes(bin(i).count('1') for i in range(256))
+
+
+def parseDate(date_str):
+    """'YYYY-MM-DD' 转换为 date"""
+    return date.fromisoformat(date_str)
+
+
+def popcount(bits):
+    """统计 bytearray 中1的个数"""
+    return sum(bits.translate(_POPCOUNT_TABLE))
+
+
+class CompletionIndex:
+    """任务打卡记录的位图索引
+
+    每个任务一个 bytearray，第 n 位表示 origin 之后第 n 天是否完成，
+    标记、取消、查询都是 O(1)。另外按天记录完成的任务数，
+    方便日历直接判断某天是否需要高亮。
+    """
+
+    def __init__(self, origin):
+        if isinstance(origin, str):
+            origin = parseDate(origin)
+        self.origin = origin
+        self._bits = {}
+        self._counts = {}
+        self._day_totals = {}
+
+    def offset(self, date_str):
+        """日期相对 origin 的天数"""
+        return (parseDate(date_str) - self.origin).days
+
+    def dateAt(self, offset):
+        return (self.origin + timedelta(days=offset)).isoformat()
+
+    def _rebase(self, offset):
+        """日期早于 origin 时整体前移 origin（按整字节移动）"""
+        shift_bytes = (-offset + 7) // 8
+        shift_days = shift_bytes * 8
+        self.origin -= timedelta(days=shift_days)
+        for task_id, bits in self._bits.items():
+            self._bits[task_id] = bytearray(shift_bytes) + bits
+        self._day_totals = {o + shift_days: n for o, n in self._day_totals.items()}
+
+    def addTask(self, task_id):
+        if task_id not in self._bits:
+            self._bits[task_id] = bytearray()
+            self._counts[task_id] = 0
+
+    def taskIds(self):
+        return list(self._bits)
+
+    def removeTask(self, task_id):
+        bits = self._bits.pop(task_id, None)
+        self._counts.pop(task_id, None)
+        if bits is None:
+            return
+        for offset in self._iterOffsets(bits, 0, len(bits) * 8 - 1):
+            self._decDay(offset)
+
+    def _decDay(self, offset):
+        n = self._day_totals.get(offset, 0) - 1
+        if n > 0:
+            self._day_totals[offset] = n
+        else:
+            self._day_totals.pop(offset, None)
+
+    def mark(self, task_id, date_str):
+        """标记完成，返回状态是否发生变化"""
+        offset = self.offset(date_str)
+        if offset < 0:
+            self._rebase(offset)
+            offset = self.offset(date_str)
+        self.addTask(task_id)
+        bits = self._bits[task_id]
+        byte, mask = offset >> 3, 1 << (offset & 7)
+        if byte >= len(bits):
+            bits.extend(bytearray(byte - len(bits) + 1))
+        if bits[byte] & mask:
+            return False
+        bits[byte] |= mask
+        self._counts[task_id] += 1
+        self._day_totals[offset] = self._day_totals.get(offset, 0) + 1
+        return True
+
+    def markAll(self, task_id, date_strs):
+        """批量标记完成（加载数据时使用），返回新标记的个数"""
+        self.addTask(task_id)
+        origin = self.origin.toordinal()
+        offsets = [date.fromisoformat(d).toordinal() - origin for d in date_strs]
+        if not offsets:
+            return 0
+        low = min(offsets)
+        if low < 0:
+            self._rebase(low)
+            shift = origin - self.origin.toordinal()
+            offsets = [o + shift for o in offsets]
+        bits = self._bits[task_id]
+        size = (max(offsets) >> 3) + 1
+        if size > len(bits):
+            bits.extend(bytearray(size - len(bits)))
+        totals = self._day_totals
+        added = 0
+        for offset in offsets:
+            byte, mask = offset >> 3, 1 << (offset & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                totals[offset] = totals.get(offset, 0) + 1
+                added += 1
+        self._counts[task_id] += added
+        return added
+
+    def unmark(self, task_id, date_str):
+        """取消完成，返回状态是否发生变化"""
+        if not self.test(task_id, date_str):
+            return False
+        offset = self.offset(date_str)
+        self._bits[task_id][offset >> 3] &= ~(1 << (offset & 7)) & 0xFF
+        self._counts[task_id] -= 1
+        self._decDay(offset)
+        return True
+
+    def test(self, task_id, date_str):
+        bits = self._bits.get(task_id)
+        if not bits:
+            return False
+        offset = self.offset(date_str)
+        byte = offset >> 3
+        if offset < 0 or byte >= len(bits):
+            return False
+        return bool(bits[byte] & (1 << (offset & 7)))
+
+    def count(self, task_id):
+        """任务累计完成次数"""
+        return self._counts.get(task_id, 0)
+
+    def countBetween(self, task_id, first, last):
+        """统计 [first, last] 内的完成次数"""
+        bits = self._bits.get(task_id)
+        if not bits:
+            return 0
+        start = max(self.offset(first), 0)
+        end = min(self.offset(last), len(bits) * 8 - 1)
+        if start > end:
+            return 0
+        # 首尾不满一个字节的部分逐位统计，中间整字节查表
+        total = 0
+        while start <= end and start & 7:
+            total += (bits[start >> 3] >> (start & 7)) & 1
+            start += 1
+        while end >= start and (end & 7) != 7:
+            total += (bits[end >> 3] >> (end & 7)) & 1
+            end -= 1
+        if start <= end:
+            total += popcount(bits[start >> 3:(end >> 3) + 1])
+        return total
+
+    def _iterOffsets(self, bits, start, end):
+        end = min(end, len(bits) * 8 - 1)
+        for byte in range(max(start, 0) >> 3, (end >> 3) + 1 if end >= 0 else 0):
+            value = bits[byte]
+            if not value:
+                continue
+            for bit in range(8):
+                offset = (byte << 3) + bit
+                if value & (1 << bit) and start <= offset <= end:
+                    yield offset
+
+    def dates(self, task_id):
+        """按日期顺序返回任务的全部完成日期（用于写回旧的列表格式）"""
+        bits = self._bits.get(task_id)
+        if not bits:
+            return []
+        return [self.dateAt(o) for o in self._iterOffsets(bits, 0, len(bits) * 8 - 1)]
+
+    def datesBetween(self, task_id, first, last):
+        """按日期顺序返回 [first, last] 内的完成日期"""
+        bits = self._bits.get(task_id)
+        if not bits:
+            return []
+        return [self.dateAt(o) for o in self._iterOffsets(bits, self.offset(first), self.offset(last))]
+
+    def completedYears(self):
+        """有完成记录的年份"""
+        return {(self.origin + timedelta(days=o)).year for o in self._day_totals}
+
+    def ordinals(self, task_id):
+        """按顺序返回任务全部完成日期的序号（date.toordinal）"""
+        bits = self._bits.get(task_id)
+        if not bits:
+            return []
+        base = self.origin.toordinal()
+        return [base + o for o in self._iterOffsets(bits, 0, len(bits) * 8 - 1)]
+
+    def completedDatesBetween(self, first, last):
+        """返回 [first, last] 内至少完成一个任务的日期集合"""
+        start, end = self.offset(first), self.offset(last)
+        if end - start > len(self._day_totals):
+            offsets = (o for o in self._day_totals if start <= o <= end)
+        else:
+            offsets = (o for o in range(start, end + 1) if o in self._day_totals)
+        return {self.dateAt(o) for o in offsets}
@@ -0,0 +1,77 @@
+import os
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+from sharded_storage import shardsPathFor
+from storage import dataFilesFor
+
+
+class DataFileWatcher(QObject):
+    """监视数据文件，被其他进程修改时发出 changed（合并成一次）
+
+    监视数据文件所在目录（文件被替换、日志被创建或删除）和现有的数据文件
+    （追加日志）。自己的写入同样会触发，由接收方判断有没有其他进程的修改。
+    有的文件系统（网络盘、同步盘）不发通知，另外每隔 poll_ms 检查一次。
+    """
+
+    changed = pyqtSignal()
+
+    def __init__(self, debounce_ms=300, poll_ms=5000, parent=None):
+        super().__init__(parent)
+        self.data_file = None
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.fileChanged.connect(self._onChanged)
+        self._watcher.directoryChanged.connect(self._onChanged)
+        # 连续的通知（写临时文件、重命名、刷盘）合并成一次
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(debounce_ms)
+        self._debounce.timeout.connect(self._emit)
+        self._poll = QTimer(self)
+        self._poll.setInterval(poll_ms)
+        self._poll.timeout.connect(self.changed)
+
+        # 统计信息
+        self.notifications = 0
+        self.emitted = 0
+
+    def watch(self, data_file):
+        """开始监视某份数据（切换用户、迁移存储后重新调用）"""
+        self.data_file = data_file
+        self._rewatch()
+        self._poll.start()
+
+    def stop(self):
+        self._debounce.stop()
+        self._poll.stop()
+        paths = self._watcher.files() + self._watcher.directories()
+        if paths:
+            self._watcher.removePaths(paths)
+
+    def schedule(self):
+        """稍后再发出一次 changed（现在不方便合并时）"""
+        self._debounce.start()
+
+    def _paths(self):
+        directory = os.path.dirname(os.path.abspath(self.data_file))
+        paths = [directory]
+        for path in [shardsPathFor(self.data_file)] + dataFilesFor(self.data_file):
+            if os.path.exists(path):
+                paths.append(os.path.abspath(path))
+        return paths
+
+    def _rewatch(self):
+        # 被替换或删除的文件会从监视列表中消失，每次都重新加入
+        wanted = set(self._paths())
+        current = set(self._watcher.files() + self._watcher.directories())
+        if current - wanted:
+            self._watcher.removePaths(list(current - wanted))
+        if wanted - current:
+            self._watcher.addPaths(sorted(wanted - current))
+
+    def _onChanged(self, path):
+        self.notifications += 1
+        self._debounce.start()
+
+    def _emit(self):
+        self._rewatch()
+        self.emitted += 1
+        self.changed.emit()
@@ -0,0 +1,102 @@
+import errno
+import os
+import threading
+
+
+def atomicWrite(path, data):
+    """原子地写入整个文件：先写临时文件并刷盘，再重命名覆盖
+
+    写入过程中崩溃时旧文件保持完整。
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsyncDir(os.path.dirname(os.path.abspath(path)))
+
+
+def appendDurable(path, data):
+    """追加写入并刷盘"""
+    with open(path, 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def fsyncDir(path):
+    """把目录项（重命名、删除）刷到磁盘，Windows 不支持时忽略"""
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class FileLock:
+    """跨进程的建议锁，用 with 使用，同一线程中可以嵌套
+
+    Unix 上是 flock，Windows 上是 msvcrt.locking；锁文件只用来加锁，不删除。
+    同一进程的其他线程也会等待（内部另有线程锁）。只约束同样加锁的进程，
+    不加锁直接改写文件的程序（同步盘等）靠修改检测处理。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        self._depth += 1
+        if self._depth == 1:
+            try:
+                self._file = open(self.path, 'a+b')
+                _lockFile(self._file)
+            except OSError:
+                # 无法创建锁文件（只读目录等）时不加锁，只保留线程间互斥
+                if self._file is not None:
+                    self._file.close()
+                self._file = None
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            try:
+                _unlockFile(self._file)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+
+if os.name == 'nt':
+    import msvcrt
+
+    def _lockFile(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError as e:
+                # LK_LOCK 重试10秒后仍被占用时抛出，继续等待
+                if e.errno != errno.EDEADLK:
+                    raise
+
+    def _unlockFile(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lockFile(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlockFile(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,212 @@
+import csv
+import json
+import os
+import re
+from datetime import date
+
+# 导出的列：任务名称、日期、是否完成、完成情况
+FIELDS = ('task', 'date', 'completed', 'note')
+
+# 导入时识别的列名（小写并去掉空格和标点之后比较），兼容常见习惯打卡应用导出的CSV，
+# 例如 HabitBull（HabitName, CalendarDate, Value, CommentText）
+COLUMN_NAMES = {
+    'task': {'task', 'habit', 'habitname', 'name', 'title', '任务', '任务名称', '习惯'},
+    'date': {'date', 'day', 'calendardate', 'entrydate', 'checkindate', '日期'},
+    'completed': {'completed', 'done', 'value', 'status', 'checked', '完成', '是否完成', '打卡'},
+    'note': {'note', 'notes', 'comment', 'commenttext', 'memo', '完成情况', '备注'},
+}
+
+TRUE_WORDS = {'true', 'yes', 'y', 'done', 'x', '✓', '✔', '是', '完成', '已完成', 'yes_manual', 'yes_auto'}
+FALSE_WORDS = {'', 'false', 'no', 'n', '否', '未完成', 'unknown', 'skip'}
+
+DATE_PATTERNS = [
+    re.compile(r'^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})'),
+    re.compile(r'^(\d{4})(\d{2})(\d{2})$'),
+]
+
+
+def formatFor(path):
+    """根据扩展名判断格式：csv 或 jsonl"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.csv', '.txt'):
+        return 'csv'
+    if ext in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    raise ValueError(f'不支持的文件格式: {ext or path}')
+
+
+def columnFor(header):
+    name = re.sub(r'[\W_]+', '', header.strip().lower())
+    for field, names in COLUMN_NAMES.items():
+        if name in names:
+            return field
+    return None
+
+
+def parseDate(value):
+    """'YYYY-MM-DD'、'YYYY/M/D'、'YYYYMMDD'（可以带时间）转换为 'YYYY-MM-DD'，无法识别时返回 None"""
+    value = str(value).strip()
+    for pattern in DATE_PATTERNS:
+        m = pattern.match(value)
+        if m:
+            try:
+                return date(*map(int, m.groups())).isoformat()
+            except ValueError:
+                return None
+    return None
+
+
+def parseDone(value):
+    """是否完成：布尔值、数字（大于0为完成）或常见的是/否写法"""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value > 0
+    text = str(value).strip().lower()
+    if text in TRUE_WORDS:
+        return True
+    if text in FALSE_WORDS:
+        return False
+    try:
+        return float(text) > 0
+    except ValueError:
+        return False
+
+
+def cell(row, index):
+    return row[index] if index is not None and index < len(row) else ''
+
+
+# 导出
+
+def historyRecords(store):
+    """逐行生成 {task, date, completed, note}"""
+    names = {task['id']: task['name'] for task in store.tasks()}
+    for task_id, date_str, done, note in store.iterHistory():
+        yield {'task': names[task_id], 'date': date_str, 'completed': done, 'note': note}
+
+
+def exportHistory(store, path, fmt=None):
+    """逐行写出全部历史记录，返回行数"""
+    fmt = fmt or formatFor(path)
+    count = 0
+    tmp_path = path + '.tmp'
+    # CSV 带 BOM，方便直接用 Excel 打开
+    with open(tmp_path, 'w', encoding='utf-8-sig' if fmt == 'csv' else 'utf-8', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for record in historyRecords(store):
+                writer.writerow([record['task'], record['date'], int(record['completed']), record['note']])
+                count += 1
+        else:
+            for record in historyRecords(store):
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+# 导入
+
+def readCsv(f):
+    """逐行读取CSV，生成 (任务名称, 日期, 是否完成, 完成情况)
+
+    支持两种布局：每行一条记录（任务、日期、是否完成、完成情况），
+    或者第一列是日期、其余每列是一个习惯（例如 Loop Habit Tracker 的 Checkmarks.csv）。
+    """
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = {}
+    for i, name in enumerate(header):
+        field = columnFor(name)
+        if field is not None and field not in columns:
+            columns[field] = i
+    if 'task' in columns and 'date' in columns:
+        for row in reader:
+            if not row:
+                continue
+            # 没有“是否完成”列时，出现在文件中就表示完成
+            done = parseDone(cell(row, columns['completed'])) if 'completed' in columns else True
+            yield (cell(row, columns['task']).strip(), parseDate(cell(row, columns['date'])), done,
+                   cell(row, columns.get('note')))
+    elif columns.get('date') == 0:
+        habits = [name.strip() for name in header[1:]]
+        for row in reader:
+            if not row:
+                continue
+            date_str = parseDate(row[0])
+            for name, value in zip(habits, row[1:]):
+                if name:
+                    yield name, date_str, parseDone(value), ''
+    else:
+        raise ValueError('无法识别的CSV格式：需要“任务”和“日期”列，或者第一列是日期')
+
+
+def readJsonl(f):
+    """逐行读取JSON Lines，每行一个对象，字段名和CSV的列名相同"""
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            # 无法解析的行作为跳过的行统计
+            yield '', None, False, ''
+            continue
+        fields = {}
+        for key, value in record.items():
+            field = columnFor(key)
+            if field is not None and field not in fields:
+                fields[field] = value
+        note = fields.get('note')
+        if isinstance(note, (list, dict)) or isinstance(fields.get('task'), (list, dict)):
+            # 名称或完成情况不是单个值，同样作为跳过的行
+            yield '', None, False, ''
+            continue
+        done = parseDone(fields['completed']) if 'completed' in fields else True
+        yield (str(fields.get('task', '')).strip(), parseDate(fields.get('date', '')), done,
+               '' if note is None else str(note))
+
+
+def readHistory(path, fmt=None):
+    """逐行读取历史记录文件，生成 (任务名称, 日期, 是否完成, 完成情况)，日期无法识别时为 None"""
+    fmt = fmt or formatFor(path)
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        yield from (readCsv(f) if fmt == 'csv' else readJsonl(f))
+
+
+def importHistory(store, path, fmt=None):
+    """把历史记录合并到当前数据中，返回统计 {rows, checked, notes, added_tasks, skipped}
+
+    按名称对应任务，没有的任务自动添加；只添加打卡和完成情况，不会取消已有的打卡。
+    全部修改在 store.batch() 中执行，最后只写入一次。
+    """
+    result = {'rows': 0, 'checked': 0, 'notes': 0, 'added_tasks': 0, 'skipped': 0}
+    ids = {}
+    for task in store.tasks():
+        ids.setdefault(task['name'], task['id'])
+    with store.batch():
+        for name, date_str, done, note in readHistory(path, fmt):
+            result['rows'] += 1
+            if not name or date_str is None:
+                result['skipped'] += 1
+                continue
+            if not done and not note:
+                continue
+            task_id = ids.get(name)
+            if task_id is None:
+                task_id = ids[name] = store.addTask(name)
+                result['added_tasks'] += 1
+            if done and not store.isCompleted(task_id, date_str):
+                store.setCompleted(task_id, date_str, True)
+                result['checked'] += 1
+            if note:
+                store.setNote(task_id, date_str, note)
+                result['notes'] += 1
+    return result
@@ -1,22 +1,94 @@
 import sys
-import json
+from startup import StartupTimeline
 import os
+import single_instance
+
+if __name__ == '__main__':
+    # 带命令时（例如 main.py checkin 读书）使用命令行模式，不导入 PyQt
+    if len(sys.argv) > 1 and not sys.argv[1].startswith('-'):
+        import cli
+        sys.exit(cli.main(sys.argv[1:]))
+    # 同一个数据目录只运行一个实例：已经在运行时让它显示窗口，然后立即退出
+    instance = single_instance.InstanceServer(single_instance.addressFor(os.getcwd()))
+    if not instance.listen():
+        single_instance.forward({'argv': sys.argv[1:]}, instance.address)
+        sys.exit(0)
+
+import io
+import json
 from datetime import datetime, timedelta
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QListWidget, QListWidgetItem, QCheckBox, QPushButton, QCalendarWidget, 
-    QLabel, QLineEdit, QMessageBox, QFontDialog, QSplitter, QFrame, QInputDialog, QTextEdit, QComboBox, QSizePolicy, QMenuBar, QAction
+    QLabel, QLineEdit, QMessageBox, QFontDialog, QSplitter, QFrame, QInputDialog, QTextEdit, QComboBox, QSizePolicy, QMenuBar, QAction,
+    QFileDialog, QListView, QAbstractItemView, QActionGroup
 )
-from PyQt5.QtCore import Qt, QDate
+from PyQt5.QtCore import Qt, QDate, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QColor, QPalette, QIcon, QTextCharFormat
+from persistence import WriteBehindSaver, PersistenceWorker, MainThreadInvoker
+from api_server import ApiServer, DEFAULT_PORT as DEFAULT_API_PORT, portFromArgv
+from calendar_highlight import CalendarHighlighter
+from file_watcher import DataFileWatcher
+from task_model import TaskListModel, TaskItemDelegate
+from profiles import ProfileManager
+import cli
+import analytics
+import interchange
+from theme import ThemeManager, setVariant
 
 class ClockInApp(QMainWindow):
-    def __init__(self):
+    # 后台写入失败（从写入线程发出，在界面线程显示）
+    writeFailed = pyqtSignal(str)
+
+    def __init__(self, timeline=None, api_port=None, instance=None):
         super().__init__()
+        self.timeline = timeline or StartupTimeline()
+        self._first_painted = False
+        # 完成情况的输入只标记脏数据，空闲后再合并写入
+        self.saver = WriteBehindSaver(self.writeDataFile, parent=self)
+        # 磁盘写入和刷盘在后台线程执行，界面线程不等待
+        self.writer = PersistenceWorker(on_error=lambda e: self.writeFailed.emit(str(e)))
+        self.writeFailed.connect(self.onWriteFailed)
+        # 统计分析和搜索窗口，第一次打开时创建
+        self.analytics_dialog = None
+        self.search_dialog = None
+        # 多个用户：启动时只打开最近使用的用户，最近用过的用户保持打开以便快速切换
+        self.profiles = ProfileManager()
+        # 本地HTTP接口（--api 或菜单启动），对 store 的访问都在界面线程中依次执行
+        self.api_server = None
+        self.api_invoker = MainThreadInvoker(self)
+        # 其他进程（命令行、另一份程序、同步盘）修改数据文件后合并进来
+        self.file_watcher = DataFileWatcher(parent=self)
+        self.file_watcher.changed.connect(self.mergeExternalChanges)
         self.initUI()
+        self.timeline.mark('ui')
         self.loadData()
         self.updateDayCount()
+        self.timeline.mark('load')
+        if api_port is not None:
+            self.startApiServer(api_port)
+        # 之后的启动转发过来的参数（显示窗口或执行命令）在界面线程中处理
+        self.instance = instance
+        if instance is not None:
+            instance.serve(lambda request: self.api_invoker.submit(
+                lambda: self.handleInstanceRequest(request)).result())
+        # 日历高亮不影响首屏，等第一次绘制之后再做（见 finishStartup）
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self._first_painted:
+            self._first_painted = True
+            self.timeline.mark('first_paint')
+            QTimer.singleShot(0, self.finishStartup)
+    
+    def finishStartup(self):
+        """首屏显示后再执行的初始化"""
         self.updateCalendar()
+        self.updateStats()
+        # 读取保存的搜索索引，之后编辑完成情况时增量更新
+        self.store.loadSearchIndex()
+        self.timeline.mark('interactive')
+        self.timeline.finish()
     
     def initUI(self):
         self.setWindowTitle('每日打卡')
@@ -32,6 +104,10 @@ class ClockInApp(QMainWindow):
         # 设置护眼颜色方案
         self.setEyeFriendlyColors()
         
+        # 整个应用只使用一份样式表，配色或字体大小变化时才重新生成
+        self.theme = ThemeManager(QApplication.instance())
+        self.theme.apply()
+        
         # 主布局
         main_widget = QWidget()
         main_layout = QVBoxLayout()
@@ -40,30 +116,16 @@ class ClockInApp(QMainWindow):
         
         # 顶部设置区域
         settings_frame = QFrame()
-        settings_frame.setStyleSheet('''
-            QFrame {
-                background-color: #F0F4F8;
-                border-radius: 8px;
-                padding: 5px;
-            }
-        ''')
+        settings_frame.setObjectName('settingsFrame')
         settings_layout = QHBoxLayout()
         settings_layout.setSpacing(15)
         
         # 初始日期设置
         self.start_date_label = QLabel('初始日期:')
-        self.start_date_label.setStyleSheet('color: #2C3E50; font-weight: bold;')
+        self.start_date_label.setObjectName('startDateLabel')
         self.start_date_edit = QLineEdit()
         self.start_date_edit.setText(datetime.now().strftime('%Y-%m-%d'))
-        self.start_date_edit.setStyleSheet('''
-            QLineEdit {
-                background-color: #F0F4F8;
-                border: 2px solid #BDC3C7;
-                border-radius: 5px;
-                padding: 5px;
-                color: #2C3E50;
-            }
-        ''')
+        self.start_date_edit.setObjectName('startDateEdit')
         
         settings_layout.addWidget(self.start_date_label)
         settings_layout.addWidget(self.start_date_edit)
@@ -79,12 +141,12 @@ class ClockInApp(QMainWindow):
         title_label = QLabel('每日计划打卡')
         title_font = QFont('Microsoft YaHei', 16, QFont.Bold)
         title_label.setFont(title_font)
-        title_label.setStyleSheet('color: #2C3E50; padding: 5px;')
+        title_label.setObjectName('titleLabel')
         
         self.day_count_label = QLabel('今天是打卡的第 0 天')
         day_count_font = QFont('Microsoft YaHei', 14)
         self.day_count_label.setFont(day_count_font)
-        self.day_count_label.setStyleSheet('color: #27AE60; font-weight: bold; padding: 5px;')
+        self.day_count_label.setObjectName('dayCountLabel')
         
         header_layout.addWidget(title_label)
         header_layout.addStretch()
@@ -94,40 +156,29 @@ class ClockInApp(QMainWindow):
         
         # 今日任务区域 - 独占一行
         task_frame = QFrame()
-        task_frame.setStyleSheet('''
-            QFrame {
-                background-color: #E8F6F3;
-                border-radius: 8px;
-                padding: 10px;
-            }
-        ''')
+        task_frame.setObjectName('taskFrame')
         task_layout = QVBoxLayout()
         task_layout.setSpacing(5)
         task_layout.setContentsMargins(5, 5, 5, 5)
         
         task_title = QLabel('今日任务')
         task_title.setFont(QFont('Microsoft YaHei', 16, QFont.Bold))
-        task_title.setStyleSheet('color: #16A085; padding: 2px;')
+        task_title.setObjectName('taskTitle')
         task_layout.addWidget(task_title)
         
-        self.task_list = QListWidget()
+        # 任务列表使用模型/委托绘制，只有正在编辑的行才创建编辑框
+        self.task_list = QListView()
         self.task_list.setMinimumHeight(300)
-        self.task_list.setStyleSheet('''
-            QListWidget {
-                background-color: #D5F4E6;
-                border: 2px solid #BDC3C7;
-                border-radius: 5px;
-                padding: 5px;
-            }
-            QListWidget::item {
-                padding: 12px;
-                border-radius: 4px;
-                font-size: 14px;
-            }
-            QListWidget::item:hover {
-                background-color: #B8E6D3;
-            }
-        ''')
+        self.task_list.setMouseTracking(True)
+        self.task_list.setUniformItemSizes(True)
+        self.task_list.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.task_list.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.task_list.setObjectName('taskList')
+        self.task_model = TaskListModel(None, self)
+        self.task_delegate = TaskItemDelegate(self.task_list)
+        self.task_delegate.setColors(self.theme.colors())
+        self.task_list.setModel(self.task_model)
+        self.task_list.setItemDelegate(self.task_delegate)
         task_layout.addWidget(self.task_list)
         
         # 任务管理按钮
@@ -135,47 +186,11 @@ class ClockInApp(QMainWindow):
         button_layout.setSpacing(10)
         
         self.add_task_btn = QPushButton('添加任务')
-        self.add_task_btn.setStyleSheet('''
-            QPushButton {
-                background-color: #27AE60;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 10px 20px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #229954;
-            }
-        ''')
+        setVariant(self.add_task_btn, 'success')
         self.delete_task_btn = QPushButton('删除任务')
-        self.delete_task_btn.setStyleSheet('''
-            QPushButton {
-                background-color: #E74C3C;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 10px 20px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #C0392B;
-            }
-        ''')
+        setVariant(self.delete_task_btn, 'danger')
         self.edit_task_btn = QPushButton('修改任务')
-        self.edit_task_btn.setStyleSheet('''
-            QPushButton {
-                background-color: #F39C12;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 10px 20px;
-                font-weight: bold;
-            }
-            QPushButton:hover {
-                background-color: #D68910;
-            }
-        ''')
+        setVariant(self.edit_task_btn, 'warning')
         
         button_layout.addWidget(self.add_task_btn)
         button_layout.addWidget(self.delete_task_btn)
@@ -187,75 +202,22 @@ class ClockInApp(QMainWindow):
         
         # 打卡日历区域 - 独占一行
         calendar_frame = QFrame()
-        calendar_frame.setStyleSheet('''
-            QFrame {
-                background-color: #FEF9E7;
-                border-radius: 8px;
-                padding: 10px;
-            }
-        ''')
+        calendar_frame.setObjectName('calendarFrame')
         calendar_layout = QVBoxLayout()
         calendar_layout.setSpacing(2)
         calendar_layout.setContentsMargins(3, 3, 3, 3)
         
         calendar_title = QLabel('打卡日历')
         calendar_title.setFont(QFont('Microsoft YaHei', 16, QFont.Bold))
-        calendar_title.setStyleSheet('color: #F39C12; padding: 0px; margin: 0px;')
+        calendar_title.setObjectName('calendarTitle')
         calendar_layout.addWidget(calendar_title)
         
         self.calendar = QCalendarWidget()
-        self.calendar.setMinimumDate(QDate.currentDate().addMonths(-12))
-        self.calendar.setMaximumDate(QDate.currentDate().addMonths(12))
         self.calendar.setMinimumHeight(250)
         self.calendar.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        self.calendar.setStyleSheet('''
-            QCalendarWidget {
-                background-color: #F0F4F8;
-                border: 2px solid #F39C12;
-                border-radius: 5px;
-            }
-            QCalendarWidget QTableView {
-                background-color: #F0F4F8;
-                selection-background-color: #F39C12;
-                selection-color: white;
-                alternate-background-color: #FEF9E7;
-                font-size: 12px;
-            }
-            QCalendarWidget QToolButton {
-                background-color: #F39C12;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                padding: 5px;
-                font-weight: bold;
-                font-size: 13px;
-            }
-            QCalendarWidget QToolButton:hover {
-                background-color: #E67E22;
-            }
-            QCalendarWidget QToolButton#qt_calendar_prevmonth,
-            QCalendarWidget QToolButton#qt_calendar_nextmonth {
-                background-color: #F39C12;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                padding: 5px;
-                font-weight: bold;
-            }
-            QCalendarWidget QToolButton#qt_calendar_prevmonth:hover,
-            QCalendarWidget QToolButton#qt_calendar_nextmonth:hover {
-                background-color: #E67E22;
-            }
-            QCalendarWidget QSpinBox {
-                background-color: #F0F4F8;
-                border: 1px solid #BDC3C7;
-                border-radius: 3px;
-                padding: 2px;
-                color: #2C3E50;
-                font-size: 12px;
-            }
-        ''')
         calendar_layout.addWidget(self.calendar)
+        # 只格式化当前显示的月份，翻页时按需加载
+        self.highlighter = CalendarHighlighter(self.calendar, self.completedDatesBetween)
         
         calendar_frame.setLayout(calendar_layout)
         main_layout.addWidget(calendar_frame)
@@ -268,50 +230,16 @@ class ClockInApp(QMainWindow):
         self.delete_task_btn.clicked.connect(self.deleteTask)
         self.edit_task_btn.clicked.connect(self.editTask)
         self.calendar.selectionChanged.connect(self.onDateSelected)
+        self.calendar.currentPageChanged.connect(self.highlighter.showPage)
+        self.task_model.completionToggled.connect(self.toggleTaskCompletion)
+        self.task_model.notesEdited.connect(self.saveTaskNotes)
+        self.task_delegate.editingFinished.connect(self.saver.flush)
+        self.task_delegate.closeEditor.connect(self.saver.flush)
     
     def createMenuBar(self):
         """创建菜单栏"""
         menubar = self.menuBar()
         
-        # 设置菜单栏样式
-        menubar.setStyleSheet('''
-            QMenuBar {
-                background-color: #F0F4F8;
-                color: #2C3E50;
-                font-size: 14px;
-                border-bottom: 1px solid #BDC3C7;
-            }
-            QMenuBar::item {
-                background-color: transparent;
-                padding: 5px 10px;
-                border-radius: 3px;
-            }
-            QMenuBar::item:selected {
-                background-color: #3498DB;
-                color: white;
-            }
-            QMenu {
-                background-color: #F0F4F8;
-                color: #2C3E50;
-                border: 1px solid #BDC3C7;
-                border-radius: 5px;
-                padding: 5px;
-            }
-            QMenu::item {
-                padding: 8px 20px;
-                border-radius: 3px;
-            }
-            QMenu::item:selected {
-                background-color: #3498DB;
-                color: white;
-            }
-            QMenu::separator {
-                height: 1px;
-                background-color: #BDC3C7;
-                margin: 5px 0;
-            }
-        ''')
-        
         # 文件菜单
         file_menu = menubar.addMenu('文件')
         
@@ -321,6 +249,65 @@ class ClockInApp(QMainWindow):
         save_date_action.triggered.connect(self.saveStartDate)
         file_menu.addAction(save_date_action)
         
+        # 批量补打卡
+        backfill_action = QAction('批量补打卡...', self)
+        backfill_action.setShortcut('Ctrl+B')
+        backfill_action.triggered.connect(self.backfillRange)
+        file_menu.addAction(backfill_action)
+        
+        file_menu.addSeparator()
+        
+        # 导入/导出JSON
+        import_action = QAction('导入JSON...', self)
+        import_action.triggered.connect(self.importJson)
+        file_menu.addAction(import_action)
+        
+        export_action = QAction('导出JSON...', self)
+        export_action.triggered.connect(self.exportJson)
+        file_menu.addAction(export_action)
+        
+        # 逐行导入/导出历史记录（CSV / JSON Lines）
+        import_history_action = QAction('导入历史记录 (CSV/JSONL)...', self)
+        import_history_action.triggered.connect(self.importHistory)
+        file_menu.addAction(import_history_action)
+        
+        export_history_action = QAction('导出历史记录 (CSV/JSONL)...', self)
+        export_history_action.triggered.connect(self.exportHistory)
+        file_menu.addAction(export_history_action)
+        
+        # 迁移到SQLite
+        self.migrate_action = QAction('迁移到SQLite存储', self)
+        self.migrate_action.triggered.connect(self.migrateToSqlite)
+        file_menu.addAction(self.migrate_action)
+        
+        # 迁移到按年分片存储
+        self.shard_action = QAction('迁移到按年分片存储', self)
+        self.shard_action.triggered.connect(self.migrateToShards)
+        file_menu.addAction(self.shard_action)
+        
+        file_menu.addSeparator()
+        
+        # 本地HTTP接口
+        self.api_action = QAction('本地HTTP接口', self)
+        self.api_action.setCheckable(True)
+        self.api_action.triggered.connect(self.toggleApiServer)
+        file_menu.addAction(self.api_action)
+        
+        # 编辑菜单
+        self.edit_menu = menubar.addMenu('编辑')
+        self.edit_menu.aboutToShow.connect(self.updateUndoActions)
+        
+        # 撤销/重做（正在编辑完成情况时由输入框自己处理）
+        self.undo_action = QAction('撤销', self)
+        self.undo_action.setShortcut('Ctrl+Z')
+        self.undo_action.triggered.connect(self.undoLast)
+        self.edit_menu.addAction(self.undo_action)
+        
+        self.redo_action = QAction('重做', self)
+        self.redo_action.setShortcuts(['Ctrl+Y', 'Ctrl+Shift+Z'])
+        self.redo_action.triggered.connect(self.redoLast)
+        self.edit_menu.addAction(self.redo_action)
+        
         # 视图菜单
         view_menu = menubar.addMenu('视图')
         
@@ -329,6 +316,57 @@ class ClockInApp(QMainWindow):
         change_font_action.setShortcut('Ctrl+F')
         change_font_action.triggered.connect(self.changeFont)
         view_menu.addAction(change_font_action)
+        
+        # 存储统计
+        save_stats_action = QAction('存储统计', self)
+        save_stats_action.triggered.connect(self.showSaveStats)
+        view_menu.addAction(save_stats_action)
+        
+        # 搜索完成情况
+        search_action = QAction('搜索完成情况', self)
+        search_action.setShortcut('Ctrl+Shift+F')
+        search_action.triggered.connect(self.showSearch)
+        view_menu.addAction(search_action)
+        
+        # 统计分析
+        analytics_action = QAction('统计分析', self)
+        analytics_action.triggered.connect(self.showAnalytics)
+        view_menu.addAction(analytics_action)
+        
+        # 用户菜单（切换用户）
+        self.profile_menu = menubar.addMenu('用户')
+        self.profile_group = QActionGroup(self)
+        self.profile_group.setExclusive(True)
+        self.updateProfileMenu()
+    
+    def updateProfileMenu(self):
+        """重新生成用户菜单：每个用户一项（前9个有 Ctrl+1~9 快捷键），以及新建/改名/删除"""
+        self.profile_menu.clear()
+        for action in self.profile_group.actions():
+            self.profile_group.removeAction(action)
+        for i, name in enumerate(self.profiles.names()):
+            action = QAction(name, self)
+            action.setCheckable(True)
+            action.setChecked(name == self.profiles.active)
+            if i < 9:
+                action.setShortcut(f'Ctrl+{i + 1}')
+            action.triggered.connect(lambda checked, name=name: self.switchProfile(name))
+            self.profile_group.addAction(action)
+            self.profile_menu.addAction(action)
+        
+        self.profile_menu.addSeparator()
+        new_profile_action = QAction('新建用户...', self)
+        new_profile_action.triggered.connect(self.newProfile)
+        self.profile_menu.addAction(new_profile_action)
+        
+        rename_profile_action = QAction('修改用户名...', self)
+        rename_profile_action.triggered.connect(self.renameProfile)
+        self.profile_menu.addAction(rename_profile_action)
+        
+        remove_profile_action = QAction('删除用户...', self)
+        remove_profile_action.setEnabled(len(self.profiles.names()) > 1)
+        remove_profile_action.triggered.connect(self.removeProfile)
+        self.profile_menu.addAction(remove_profile_action)
     
     def setEyeFriendlyColors(self):
         """设置护眼颜色方案"""
@@ -357,204 +395,248 @@ class ClockInApp(QMainWindow):
     
     def loadData(self):
         """加载数据"""
-        self.data_file = 'clock_in_data.json'
-        
-        if not os.path.exists(self.data_file):
-            # 创建默认数据
-            self.data = {
-                'start_date': datetime.now().strftime('%Y-%m-%d'),
-                'tasks': [
-                    {'name': '醒了立刻起床', 'days': 0, 'completed': []},
-                    {'name': '锻炼身体一分钟', 'days': 0, 'completed': []},
-                    {'name': '阅读一页书', 'days': 0, 'completed': []}
-                ]
-            }
-            self.saveData()
-        else:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+        # 读取最近使用的用户的快照并回放修改日志（文件不存在时创建默认数据）
+        self.store = self.profiles.open()
+        self.data_file = self.store.data_file
+        self.updateWindowTitle()
+        self.file_watcher.watch(self.data_file)
         
         # 更新初始日期输入框
-        self.start_date_edit.setText(self.data['start_date'])
+        self.start_date_edit.setText(self.store.startDate())
+        
+        # 已经使用SQLite时不再显示迁移菜单
+        self.migrate_action.setVisible(not self.store.usesSqlite())
+        self.shard_action.setVisible(self.store.usesJson())
         
         # 加载任务列表
         self.loadTasks()
     
+    def updateWindowTitle(self):
+        if len(self.profiles.names()) > 1:
+            self.setWindowTitle(f'每日打卡 - {self.profiles.active}')
+        else:
+            self.setWindowTitle('每日打卡')
+    
+    def switchProfile(self, name):
+        """切换到另一个用户（最近用过的用户直接从缓存取出，不重新读取文件）"""
+        if name == self.profiles.active:
+            return
+        # 先写完当前用户的修改，被挤出缓存的用户关闭时不会有未完成的写入
+        self.waitForWrites()
+        try:
+            self.store = self.profiles.open(name)
+        except (OSError, ValueError, KeyError) as e:
+            QMessageBox.warning(self, '错误', f'打开用户失败: {e}')
+            self.updateProfileMenu()
+            return
+        self.data_file = self.store.data_file
+        try:
+            # 缓存中的用户不被监视，切换回来时合并期间其他进程的修改
+            self.store.pollExternalChanges()
+        except (OSError, ValueError):
+            pass
+        for dialog in (self.analytics_dialog, self.search_dialog):
+            if dialog is not None:
+                dialog.store = self.store
+        if self.search_dialog is not None:
+            self.search_dialog.runSearch()
+        self.updateWindowTitle()
+        self.updateProfileMenu()
+        self.reloadAll()
+    
+    def newProfile(self):
+        """新建用户并切换过去"""
+        name, ok = QInputDialog.getText(self, '新建用户', '请输入用户名:')
+        if not ok:
+            return
+        try:
+            name = self.profiles.create(name)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, '错误', str(e))
+            return
+        self.switchProfile(name)
+    
+    def renameProfile(self):
+        """修改当前用户的名称"""
+        current = self.profiles.active
+        name, ok = QInputDialog.getText(self, '修改用户名', '请输入新的用户名:', text=current)
+        if not ok:
+            return
+        try:
+            self.profiles.rename(current, name)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, '错误', str(e))
+            return
+        self.updateWindowTitle()
+        self.updateProfileMenu()
+    
+    def removeProfile(self):
+        """从用户列表中删除其他用户（数据文件保留）"""
+        names = [name for name in self.profiles.names() if name != self.profiles.active]
+        if not names:
+            return
+        name, ok = QInputDialog.getItem(self, '删除用户', '选择要删除的用户（数据文件会保留）:', names, 0, False)
+        if not ok:
+            return
+        self.profiles.remove(name)
+        self.updateWindowTitle()
+        self.updateProfileMenu()
+    
+    def reloadAll(self):
+        """存储内容整体变化后刷新界面"""
+        self.file_watcher.watch(self.data_file)
+        self.start_date_edit.setText(self.store.startDate())
+        self.migrate_action.setVisible(not self.store.usesSqlite())
+        self.shard_action.setVisible(self.store.usesJson())
+        self.updateDayCount()
+        self.loadTasks()
+        self.updateCalendar()
+        self.updateStats()
+        self.refreshAnalytics(tasks_changed=True)
+    
+    def importJson(self):
+        """从JSON文件导入全部数据"""
+        path, _ = QFileDialog.getOpenFileName(self, '导入JSON', '', 'JSON (*.json)')
+        if not path:
+            return
+        reply = QMessageBox.question(self, '导入JSON', '导入会替换当前的全部任务和打卡记录，确定继续吗？')
+        if reply != QMessageBox.Yes:
+            return
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.waitForWrites()
+            self.store.importData(data)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            QMessageBox.warning(self, '错误', f'导入失败: {e}')
+            return
+        self.reloadAll()
+    
+    def exportJson(self):
+        """把全部数据导出为JSON文件"""
+        path, _ = QFileDialog.getSaveFileName(self, '导出JSON', 'clock_in_export.json', 'JSON (*.json)')
+        if not path:
+            return
+        self.waitForWrites()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.store.exportData(), f, ensure_ascii=False, indent=2)
+    
+    def importHistory(self):
+        """从CSV/JSON Lines合并历史记录（也支持其他打卡应用导出的CSV）"""
+        path, _ = QFileDialog.getOpenFileName(self, '导入历史记录', '',
+                                              '历史记录 (*.csv *.jsonl *.ndjson);;所有文件 (*)')
+        if not path:
+            return
+        self.waitForWrites()
+        try:
+            # 全部修改合并成一次写入，界面只刷新一次
+            result = interchange.importHistory(self.store, path)
+        except (OSError, ValueError, UnicodeDecodeError) as e:
+            self.saveData()
+            self.reloadAll()
+            QMessageBox.warning(self, '错误', f'导入失败: {e}')
+            return
+        self.saveData()
+        self.reloadAll()
+        QMessageBox.information(self, '导入完成',
+                                f"读取 {result['rows']} 行，新增打卡 {result['checked']} 次，"
+                                f"完成情况 {result['notes']} 条，新增任务 {result['added_tasks']} 个，"
+                                f"跳过 {result['skipped']} 行")
+    
+    def exportHistory(self):
+        """把全部历史记录逐行导出为CSV或JSON Lines"""
+        path, selected = QFileDialog.getSaveFileName(self, '导出历史记录', 'clock_in_history.csv',
+                                                     'CSV (*.csv);;JSON Lines (*.jsonl)')
+        if not path:
+            return
+        fmt = 'jsonl' if selected.startswith('JSON') else 'csv'
+        try:
+            count = interchange.exportHistory(self.store, path, fmt)
+        except OSError as e:
+            QMessageBox.warning(self, '错误', f'导出失败: {e}')
+            return
+        QMessageBox.information(self, '导出完成', f'已导出 {count} 行到 {path}')
+    
+    def migrateToSqlite(self):
+        """把当前数据迁移到SQLite数据库，之后启动时自动使用数据库"""
+        self.waitForWrites()
+        db_path = self.store.migrateToSqlite()
+        self.reloadAll()
+        QMessageBox.information(self, '成功', f'数据已迁移到 {db_path}')
+    
+    def migrateToShards(self):
+        """把当前数据按年份拆分存储，启动时只读取当年的数据"""
+        self.waitForWrites()
+        shards_path = self.store.migrateToShards()
+        self.reloadAll()
+        QMessageBox.information(self, '成功', f'数据已迁移到 {shards_path}')
+    
     def saveData(self):
-        """保存数据"""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        """立即保存数据（同时写入尚未保存的完成情况）"""
+        self.saver.saveNow()
+    
+    def writeDataFile(self):
+        """把未保存的修改交给后台线程写入磁盘"""
+        self.writer.submit(self.store, self.store.takeWrites())
+    
+    def waitForWrites(self):
+        """提交未保存的修改并等待后台写入完成（整体替换数据前调用）"""
+        self.saver.flush()
+        self.writer.drain()
+    
+    def onWriteFailed(self, message):
+        """后台写入失败时提示"""
+        msg = QMessageBox(self)
+        setVariant(msg, 'danger')
+        msg.setWindowTitle('错误')
+        msg.setText(f'保存失败: {message}')
+        msg.setIcon(QMessageBox.Warning)
+        msg.exec_()
     
     def loadTasks(self):
         """加载任务到列表"""
-        self.task_list.clear()
-        today = datetime.now().strftime('%Y-%m-%d')
-        
         # 获取当前字体大小（从打卡天数标签获取）
         try:
             font_size = self.day_count_label.font().pointSize()
         except:
             font_size = 16
-        
-        for task in self.data['tasks']:
-            item = QListWidgetItem()
-            
-            # 创建任务项的布局
-            task_widget = QWidget()
-            task_layout = QHBoxLayout()
-            task_layout.setContentsMargins(5, 5, 5, 5)
-            task_layout.setSpacing(10)
-            
-            # 复选框容器
-            checkbox_container = QWidget()
-            checkbox_layout = QHBoxLayout()
-            checkbox_layout.setContentsMargins(0, 0, 0, 0)
-            checkbox_layout.setSpacing(10)
-            
-            # 复选框
-            checkbox = QCheckBox()
-            
-            # 计算任务开始的第几天
-            start_date = datetime.strptime(self.data['start_date'], '%Y-%m-%d')
-            today_date = datetime.strptime(today, '%Y-%m-%d')
-            days_passed = (today_date - start_date).days + 1
-            
-            # 使用HTML格式化文本，让天数显示为红色加粗
-            task_text = f"{task['name']} <span style='color: #E74C3C; font-weight: bold;'>{days_passed}天</span>"
-            
-            # 创建标签来显示任务文本（支持HTML）
-            task_label = QLabel(task_text)
-            task_label.setStyleSheet(f'''
-                QLabel {{
-                    color: #2C3E50;
-                    font-size: {font_size}px;
-                    padding: 5px;
-                }}
-            ''')
-            
-            checkbox.setStyleSheet(f'''
-                QCheckBox {{
-                    font-size: {font_size}px;
-                    padding: 5px;
-                }}
-                QCheckBox::indicator {{
-                    width: {font_size + 6}px;
-                    height: {font_size + 6}px;
-                    border: 2px solid #BDC3C7;
-                    border-radius: 3px;
-                    background-color: #F0F4F8;
-                }}
-                QCheckBox::indicator:checked {{
-                    background-color: #27AE60;
-                    border-color: #27AE60;
-                    image: url(data:image/svg+xml;base64,PHN2ZyB4bWxucz0iaHR0cDovL3d3dy53My5vcmcvMjAwMC9zdmciIHdpZHRoPSIxOCIgaGVpZ2h0PSIxOCIgdmlld0JveD0iMCAwIDE4IDE4Ij48cGF0aCBkPSJNMyA5bDMgM2w3LTciIHN0cm9rZT0id2hpdGUiIHN0cm9rZS13aWR0aD0iMiIgZmlsbD0ibm9uZSIvPjwvc3ZnPg==);
-                }}
-                QCheckBox::indicator:hover {{
-                    border-color: #27AE60;
-                }}
-            ''')
-            
-            # 检查今天是否已完成
-            if today in task['completed']:
-                checkbox.setChecked(True)
-            
-            # 连接信号
-            checkbox.stateChanged.connect(lambda state, t=task, d=today: self.toggleTaskCompletion(t, d, state))
-            
-            # 将复选框和标签添加到容器布局
-            checkbox_layout.addWidget(checkbox)
-            checkbox_layout.addWidget(task_label)
-            checkbox_container.setLayout(checkbox_layout)
-            
-            # 将容器添加到任务布局
-            task_layout.addWidget(checkbox_container)
-            
-            # 完成情况编辑框
-            notes_edit = QTextEdit()
-            notes_edit.setMaximumHeight(80)
-            notes_edit.setMinimumWidth(250)
-            notes_edit.setPlaceholderText('完成情况...')
-            
-            # 获取今天的完成情况
-            if 'notes' not in task:
-                task['notes'] = {}
-            if today in task['notes']:
-                notes_edit.setText(task['notes'][today])
-            
-            # 设置编辑框样式
-            notes_edit.setStyleSheet(f'''
-                QTextEdit {{
-                    background-color: #F0F4F8;
-                    border: 2px solid #BDC3C7;
-                    border-radius: 5px;
-                    padding: 5px;
-                    color: #2C3E50;
-                    font-size: {max(10, font_size - 2)}px;
-                }}
-                QTextEdit:focus {{
-                    border: 2px solid #3498DB;
-                }}
-            ''')
-            
-            # 连接信号，保存完成情况
-            notes_edit.textChanged.connect(lambda: self.saveTaskNotes(task, today, notes_edit))
-            
-            task_layout.addWidget(notes_edit)
-            
-            task_widget.setLayout(task_layout)
-            
-            # 设置item的大小
-            item.setSizeHint(task_widget.sizeHint())
-            
-            self.task_list.addItem(item)
-            self.task_list.setItemWidget(item, task_widget)
+        self.task_delegate.setFontSize(font_size)
+        self.task_model.setStorage(self.store)
     
-    def saveTaskNotes(self, task, date, notes_edit):
-        """保存任务完成情况"""
-        if 'notes' not in task:
-            task['notes'] = {}
-        task['notes'][date] = notes_edit.toPlainText()
-        self.saveData()
+    def saveTaskNotes(self, task_id, date, text):
+        """保存任务完成情况（只标记脏数据，空闲或失去焦点时写入）"""
+        self.store.setNote(task_id, date, text)
+        self.saver.markDirty()
     
-    def toggleTaskCompletion(self, task, date, state):
+    def toggleTaskCompletion(self, task_id, date, done):
         """切换任务完成状态"""
-        if state == Qt.Checked:
-            if date not in task['completed']:
-                task['completed'].append(date)
-        else:
-            if date in task['completed']:
-                task['completed'].remove(date)
+        self.store.setCompleted(task_id, date, done)
         
         self.saveData()
-        self.updateCalendar()
+        self.updateCalendarDate(date)
+        self.refreshAnalytics()
     
-    def saveAllCurrentNotes(self):
-        """保存所有当前任务列表中的完成情况"""
+    def backfillRange(self):
+        """批量补打卡：日期范围 × 任务一次修改，只写入一次、只更新一次日历"""
+        from backfill_dialog import BackfillDialog
+        selected = self.calendar.selectedDate().toString('yyyy-MM-dd')
         today = datetime.now().strftime('%Y-%m-%d')
+        dialog = BackfillDialog(self.store, min(selected, today), max(selected, today), self)
+        if not dialog.exec_():
+            return
+        task_ids, first, last, done = dialog.selection()
+        if not task_ids:
+            return
+        changed = self.store.setCompletedRange(task_ids, first, last, done)
+        if not changed:
+            QMessageBox.information(self, '批量补打卡', '没有需要修改的打卡')
+            return
         
-        # 遍历任务列表中的所有项
-        for i in range(self.task_list.count()):
-            item = self.task_list.item(i)
-            task_widget = self.task_list.itemWidget(item)
-            
-            # 获取任务widget中的布局
-            layout = task_widget.layout()
-            
-            # 获取第二个控件（完成情况编辑框）
-            if layout.count() >= 2:
-                notes_edit = layout.itemAt(1).widget()
-                if isinstance(notes_edit, QTextEdit):
-                    # 找到对应的任务
-                    task_index = i
-                    if task_index < len(self.data['tasks']):
-                        task = self.data['tasks'][task_index]
-                        # 保存完成情况
-                        if 'notes' not in task:
-                            task['notes'] = {}
-                        task['notes'][today] = notes_edit.toPlainText()
-        
-        # 保存到文件
         self.saveData()
+        self.updateCalendarDates(changed)
+        for task_id in task_ids:
+            self.task_model.updateTask(task_id)
+        self.refreshAnalytics()
     
     def addTask(self):
         """添加任务"""
@@ -562,244 +644,84 @@ class ClockInApp(QMainWindow):
         dialog.setWindowTitle('添加任务')
         dialog.setLabelText('请输入任务名称:')
         dialog.setTextValue('')
-        dialog.setStyleSheet('''
-            QInputDialog {
-                background-color: #F0F4F8;
-            }
-            QInputDialog QLabel {
-                color: #2C3E50;
-                font-size: 14px;
-                font-weight: bold;
-            }
-            QInputDialog QLineEdit {
-                background-color: #F0F4F8;
-                border: 2px solid #3498DB;
-                border-radius: 5px;
-                padding: 8px;
-                color: #2C3E50;
-                font-size: 14px;
-                min-height: 30px;
-            }
-            QInputDialog QLineEdit:focus {
-                border: 2px solid #2980B9;
-            }
-            QDialogButtonBox QPushButton {
-                background-color: #3498DB;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 10px 25px;
-                font-weight: bold;
-                font-size: 14px;
-                min-width: 80px;
-                min-height: 35px;
-            }
-            QDialogButtonBox QPushButton:hover {
-                background-color: #2980B9;
-            }
-            QDialogButtonBox QPushButton:pressed {
-                background-color: #1A5276;
-            }
-        ''')
         if dialog.exec_() == QInputDialog.Accepted:
             task_name = dialog.textValue()
             if task_name.strip():
-                new_task = {
-                    'name': task_name.strip(),
-                    'days': 0,
-                    'completed': [],
-                    'notes': {}
-                }
-                self.data['tasks'].append(new_task)
+                task_id = self.store.addTask(task_name.strip())
                 self.saveData()
-                self.loadTasks()
+                self.task_model.appendTask(task_id)
+                self.refreshAnalytics(tasks_changed=True)
     
     def deleteTask(self):
         """删除任务"""
-        current_item = self.task_list.currentItem()
-        if not current_item:
+        current_index = self.task_list.currentIndex()
+        if not current_index.isValid():
             msg = QMessageBox(self)
             msg.setWindowTitle('警告')
             msg.setText('请先选择要删除的任务')
             msg.setIcon(QMessageBox.Warning)
-            msg.setStyleSheet('''
-                QMessageBox {
-                    background-color: #F0F4F8;
-                }
-                QMessageBox QLabel {
-                    color: #2C3E50;
-                    font-size: 12px;
-                }
-                QPushButton {
-                    background-color: #E74C3C;
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    padding: 8px 15px;
-                    font-weight: bold;
-                    min-width: 80px;
-                }
-                QPushButton:hover {
-                    background-color: #C0392B;
-                }
-            ''')
+            setVariant(msg, 'danger')
             msg.exec_()
             return
         
-        row = self.task_list.row(current_item)
-        if row < len(self.data['tasks']):
-            del self.data['tasks'][row]
+        row = current_index.row()
+        if row < self.task_model.rowCount():
+            task_id = self.task_model.taskAt(row)['id']
+            self.store.deleteTask(task_id)
             self.saveData()
-            self.loadTasks()
+            self.task_model.removeTask(task_id)
+            self.updateCalendar()
+            self.refreshAnalytics(tasks_changed=True)
     
     def editTask(self):
         """修改任务"""
-        current_item = self.task_list.currentItem()
-        if not current_item:
+        current_index = self.task_list.currentIndex()
+        if not current_index.isValid():
             msg = QMessageBox(self)
             msg.setWindowTitle('警告')
             msg.setText('请先选择要修改的任务')
             msg.setIcon(QMessageBox.Warning)
-            msg.setStyleSheet('''
-                QMessageBox {
-                    background-color: #F0F4F8;
-                }
-                QMessageBox QLabel {
-                    color: #2C3E50;
-                    font-size: 12px;
-                }
-                QPushButton {
-                    background-color: #E74C3C;
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    padding: 8px 15px;
-                    font-weight: bold;
-                    min-width: 80px;
-                }
-                QPushButton:hover {
-                    background-color: #C0392B;
-                }
-            ''')
+            setVariant(msg, 'danger')
             msg.exec_()
             return
         
-        row = self.task_list.row(current_item)
-        if row < len(self.data['tasks']):
-            old_name = self.data['tasks'][row]['name']
+        row = current_index.row()
+        if row < self.task_model.rowCount():
+            task_id = self.task_model.taskAt(row)['id']
+            old_name = self.task_model.taskAt(row)['name']
             dialog = QInputDialog(self)
             dialog.setWindowTitle('修改任务')
             dialog.setLabelText('请输入新的任务名称:')
             dialog.setTextValue(old_name)
-            dialog.setStyleSheet('''
-                QInputDialog {
-                    background-color: #F0F4F8;
-                }
-                QInputDialog QLabel {
-                    color: #2C3E50;
-                    font-size: 14px;
-                    font-weight: bold;
-                }
-                QInputDialog QLineEdit {
-                    background-color: #F0F4F8;
-                    border: 2px solid #3498DB;
-                    border-radius: 5px;
-                    padding: 8px;
-                    color: #2C3E50;
-                    font-size: 14px;
-                    min-height: 30px;
-                }
-                QInputDialog QLineEdit:focus {
-                    border: 2px solid #2980B9;
-                }
-                QDialogButtonBox QPushButton {
-                    background-color: #3498DB;
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    padding: 10px 25px;
-                    font-weight: bold;
-                    font-size: 14px;
-                    min-width: 80px;
-                    min-height: 35px;
-                }
-                QDialogButtonBox QPushButton:hover {
-                    background-color: #2980B9;
-                }
-                QDialogButtonBox QPushButton:pressed {
-                    background-color: #1A5276;
-                }
-            ''')
             if dialog.exec_() == QInputDialog.Accepted:
                 new_name = dialog.textValue()
                 if new_name.strip():
-                    self.data['tasks'][row]['name'] = new_name.strip()
+                    self.store.renameTask(task_id, new_name.strip())
                     self.saveData()
-                    self.loadTasks()
+                    self.task_model.updateTask(task_id)
+                    self.refreshAnalytics(tasks_changed=True)
     
     def saveStartDate(self):
         """保存初始日期"""
         date_str = self.start_date_edit.text()
         try:
-            # 验证日期格式
-            datetime.strptime(date_str, '%Y-%m-%d')
-            self.data['start_date'] = date_str
+            # 验证日期格式并保存
+            self.store.setStartDate(date_str)
             self.saveData()
             self.updateDayCount()
-            self.loadTasks()
-            self.updateCalendar()
+            # 初始日期只影响天数，打卡记录和日历高亮不变
+            self.task_model.refreshDays()
             msg = QMessageBox(self)
             msg.setWindowTitle('成功')
             msg.setText('初始日期已保存')
             msg.setIcon(QMessageBox.Information)
-            msg.setStyleSheet('''
-                QMessageBox {
-                    background-color: #F0F4F8;
-                }
-                QMessageBox QLabel {
-                    color: #2C3E50;
-                    font-size: 12px;
-                }
-                QPushButton {
-                    background-color: #3498DB;
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    padding: 8px 15px;
-                    font-weight: bold;
-                    min-width: 80px;
-                }
-                QPushButton:hover {
-                    background-color: #2980B9;
-                }
-            ''')
             msg.exec_()
         except ValueError:
             msg = QMessageBox(self)
             msg.setWindowTitle('错误')
             msg.setText('请输入正确的日期格式 (YYYY-MM-DD)')
             msg.setIcon(QMessageBox.Warning)
-            msg.setStyleSheet('''
-                QMessageBox {
-                    background-color: #F0F4F8;
-                }
-                QMessageBox QLabel {
-                    color: #2C3E50;
-                    font-size: 12px;
-                }
-                QPushButton {
-                    background-color: #E74C3C;
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    padding: 8px 15px;
-                    font-weight: bold;
-                    min-width: 80px;
-                }
-                QPushButton:hover {
-                    background-color: #C0392B;
-                }
-            ''')
+            setVariant(msg, 'danger')
             msg.exec_()
     
     def changeFont(self):
@@ -809,81 +731,9 @@ class ClockInApp(QMainWindow):
         if current_font.family() != 'Microsoft YaHei':
             current_font = QFont('Microsoft YaHei', 14)
         
-        # 设置字体对话框样式
-        QApplication.instance().setStyleSheet('''
-            QFontDialog {
-                background-color: #F0F4F8;
-            }
-            QFontDialog QLabel {
-                color: #2C3E50;
-            }
-            QFontDialog QGroupBox {
-                color: #2C3E50;
-                border: 1px solid #BDC3C7;
-                border-radius: 5px;
-                margin-top: 10px;
-                padding-top: 10px;
-                font-weight: bold;
-            }
-            QFontDialog QGroupBox::title {
-                subcontrol-origin: margin;
-                left: 10px;
-                padding: 0 3px;
-            }
-            QFontDialog QLineEdit {
-                background-color: #F0F4F8;
-                border: 2px solid #BDC3C7;
-                border-radius: 5px;
-                padding: 5px;
-                color: #2C3E50;
-            }
-            QFontDialog QComboBox {
-                background-color: #F0F4F8;
-                border: 2px solid #BDC3C7;
-                border-radius: 5px;
-                padding: 5px;
-                color: #2C3E50;
-            }
-            QFontDialog QComboBox QAbstractItemView {
-                background-color: #F0F4F8;
-                border: 2px solid #BDC3C7;
-                border-radius: 5px;
-                selection-background-color: #3498DB;
-                selection-color: white;
-            }
-            QFontDialog QListWidget {
-                background-color: #F0F4F8;
-                border: 2px solid #BDC3C7;
-                border-radius: 5px;
-                color: #2C3E50;
-            }
-            QFontDialog QListWidget::item {
-                padding: 5px;
-            }
-            QFontDialog QListWidget::item:selected {
-                background-color: #3498DB;
-                color: white;
-            }
-            QFontDialog QDialogButtonBox QPushButton {
-                background-color: #3498DB;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 8px 15px;
-                font-weight: bold;
-                min-width: 80px;
-            }
-            QFontDialog QDialogButtonBox QPushButton:hover {
-                background-color: #2980B9;
-            }
-        ''')
-        
         # 打开字体选择对话框
         font, ok = QFontDialog.getFont(current_font, self, '选择字体')
         
-        # 恢复默认样式
-        QApplication.instance().setStyleSheet('')
-        
         if ok:
             # 确保使用微软雅黑字体
             font_family = font.family()
@@ -893,7 +743,7 @@ class ClockInApp(QMainWindow):
             font_size = font.pointSize()
             
             # 在改变字体前，先保存所有当前的完成情况
-            self.saveAllCurrentNotes()
+            self.saver.flush()
             
             # 应用字体大小到所有控件
             font = QFont('Microsoft YaHei', font_size)
@@ -904,116 +754,242 @@ class ClockInApp(QMainWindow):
             # 更新打卡天数标签
             self.day_count_label.setFont(QFont('Microsoft YaHei', font_size))
             
-            # 更新任务列表
-            self.loadTasks()
+            # 更新任务列表（只重新计算行高）
+            self.task_delegate.setFontSize(font_size)
+            self.task_model.refreshLayout()
             
-            # 更新日历字体
-            calendar_font_size = max(10, font_size - 2)
-            self.calendar.setStyleSheet(f'''
-                QCalendarWidget {{
-                    background-color: #D5F4E6;
-                    border: 2px solid #F39C12;
-                    border-radius: 5px;
-                }}
-                QCalendarWidget QTableView {{
-                    background-color: #D5F4E6;
-                    selection-background-color: #F39C12;
-                    selection-color: white;
-                    alternate-background-color: #B8E6D3;
-                    font-size: {calendar_font_size}px;
-                }}
-                QCalendarWidget QToolButton {{
-                    background-color: #F39C12;
-                    color: white;
-                    border: none;
-                    border-radius: 4px;
-                    padding: 5px;
-                    font-weight: bold;
-                    font-size: {font_size}px;
-                }}
-                QCalendarWidget QToolButton:hover {{
-                    background-color: #E67E22;
-                }}
-                QCalendarWidget QToolButton#qt_calendar_prevmonth,
-                QCalendarWidget QToolButton#qt_calendar_nextmonth {{
-                    background-color: #F39C12;
-                    color: white;
-                    border: none;
-                    border-radius: 4px;
-                    padding: 5px;
-                    font-weight: bold;
-                    font-size: {font_size}px;
-                }}
-                QCalendarWidget QToolButton#qt_calendar_prevmonth:hover,
-                QCalendarWidget QToolButton#qt_calendar_nextmonth:hover {{
-                    background-color: #E67E22;
-                }}
-                QCalendarWidget QSpinBox {{
-                    background-color: #F0F4F8;
-                    border: 1px solid #BDC3C7;
-                    border-radius: 3px;
-                    padding: 2px;
-                    color: #2C3E50;
-                    font-size: {font_size}px;
-                }}
-            ''')
+            # 日历等控件的字体大小由应用样式表统一控制
+            self.theme.apply(font_size=font_size)
             
             msg = QMessageBox(self)
             msg.setWindowTitle('成功')
             msg.setText(f'字体大小已设置为 {font_size}pt')
             msg.setIcon(QMessageBox.Information)
-            msg.setStyleSheet('''
-                QMessageBox {
-                    background-color: #F0F4F8;
-                }
-                QMessageBox QLabel {
-                    color: #2C3E50;
-                    font-size: 12px;
-                }
-                QPushButton {
-                    background-color: #3498DB;
-                    color: white;
-                    border: none;
-                    border-radius: 5px;
-                    padding: 8px 15px;
-                    font-weight: bold;
-                    min-width: 80px;
-                }
-                QPushButton:hover {
-                    background-color: #2980B9;
-                }
-            ''')
             msg.exec_()
     
+    def showSaveStats(self):
+        """显示存储写入统计"""
+        stats = self.saver.stats()
+        writer = self.writer.stats()
+        text = (f"提交次数: {stats['flushes']}\n"
+                f"编辑次数: {stats['marks']}\n"
+                f"最近一次提交: {stats['last_flush_ms']:.1f} ms\n"
+                f"平均提交: {stats['avg_flush_ms']:.1f} ms\n"
+                f"待提交: {'是' if stats['dirty'] else '否'}\n"
+                f"\n"
+                f"写入队列: {writer['queue_depth']}（最多 {writer['max_depth']}）\n"
+                f"磁盘写入: {writer['batches']} 次（合并 {writer['submitted']} 次提交）\n"
+                f"最近一次写入: {writer['last_write_ms']:.1f} ms\n"
+                f"平均写入: {writer['avg_write_ms']:.1f} ms，最长 {writer['max_write_ms']:.1f} ms\n"
+                f"写入失败: {writer['errors']}")
+        QMessageBox.information(self, '存储统计', text)
+    
+    def showAnalytics(self):
+        """打开统计分析窗口（需要 numpy）"""
+        if not analytics.available():
+            QMessageBox.information(self, '统计分析', '统计分析需要安装 numpy:\npip install numpy')
+            return
+        if self.analytics_dialog is None:
+            from analytics_dialog import AnalyticsDialog
+            self.analytics_dialog = AnalyticsDialog(self.store, self)
+        else:
+            self.analytics_dialog.loadTasks()
+        self.analytics_dialog.show()
+        self.analytics_dialog.raise_()
+    
+    def showSearch(self):
+        """打开搜索完成情况窗口"""
+        if self.search_dialog is None:
+            from search_dialog import SearchDialog
+            self.search_dialog = SearchDialog(self.store, self)
+            self.search_dialog.dateActivated.connect(self.showDate)
+        self.search_dialog.show()
+        self.search_dialog.raise_()
+        self.search_dialog.query_edit.setFocus()
+    
+    def showDate(self, date_str):
+        """在日历上选中某天并显示当天的完成情况"""
+        qdate = QDate.fromString(date_str, 'yyyy-MM-dd')
+        if qdate == self.calendar.selectedDate():
+            self.onDateSelected()
+        else:
+            self.calendar.setSelectedDate(qdate)
+    
+    def refreshAnalytics(self, tasks_changed=False):
+        """打卡或任务变化后刷新打开着的统计分析窗口"""
+        if self.analytics_dialog is not None and self.analytics_dialog.isVisible():
+            if tasks_changed:
+                self.analytics_dialog.loadTasks()
+            else:
+                self.analytics_dialog.refresh()
+    
+    def toggleApiServer(self, checked):
+        if checked:
+            self.startApiServer()
+        else:
+            self.stopApiServer()
+    
+    def startApiServer(self, port=None):
+        """启动本地HTTP接口（只监听 127.0.0.1）"""
+        if self.api_server is not None:
+            return
+        server = ApiServer(lambda: self.store, self.api_invoker.submit, self.onExternalChanges,
+                           port=port or DEFAULT_API_PORT)
+        try:
+            server.start()
+        except OSError as e:
+            self.api_action.setChecked(False)
+            QMessageBox.warning(self, '错误', f'无法启动本地HTTP接口: {e}')
+            return
+        self.api_server = server
+        self.api_action.setChecked(True)
+        self.api_action.setText(f'本地HTTP接口 (127.0.0.1:{server.port})')
+    
+    def stopApiServer(self):
+        if self.api_server is None:
+            return
+        self.api_server.stop()
+        self.api_server = None
+        self.api_action.setChecked(False)
+        self.api_action.setText('本地HTTP接口')
+    
+    def handleInstanceRequest(self, request):
+        """处理再次启动时转发过来的参数：没有命令时显示窗口，有命令时在当前数据上执行"""
+        argv = request.get('argv') or []
+        if not argv or argv[0].startswith('-'):
+            self.showNormal()
+            self.raise_()
+            self.activateWindow()
+            return {'code': 0}
+        out, err = io.StringIO(), io.StringIO()
+        try:
+            args = cli.buildParser().parse_args(argv)
+        except SystemExit:
+            return {'code': 2, 'error': '参数不正确\n'}
+        if not args.profile or args.profile == self.profiles.active:
+            # 命令行的修改不能在界面上撤销
+            with self.store.externalChanges():
+                code, ops = cli.execute(self.store, args, out, err)
+            if ops:
+                self.onExternalChanges(self.store, ops)
+            return {'code': code, 'output': out.getvalue(), 'error': err.getvalue()}
+        if args.profile not in self.profiles.names():
+            return {'code': 1, 'error': f'用户不存在: {args.profile}\n'}
+        # 其他用户：缓存中有时直接使用，否则临时打开，执行完写入并关闭（不挤出缓存中的用户）；
+        # 缓存中的用户切换回来时同样不能撤销这些修改
+        with self.profiles.borrow(args.profile) as store, store.externalChanges():
+            code, _ = cli.execute(store, args, out, err)
+        return {'code': code, 'output': out.getvalue(), 'error': err.getvalue()}
+    
+    def onExternalChanges(self, store, ops):
+        """HTTP接口或命令行的一批修改执行完后（在界面线程中）保存并刷新界面"""
+        self.saveData()
+        if store is self.store:
+            self.refreshForOps(ops)
+    
+    def updateUndoActions(self):
+        """打开编辑菜单时显示可以撤销/重做的操作"""
+        undo_label = self.store.undo_log.undoLabel()
+        redo_label = self.store.undo_log.redoLabel()
+        self.undo_action.setText(f'撤销{undo_label}' if undo_label else '撤销')
+        self.redo_action.setText(f'重做{redo_label}' if redo_label else '重做')
+    
+    def undoLast(self):
+        """撤销最近一次修改，只刷新涉及的任务行和日历日期"""
+        ops = self.store.undo()
+        if ops:
+            self.saveData()
+            self.refreshForOps(ops)
+    
+    def redoLast(self):
+        """重做最近撤销的修改"""
+        ops = self.store.redo()
+        if ops:
+            self.saveData()
+            self.refreshForOps(ops)
+    
+    def mergeExternalChanges(self):
+        """数据文件有变化：合并其他进程的修改，只刷新涉及的任务行和日历日期"""
+        if not self.writer.drain(0):
+            # 自己的写入还没完成，写完后再合并
+            self.file_watcher.schedule()
+            return
+        try:
+            reloaded, ops = self.store.pollExternalChanges()
+        except (OSError, ValueError):
+            # 文件正在被其他程序改写（内容不完整），下次变化时再读取
+            return
+        if reloaded:
+            self.reloadAll()
+        elif ops:
+            self.refreshForOps(ops)
+    
+    def refreshForOps(self, ops):
+        """按一批修改记录刷新界面（不重新加载任务列表和整个日历）"""
+        if any(op['op'] == 'start' for op in ops):
+            self.start_date_edit.setText(self.store.startDate())
+            self.updateDayCount()
+            self.task_model.refreshDays()
+        added = [op['task'] for op in ops if op['op'] == 'add']
+        deleted = [op['task'] for op in ops if op['op'] == 'delete']
+        # 撤销删除任务：放回原来的位置
+        restored = [op['task'] for op in ops if op['op'] == 'restore']
+        for task_id in added:
+            self.task_model.appendTask(task_id)
+        for task_id in deleted:
+            self.task_model.removeTask(task_id)
+        for task_id in restored:
+            self.task_model.insertTask(task_id)
+        for task_id in {op['task'] for op in ops if 'task' in op} - set(deleted):
+            self.task_model.updateTask(task_id)
+        if deleted or restored:
+            self.updateCalendar()
+        else:
+            self.updateCalendarDates(sorted({op['date'] for op in ops if op['op'] in ('check', 'uncheck')}))
+        renamed = any(op['op'] == 'rename' for op in ops)
+        self.refreshAnalytics(tasks_changed=bool(added or deleted or restored or renamed))
+    
+    def closeEvent(self, event):
+        """关闭窗口前写入未保存的数据"""
+        self.file_watcher.stop()
+        self.stopApiServer()
+        if self.instance is not None:
+            self.instance.close()
+        self.saver.flush()
+        self.writer.stop()
+        self.profiles.closeAll()
+        super().closeEvent(event)
+    
     def updateDayCount(self):
         """更新打卡天数"""
-        start_date = datetime.strptime(self.data['start_date'], '%Y-%m-%d')
-        today = datetime.now()
-        days_passed = (today - start_date).days + 1
+        days_passed = self.store.daysPassed()
         self.day_count_label.setText(f'今天是打卡的第 {days_passed} 天')
     
+    def updateStats(self):
+        """读取打卡记录建立统计，之后打卡时增量更新（切换回缓存中的用户时直接使用）"""
+        if self.store.stats is None:
+            self.store.buildStats()
+        self.task_model.refreshStats()
+    
     def updateCalendar(self):
-        """更新日历显示"""
-        # 重置日历格式
-        for i in range(self.calendar.minimumDate().dayOfYear(), self.calendar.maximumDate().dayOfYear() + 1):
-            date = self.calendar.minimumDate().addDays(i - self.calendar.minimumDate().dayOfYear())
-            self.calendar.setDateTextFormat(date, QTextCharFormat())
-        
-        # 标记完成的日期
-        for task in self.data['tasks']:
-            for completed_date in task['completed']:
-                try:
-                    date_obj = datetime.strptime(completed_date, '%Y-%m-%d')
-                    qdate = QDate(date_obj.year, date_obj.month, date_obj.day)
-                    
-                    # 设置完成日期的格式 - 使用护眼绿色
-                    fmt = QTextCharFormat()
-                    fmt.setBackground(QColor(76, 175, 80))  # 护眼绿色
-                    fmt.setForeground(QColor(255, 255, 255))  # 白色文字
-                    fmt.setFontWeight(QFont.Bold)  # 加粗
-                    self.calendar.setDateTextFormat(qdate, fmt)
-                except:
-                    pass
+        """更新日历显示（只重新格式化当前月份页）"""
+        self.highlighter.refresh()
+    
+    def updateCalendarDate(self, date_str):
+        """只更新某一天的高亮"""
+        done = self.store.isDateCompleted(date_str)
+        self.highlighter.setDate(date_str, done)
+    
+    def updateCalendarDates(self, dates):
+        """批量修改后更新这些日期的高亮（一次差异更新）"""
+        if not dates:
+            return
+        completed = set(self.store.completedDatesBetween(dates[0], dates[-1]))
+        self.highlighter.setDates({date_str: date_str in completed for date_str in dates})
+    
+    def completedDatesBetween(self, first, last):
+        """日历按月加载高亮日期（存储可能被切换，所以不直接绑定方法）"""
+        return self.store.completedDatesBetween(first, last)
     
     def onDateSelected(self):
         """日期选择事件"""
@@ -1021,45 +997,35 @@ class ClockInApp(QMainWindow):
         date_str = selected_date.toString('yyyy-MM-dd')
         
         # 显示选中日期的任务完成情况
-        completed_tasks = []
-        for task in self.data['tasks']:
-            if date_str in task['completed']:
-                completed_tasks.append(task['name'])
+        completed_tasks = self.store.tasksCompletedOn(date_str)
         
         if completed_tasks:
             msg = f"{date_str} 完成的任务:\n" + '\n'.join(completed_tasks)
         else:
             msg = f"{date_str} 没有完成任何任务"
         
+        day_notes = self.store.notesOn(date_str)
+        notes = [f"{task['name']}: {day_notes[task['id']]}" for task in self.store.tasks() if task['id'] in day_notes]
+        if notes:
+            msg += '\n\n完成情况:\n' + '\n'.join(notes)
+        
         message_box = QMessageBox(self)
         message_box.setWindowTitle('任务完成情况')
         message_box.setText(msg)
         message_box.setIcon(QMessageBox.Information)
-        message_box.setStyleSheet('''
-            QMessageBox {
-                background-color: #F0F4F8;
-            }
-            QMessageBox QLabel {
-                color: #2C3E50;
-                font-size: 12px;
-            }
-            QPushButton {
-                background-color: #3498DB;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 8px 15px;
-                font-weight: bold;
-                min-width: 80px;
-            }
-            QPushButton:hover {
-                background-color: #2980B9;
-            }
-        ''')
         message_box.exec_()
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    ex = ClockInApp()
+    timeline, argv = StartupTimeline.fromArgv(sys.argv)
+    try:
+        api_port, argv = portFromArgv(argv)
+    except ValueError as e:
+        # 和命令行模式的参数错误一样：提示后以退出码 2 结束
+        print(f'main.py: error: {e}', file=sys.stderr)
+        instance.close()
+        sys.exit(2)
+    timeline.mark('import')
+    app = QApplication(argv)
+    ex = ClockInApp(timeline, api_port, instance)
     ex.show()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,161 @@
+import json
+import os
+import re
+import shutil
+import zipfile
+from collections import OrderedDict
+from fileio import fsyncDir
+
+ARCHIVE_PATTERN = re.compile(r'^(\d{4})\.zip$')
+
+
+def archivePathFor(json_path):
+    """与JSON数据文件对应的完成情况归档目录"""
+    return os.path.splitext(json_path)[0] + '.archive'
+
+
+class NotesArchive:
+    """旧完成情况的压缩归档
+
+    每年一个 zip 文件（LZMA压缩），每个日期一个条目 `YYYY-MM-DD.json`，
+    内容是 {任务id: 完成情况}。zip 的中央目录就是按日期的偏移索引，
+    读取某天时只解压这一个条目。
+    """
+
+    def __init__(self, path, cache_years=2):
+        self.path = path
+        self.cache_years = cache_years
+        # 年份 -> 该年归档中的日期集合（只读取中央目录）
+        self._dates = {}
+        # 最近使用的 zip 文件保持打开
+        self._open = OrderedDict()
+
+        # 统计信息
+        self.reads = 0
+
+    def yearPath(self, year):
+        return os.path.join(self.path, f'{year:04d}.zip')
+
+    def years(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(int(m.group(1)) for m in map(ARCHIVE_PATTERN.match, os.listdir(self.path)) if m)
+
+    def _zip(self, year):
+        zf = self._open.get(year)
+        if zf is not None:
+            self._open.move_to_end(year)
+            return zf
+        path = self.yearPath(year)
+        if not os.path.exists(path):
+            # 记住这一年没有归档，避免反复检查文件
+            self._dates[year] = set()
+            return None
+        zf = zipfile.ZipFile(path, 'r')
+        self._open[year] = zf
+        self._dates[year] = {name[:-5] for name in zf.namelist()}
+        while len(self._open) > self.cache_years:
+            self._open.popitem(last=False)[1].close()
+        return zf
+
+    def hasDate(self, date):
+        year = int(date[:4])
+        if year not in self._dates and self._zip(year) is None:
+            return False
+        return date in self._dates.get(year, ())
+
+    def notesOn(self, date):
+        """返回某天归档的完成情况 {任务id: 内容}，只解压这一天的条目"""
+        if not self.hasDate(date):
+            return {}
+        zf = self._zip(int(date[:4]))
+        self.reads += 1
+        data = json.loads(zf.read(date + '.json').decode('utf-8'))
+        return {int(task_id): text for task_id, text in data.items()}
+
+    def get(self, task_id, date):
+        return self.notesOn(date).get(task_id, '')
+
+    def notesInYear(self, year):
+        """某一年的全部归档 {日期: {任务id: 内容}}"""
+        zf = self._zip(year)
+        if zf is None:
+            return {}
+        self.reads += 1
+        return {name[:-5]: {int(k): v for k, v in json.loads(zf.read(name).decode('utf-8')).items()}
+                for name in sorted(zf.namelist())}
+
+    def iterNotes(self):
+        """按日期顺序返回全部归档内容 (日期, 任务id, 内容)"""
+        for year in self.years():
+            zf = self._zip(year)
+            for name in sorted(zf.namelist()):
+                data = json.loads(zf.read(name).decode('utf-8'))
+                for task_id, text in data.items():
+                    yield name[:-5], int(task_id), text
+
+    def maxTaskId(self):
+        """归档中出现过的最大任务id（没有归档时为0），需要读取全部年份"""
+        return max((task_id for _, task_id, _ in self.iterNotes()), default=0)
+
+    def add(self, notes_by_date, keep_tasks=None):
+        """把 {日期: {任务id: 内容}} 写入归档
+
+        只重写涉及到的年份：读出原有条目、合并后写到临时文件再原子替换。
+        keep_tasks 不为 None 时顺便丢弃已删除任务的内容。
+        """
+        by_year = {}
+        for date, notes in notes_by_date.items():
+            by_year.setdefault(int(date[:4]), {})[date] = notes
+        os.makedirs(self.path, exist_ok=True)
+        for year, new_dates in by_year.items():
+            merged = {}
+            zf = self._zip(year)
+            if zf is not None:
+                for name in zf.namelist():
+                    merged[name[:-5]] = {int(k): v for k, v in
+                                         json.loads(zf.read(name).decode('utf-8')).items()}
+            # 替换文件前先关闭（Windows 上打开的文件不能被替换）
+            self._close(year)
+            for date, notes in new_dates.items():
+                merged.setdefault(date, {}).update(notes)
+            self._writeYear(year, merged, keep_tasks)
+
+    def _writeYear(self, year, notes_by_date, keep_tasks):
+        path = self.yearPath(year)
+        tmp_path = path + '.tmp'
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_LZMA) as zf:
+            for date in sorted(notes_by_date):
+                notes = {str(task_id): text for task_id, text in sorted(notes_by_date[date].items())
+                         if text and (keep_tasks is None or task_id in keep_tasks)}
+                if notes:
+                    zf.writestr(date + '.json', json.dumps(notes, ensure_ascii=False))
+        with open(tmp_path, 'r+b') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        fsyncDir(self.path)
+
+    def _close(self, year):
+        zf = self._open.pop(year, None)
+        if zf is not None:
+            zf.close()
+        self._dates.pop(year, None)
+
+    def close(self):
+        for year in list(self._open):
+            self._close(year)
+
+    def refresh(self):
+        """丢弃读取过的内容（归档可能被其他进程改写），下次使用时重新读取"""
+        self.close()
+        self._dates.clear()
+
+    def clear(self):
+        """删除全部归档"""
+        self.close()
+        self._dates.clear()
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+
+    def sizeOnDisk(self):
+        return sum(os.path.getsize(self.yearPath(y)) for y in self.years())
@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+
+
+class WriteBehindSaver(QObject):
+    """延迟写入：编辑时只标记脏数据，空闲一段时间后合并成一次保存"""
+
+    def __init__(self, save_func, idle_ms=800, parent=None):
+        super().__init__(parent)
+        self._save_func = save_func
+        self._dirty = False
+
+        # 统计信息
+        self.flush_count = 0
+        self.mark_count = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(idle_ms)
+        self._timer.timeout.connect(self.flush)
+
+    def isDirty(self):
+        return self._dirty
+
+    def markDirty(self):
+        """标记有未保存的修改，并重新开始空闲计时（不做任何磁盘操作）"""
+        self._dirty = True
+        self.mark_count += 1
+        self._timer.start()
+
+    def flush(self):
+        """如有未保存的修改则立即写入磁盘"""
+        self._timer.stop()
+        if not self._dirty:
+            return False
+        self.saveNow()
+        return True
+
+    def saveNow(self):
+        """无论是否有脏数据都立即写入磁盘"""
+        self._timer.stop()
+        start = time.perf_counter()
+        self._save_func()
+        elapsed = (time.perf_counter() - start) * 1000
+        self._dirty = False
+        self.flush_count += 1
+        self.last_flush_ms = elapsed
+        self.total_flush_ms += elapsed
+
+    def stats(self):
+        """返回写入次数和耗时统计"""
+        avg = self.total_flush_ms / self.flush_count if self.flush_count else 0.0
+        return {
+            'dirty': self._dirty,
+            'marks': self.mark_count,
+            'flushes': self.flush_count,
+            'last_flush_ms': self.last_flush_ms,
+            'avg_flush_ms': avg,
+        }
+
+
+class PersistenceWorker:
+    """后台写入线程：界面线程只提交写入单元，磁盘写入和刷盘在这里完成
+
+    队列中积压的多次提交会合并成一次写入（一次 fsync）。
+    写入出错时调用 on_error(exc)，注意它在后台线程中被调用。
+    """
+
+    def __init__(self, on_error=None):
+        self._on_error = on_error
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._stopped = False
+
+        # 统计信息
+        self.submitted = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_write_ms = 0.0
+        self.max_write_ms = 0.0
+        self.total_write_ms = 0.0
+        self.max_depth = 0
+
+        self._thread = threading.Thread(target=self._run, name='persistence', daemon=True)
+        self._thread.start()
+
+    def submit(self, sink, units):
+        """提交 sink.writeUnits(units) 的写入任务，立即返回"""
+        if not units:
+            return
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError('persistence worker stopped')
+            self._queue.append((sink, list(units)))
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            self._cond.notify_all()
+
+    def queueDepth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def drain(self, timeout=None):
+        """等待已提交的写入全部完成，返回是否在超时前完成"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def stop(self, timeout=None):
+        """写完剩余内容后结束线程"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._stopped)
+                if not self._queue:
+                    return
+                items = list(self._queue)
+                self._queue.clear()
+                self._busy = True
+            try:
+                for sink, units in self._merge(items):
+                    self._write(sink, units)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    @staticmethod
+    def _merge(items):
+        """相邻的同一存储的提交合并成一批"""
+        batches = []
+        for sink, units in items:
+            if batches and batches[-1][0] is sink:
+                batches[-1][1].extend(units)
+            else:
+                batches.append((sink, units))
+        return batches
+
+    def _write(self, sink, units):
+        start = time.perf_counter()
+        try:
+            sink.writeUnits(units)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            if self._on_error is not None:
+                self._on_error(e)
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        self.batches += 1
+        self.last_write_ms = elapsed
+        self.max_write_ms = max(self.max_write_ms, elapsed)
+        self.total_write_ms += elapsed
+
+    def stats(self):
+        """返回队列深度和写入耗时统计"""
+        avg = self.total_write_ms / self.batches if self.batches else 0.0
+        return {
+            'queue_depth': self.queueDepth(),
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'batches': self.batches,
+            'last_write_ms': self.last_write_ms,
+            'max_write_ms': self.max_write_ms,
+            'avg_write_ms': avg,
+            'errors': self.errors,
+            'last_error': self.last_error,
+        }
+
+
+class MainThreadInvoker(QObject):
+    """让其他线程把函数交给界面线程执行（本地HTTP接口访问 store 时使用）
+
+    submit(fn) 可以在任何线程调用，返回 concurrent.futures.Future；
+    已经取消的 Future 不再执行。
+    """
+
+    _invoke = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._invoke.connect(self._run, Qt.QueuedConnection)
+
+    def submit(self, fn):
+        future = Future()
+        self._invoke.emit((fn, future))
+        return future
+
+    def _run(self, item):
+        fn, future = item
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
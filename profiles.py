@@ -0,0 +1,171 @@
+import json
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+from fileio import atomicWrite
+from store import ClockInStore
+
+DEFAULT_PROFILE = '默认'
+PROFILES_FILE = 'profiles.json'
+# 新建用户的数据放在 profiles/<编号>/ 下（用户名可能不适合作为目录名）
+PROFILES_DIR = 'profiles'
+
+
+class ProfileManager:
+    """多个用户，每个用户一份独立的打卡数据
+
+    用户列表和最近使用的用户保存在 profiles.json；默认用户继续使用原来的
+    clock_in_data.json，没有 profiles.json 时只有默认用户。
+
+    最近使用的用户的 ClockInStore（包括统计、完成矩阵和搜索索引）保存在
+    LRU 缓存中，切换回来时不再读取文件；超出容量时关闭最久未使用的用户
+    （当前用户不会被关闭）。命令行和无界面的接口用 borrow()/openDetached()，
+    不进入缓存。
+    """
+
+    def __init__(self, path=PROFILES_FILE, capacity=3, default_file='clock_in_data.json'):
+        self.path = path
+        self.capacity = max(1, capacity)
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.profiles = OrderedDict([(DEFAULT_PROFILE, default_file)])
+        self.active = DEFAULT_PROFILE
+        self._stores = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        profiles = OrderedDict()
+        for entry in data.get('profiles', []):
+            if isinstance(entry, dict) and entry.get('name') and entry.get('data_file'):
+                profiles[entry['name']] = entry['data_file']
+        if profiles:
+            self.profiles = profiles
+        if data.get('active') in self.profiles:
+            self.active = data['active']
+        else:
+            self.active = next(iter(self.profiles))
+
+    def save(self):
+        data = {'active': self.active,
+                'profiles': [{'name': name, 'data_file': data_file}
+                             for name, data_file in self.profiles.items()]}
+        atomicWrite(self.path, json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    def names(self):
+        return list(self.profiles)
+
+    def dataFileFor(self, name):
+        """用户的数据文件（相对路径相对于 profiles.json 所在目录）"""
+        data_file = self.profiles[name]
+        if os.path.isabs(data_file) or not os.path.dirname(data_file):
+            return data_file
+        return os.path.join(self.base_dir, data_file)
+
+    # 打开和切换
+
+    def open(self, name=None):
+        """打开用户（默认是最近使用的用户）并设为当前用户，返回 ClockInStore"""
+        name = self.active if name is None else name
+        if name not in self.profiles:
+            raise KeyError(name)
+        store = self._stores.get(name)
+        if store is not None:
+            self._stores.move_to_end(name)
+            self.hits += 1
+        else:
+            self.misses += 1
+            store = ClockInStore.open(self.dataFileFor(name))
+            self._stores[name] = store
+        if name != self.active:
+            self.active = name
+            self.save()
+        while len(self._stores) > self.capacity:
+            # 当前用户正在界面中使用，只关闭其他用户
+            evicted = next(key for key in self._stores if key != self.active)
+            self._stores.pop(evicted).close()
+        return store
+
+    def openDetached(self, name=None):
+        """打开用户但不放入缓存、不改变当前用户，由调用方关闭（无界面的接口使用）"""
+        name = self.active if name is None else name
+        if name not in self.profiles:
+            raise KeyError(name)
+        return ClockInStore.open(self.dataFileFor(name))
+
+    @contextmanager
+    def borrow(self, name=None):
+        """执行一条命令期间使用某个用户，不改变当前用户也不改变缓存
+
+        缓存中已经打开的直接使用（结束时写入修改），否则临时打开，结束时关闭。
+        """
+        name = self.active if name is None else name
+        store = self._stores.get(name)
+        if store is not None:
+            try:
+                yield store
+            finally:
+                store.flush()
+            return
+        store = self.openDetached(name)
+        try:
+            yield store
+        finally:
+            store.close()
+
+    def cached(self):
+        """缓存中的用户，从最久未使用到当前用户"""
+        return list(self._stores)
+
+    def closeAll(self):
+        while self._stores:
+            _, store = self._stores.popitem(last=False)
+            store.close()
+
+    # 增删
+
+    def create(self, name):
+        """新建用户（不切换），名称为空或重复时抛出 ValueError"""
+        name = name.strip()
+        if not name:
+            raise ValueError('用户名不能为空')
+        if name in self.profiles:
+            raise ValueError(f'用户 {name} 已存在')
+        number = 1
+        while os.path.exists(os.path.join(self.base_dir, PROFILES_DIR, str(number))):
+            number += 1
+        directory = os.path.join(PROFILES_DIR, str(number))
+        os.makedirs(os.path.join(self.base_dir, directory))
+        self.profiles[name] = os.path.join(directory, 'clock_in_data.json')
+        self.save()
+        return name
+
+    def rename(self, name, new_name):
+        new_name = new_name.strip()
+        if not new_name:
+            raise ValueError('用户名不能为空')
+        if new_name != name and new_name in self.profiles:
+            raise ValueError(f'用户 {new_name} 已存在')
+        self.profiles = OrderedDict((new_name if key == name else key, value)
+                                    for key, value in self.profiles.items())
+        if name in self._stores:
+            self._stores = OrderedDict((new_name if key == name else key, value)
+                                       for key, value in self._stores.items())
+        if self.active == name:
+            self.active = new_name
+        self.save()
+
+    def remove(self, name):
+        """从列表中移除用户（数据文件保留在磁盘上），不能移除当前用户"""
+        if name == self.active:
+            raise ValueError('不能删除当前用户')
+        store = self._stores.pop(name, None)
+        if store is not None:
+            store.close()
+        del self.profiles[name]
+        self.save()
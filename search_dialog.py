@@ -0,0 +1,84 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QLabel, QLineEdit, QListWidget, QListWidgetItem, QApplication
+)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+
+# 每次最多显示的结果数
+RESULT_LIMIT = 200
+SNIPPET_CHARS = 60
+
+
+def snippet(text, query):
+    """截取第一个匹配位置附近的内容"""
+    text = ' '.join(text.split())
+    words = query.split()
+    pos = text.lower().find(words[0].lower()) if words else -1
+    start = max(0, pos - SNIPPET_CHARS // 3) if pos > 0 else 0
+    result = text[start:start + SNIPPET_CHARS]
+    if start > 0:
+        result = '…' + result
+    if start + SNIPPET_CHARS < len(text):
+        result += '…'
+    return result
+
+
+class SearchDialog(QDialog):
+    """搜索完成情况，双击结果跳到日历上对应的日期"""
+
+    dateActivated = pyqtSignal(str)
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.setWindowTitle('搜索完成情况')
+        self.resize(560, 600)
+
+        layout = QVBoxLayout(self)
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText('输入要查找的内容...')
+        layout.addWidget(self.query_edit)
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+        self.result_list = QListWidget()
+        self.result_list.setWordWrap(True)
+        self.result_list.itemActivated.connect(self.onItemActivated)
+        layout.addWidget(self.result_list)
+
+        # 输入停顿后再搜索
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.runSearch)
+        self.query_edit.textChanged.connect(self.search_timer.start)
+        self.query_edit.returnPressed.connect(self.runSearch)
+
+    def runSearch(self):
+        self.search_timer.stop()
+        query = self.query_edit.text().strip()
+        self.result_list.clear()
+        if not query:
+            self.status_label.clear()
+            return
+        if self.store.search is None:
+            # 第一次搜索可能需要建立索引
+            self.status_label.setText('正在建立索引...')
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            QApplication.processEvents()
+        try:
+            results, total = self.store.searchNotes(query, RESULT_LIMIT)
+        finally:
+            if QApplication.overrideCursor() is not None:
+                QApplication.restoreOverrideCursor()
+        for result in results:
+            item = QListWidgetItem(f"{result['date']}  {result['name']}\n{snippet(result['text'], query)}")
+            item.setData(Qt.UserRole, result['date'])
+            self.result_list.addItem(item)
+        if not results:
+            self.status_label.setText('没有找到')
+        elif total > len(results):
+            self.status_label.setText(f'显示最近的 {len(results)} 条（约 {total} 条匹配）')
+        else:
+            self.status_label.setText(f'找到 {len(results)} 条')
+
+    def onItemActivated(self, item):
+        self.dateActivated.emit(item.data(Qt.UserRole))
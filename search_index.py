@@ -0,0 +1,274 @@
+import heapq
+import json
+import os
+import re
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left, insort
+from datetime import date
+from fileio import atomicWrite
+
+VERSION = 1
+WORD_RUN = re.compile(r'\w+')
+
+
+def searchPathFor(json_path):
+    """与JSON数据文件对应的搜索索引文件"""
+    return os.path.splitext(json_path)[0] + '.search'
+
+
+def normalize(text):
+    """全角转半角、英文转小写"""
+    return unicodedata.normalize('NFKC', text).lower()
+
+
+def textGrams(text):
+    """完成情况的索引词：单字和相邻两字（中文没有词边界，不分词）"""
+    grams = set()
+    for run in WORD_RUN.findall(normalize(text)):
+        grams.update(run)
+        grams.update(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def queryGrams(query):
+    """查询词：单字的片段用单字，其余用相邻两字"""
+    grams = set()
+    for run in WORD_RUN.findall(normalize(query)):
+        if len(run) == 1:
+            grams.add(run)
+        else:
+            grams.update(run[i:i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def matches(query, text):
+    """text 是否包含 query 的每个片段（用于排除两字索引的误匹配）"""
+    text = normalize(text)
+    return all(run in text for run in WORD_RUN.findall(normalize(query)))
+
+
+def fileSignature(paths):
+    """文件的大小和修改时间，用来判断索引保存之后数据是否被改动过"""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        if st.st_size:
+            signature.append([os.path.basename(path), st.st_size, st.st_mtime_ns])
+    return signature
+
+
+def readSignature(path):
+    """只读取索引文件的第一行，文件不存在或版本不对时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    if header.get('version') != VERSION:
+        return None
+    return header.get('signature')
+
+
+class SearchIndex:
+    """完成情况的倒排索引
+
+    每条完成情况（任务, 日期）是一个文档，索引词是单字和相邻两字，
+    每个词对应按文档编号排序的 array。修改一条完成情况时根据旧内容和
+    新内容只增删变化的词；删除任务时只把它的文档标记为已删除，重建时清除。
+
+    保存的文件：第一行是版本和数据文件签名，第二行是词表（词 -> 偏移和长度），
+    后面是文档表和全部倒排表的二进制内容。读取时倒排表按需从二进制中取出，
+    加载耗时只和词表大小有关。
+    """
+
+    def __init__(self):
+        # 文档编号 -> 任务id / 日期序号（0 表示已删除）
+        self.doc_tasks = array('I')
+        self.doc_dates = array('I')
+        self.postings = {}
+        # 从文件读取、尚未取出的倒排表：词 -> (偏移, 长度)
+        self._stored = {}
+        self._raw = None
+        # 文件是在字节序不同的机器上写入的
+        self._swap = False
+        self.dirty = False
+
+    @classmethod
+    def build(cls, notes):
+        """从 (任务id, 日期, 内容) 建立索引"""
+        index = cls()
+        cache = {}
+        for task_id, date_str, text in notes:
+            try:
+                ordinal = date.fromisoformat(date_str).toordinal()
+            except (TypeError, ValueError):
+                continue
+            grams = cache.get(text)
+            if grams is None:
+                grams = cache[text] = textGrams(text)
+            doc = index._newDoc(task_id, ordinal)
+            for gram in grams:
+                postings = index.postings.get(gram)
+                if postings is None:
+                    postings = index.postings[gram] = array('I')
+                postings.append(doc)
+        index.dirty = True
+        return index
+
+    def _newDoc(self, task_id, ordinal):
+        self.doc_tasks.append(task_id)
+        self.doc_dates.append(ordinal)
+        return len(self.doc_tasks) - 1
+
+    def _postings(self, gram, create=False):
+        postings = self.postings.get(gram)
+        if postings is None:
+            stored = self._stored.pop(gram, None)
+            if stored is not None:
+                offset, count = stored
+                postings = array('I')
+                postings.frombytes(self._raw[offset * 4:(offset + count) * 4])
+                if self._swap:
+                    postings.byteswap()
+                self.postings[gram] = postings
+            elif create:
+                postings = self.postings[gram] = array('I')
+        return postings
+
+    def __len__(self):
+        return sum(1 for d in self.doc_dates if d)
+
+    # 修改
+
+    def _findDoc(self, task_id, ordinal, grams):
+        """在旧内容最短的倒排表里找这条完成情况的文档编号"""
+        lists = [self._postings(gram) for gram in grams]
+        if not lists or any(p is None for p in lists):
+            return None
+        for doc in min(lists, key=len):
+            if self.doc_tasks[doc] == task_id and self.doc_dates[doc] == ordinal:
+                return doc
+        return None
+
+    def update(self, task_id, date_str, old_text, new_text):
+        """一条完成情况从 old_text 改成 new_text"""
+        try:
+            ordinal = date.fromisoformat(date_str).toordinal()
+        except (TypeError, ValueError):
+            return
+        old_grams = textGrams(old_text) if old_text else set()
+        new_grams = textGrams(new_text) if new_text else set()
+        if old_grams == new_grams:
+            return
+        doc = self._findDoc(task_id, ordinal, old_grams) if old_grams else None
+        if doc is None:
+            if not new_grams:
+                return
+            doc = self._newDoc(task_id, ordinal)
+        for gram in old_grams - new_grams:
+            postings = self._postings(gram)
+            i = bisect_left(postings, doc)
+            if i < len(postings) and postings[i] == doc:
+                del postings[i]
+        for gram in new_grams - old_grams:
+            postings = self._postings(gram, create=True)
+            if not postings or postings[-1] < doc:
+                postings.append(doc)
+            else:
+                insort(postings, doc)
+        if not new_grams:
+            self.doc_dates[doc] = 0
+        self.dirty = True
+
+    def removeTask(self, task_id):
+        """删除任务：标记它的全部文档"""
+        for doc, owner in enumerate(self.doc_tasks):
+            if owner == task_id:
+                self.doc_dates[doc] = 0
+        self.dirty = True
+
+    # 查询
+
+    def search(self, query, limit=100):
+        """返回 (按日期从新到旧的 [(任务id, 日期)], 候选总数)
+
+        两字索引可能有误匹配（查询词的每两个字都出现但不连续），
+        调用方需要用 matches() 检查原文。
+        """
+        grams = queryGrams(query)
+        if not grams:
+            return [], 0
+        lists = sorted((self._postings(gram) or array('I') for gram in grams), key=len)
+        candidates = lists[0]
+        for postings in lists[1:]:
+            if not candidates:
+                break
+            if len(candidates) * 16 < len(postings):
+                # 候选很少时在长的倒排表里二分查找
+                found = []
+                for doc in candidates:
+                    i = bisect_left(postings, doc)
+                    if i < len(postings) and postings[i] == doc:
+                        found.append(doc)
+                candidates = found
+            else:
+                candidates = sorted(set(candidates).intersection(postings))
+        dates = self.doc_dates
+        docs = [doc for doc in candidates if dates[doc]]
+        top = heapq.nlargest(limit, docs, key=dates.__getitem__)
+        return [(self.doc_tasks[doc], date.fromordinal(dates[doc]).isoformat()) for doc in top], len(docs)
+
+    # 读写文件
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        first = data.index(b'\n')
+        second = data.index(b'\n', first + 1)
+        header = json.loads(data[:first])
+        table = json.loads(data[first + 1:second])
+        index = cls()
+        index._swap = header['byteorder'] != sys.byteorder
+        body = memoryview(data)[second + 1:]
+        docs = header['docs']
+        for target, start in ((index.doc_tasks, 0), (index.doc_dates, docs)):
+            target.frombytes(body[start * 4:(start + docs) * 4])
+            if index._swap:
+                target.byteswap()
+        index._raw = body[docs * 8:]
+        index._stored = {gram: tuple(entry) for gram, entry in table.items()}
+        return index
+
+    def save(self, path, signature):
+        """写入索引（原子替换），signature 是写入时数据文件的签名"""
+        chunks = [self.doc_tasks.tobytes(), self.doc_dates.tobytes()]
+        table = {}
+        offset = 0
+        for gram, (stored_offset, count) in self._stored.items():
+            # 从文件读取后没有改动过的倒排表直接复制
+            chunk = self._raw[stored_offset * 4:(stored_offset + count) * 4]
+            if self._swap:
+                swapped = array('I')
+                swapped.frombytes(chunk)
+                swapped.byteswap()
+                chunk = swapped.tobytes()
+            chunks.append(chunk)
+            table[gram] = [offset, count]
+            offset += count
+        for gram, postings in self.postings.items():
+            if postings:
+                chunks.append(postings.tobytes())
+                table[gram] = [offset, len(postings)]
+                offset += len(postings)
+        header = {'version': VERSION, 'signature': signature, 'byteorder': sys.byteorder,
+                  'docs': len(self.doc_tasks)}
+        atomicWrite(path, b''.join([json.dumps(header).encode('utf-8'), b'\n',
+                                    json.dumps(table, ensure_ascii=False).encode('utf-8'), b'\n']
+                                   + chunks))
+        self.dirty = False
@@ -0,0 +1,618 @@
+import json
+import os
+import re
+from collections import OrderedDict
+from datetime import date
+from completion_index import CompletionIndex, parseDate
+from fileio import FileLock, appendDurable, atomicWrite, fsyncDir
+from storage import (Storage, defaultData, fileStamp, historyRows, journalSize, journalTail, maxTaskIdIn,
+                     normalizeData, readJournal, readJournalFrom, snapshotMaxTaskId, unitOps)
+
+META_FILE = 'meta.json'
+JOURNAL_FILE = 'journal.jsonl'
+LOCK_FILE = 'write.lock'
+SHARD_PATTERN = re.compile(r'^(\d{4})\.json$')
+
+
+def shardsPathFor(json_path):
+    """与JSON数据文件对应的分片目录"""
+    return os.path.splitext(json_path)[0] + '.shards'
+
+
+def yearOf(date_str):
+    """'YYYY-MM-DD' 的年份，格式不对时抛出 ValueError"""
+    return parseDate(date_str).year
+
+
+class YearShard:
+    """一年的打卡记录（位图索引）和完成情况"""
+
+    def __init__(self, year):
+        self.year = year
+        self.index = CompletionIndex(date(year, 1, 1))
+        self.notes = {}
+
+    @classmethod
+    def fromJson(cls, year, data):
+        shard = cls(year)
+        for task_id, dates in data.get('completed', {}).items():
+            shard.index.markAll(int(task_id), dates)
+        for task_id, notes in data.get('notes', {}).items():
+            shard.notes[int(task_id)] = dict(notes)
+        return shard
+
+    def toJson(self):
+        """生成可写入文件的数据（全部是新建的对象，可以交给写入线程）"""
+        completed = {}
+        for task_id in sorted(self.index.taskIds()):
+            dates = self.index.dates(task_id)
+            if dates:
+                completed[str(task_id)] = dates
+        notes = {str(task_id): dict(task_notes)
+                 for task_id, task_notes in sorted(self.notes.items()) if task_notes}
+        return {'year': self.year, 'completed': completed, 'notes': notes}
+
+    def applyOp(self, op):
+        kind = op['op']
+        if kind == 'check':
+            self.index.mark(op['task'], op['date'])
+        elif kind == 'uncheck':
+            self.index.unmark(op['task'], op['date'])
+        elif kind == 'note':
+            self.notes.setdefault(op['task'], {})[op['date']] = op['text']
+        elif kind == 'delete':
+            self.index.removeTask(op['task'])
+            self.notes.pop(op['task'], None)
+
+
+class ShardedStorage(Storage):
+    """按年分片的JSON存储
+
+    目录中 meta.json 保存初始日期和任务列表，YYYY.json 保存某一年的打卡记录
+    和完成情况，journal.jsonl 是修改日志。启动时只读取 meta.json、当年的分片
+    和日志；其他年份在日历翻到或查询涉及时才读取，最多同时缓存 cache_shards
+    个年份（当年的分片常驻，有未写入修改的分片不会被淘汰）。
+
+    日志回放到未读取的年份时先记在 _overlay 中，读取该年份时再应用；
+    合并日志时只重写有变化的年份。
+
+    和 JsonStorage 一样，写入时持有目录中 write.lock 的建议锁，
+    pollExternal() 合并其他进程追加的日志。
+    """
+
+    def __init__(self, path, cache_shards=3, compact_min_bytes=64 * 1024, compact_ratio=0.5,
+                 today=None):
+        self.path = path
+        self.meta_path = os.path.join(path, META_FILE)
+        self.journal_path = os.path.join(path, JOURNAL_FILE)
+        self.lock = FileLock(os.path.join(path, LOCK_FILE))
+        self.cache_shards = max(1, cache_shards)
+        self.compact_min_bytes = compact_min_bytes
+        self.compact_ratio = compact_ratio
+        self.hot_year = yearOf(today) if today else date.today().year
+
+        self.meta = None
+        self._by_id = {}
+        self._max_id = 0
+        self._years = set()
+        self._shards = OrderedDict()
+        self._overlay = {}
+        self._dirty = set()
+        # 已交给写入线程、还没写完的年份 {年份: 快照序号}，写完之前同样不能淘汰
+        self._in_flight = {}
+        self._pending = []
+        self._batch_start = None
+        # 日志、快照大小和 _snapshots_written 只由执行写入的线程修改
+        self._journal_bytes = 0
+        self._snapshot_bytes = 0
+        self._snapshots_written = 0
+        self._snapshots_queued = 0
+        # 已经合并到内存的日志长度和 meta.json 的 fileStamp()，持有 lock 时读写
+        self._journal_seen = 0
+        self._snapshot_stamp = None
+        # reserveTaskId() 分配过的最大id，持有 lock 时读写
+        self._reserved = 0
+
+        # 统计信息
+        self.bytes_written = 0
+        self.compactions = 0
+        self.shard_loads = 0
+        self.shard_evictions = 0
+        self.external_reloads = 0
+
+    def shardPath(self, year):
+        return os.path.join(self.path, f'{year:04d}.json')
+
+    def load(self):
+        """读取 meta.json、当年的分片并回放日志"""
+        os.makedirs(self.path, exist_ok=True)
+        with self.lock:
+            if os.path.exists(self.meta_path):
+                self._readFiles()
+            else:
+                self._journal_seen = journalSize(self.journal_path)
+                self.importData(defaultData())
+        self._shard(self.hot_year)
+        return self
+
+    def _readFiles(self):
+        with open(self.meta_path, 'r', encoding='utf-8') as f:
+            self._setMeta(json.load(f))
+        self._snapshot_stamp = fileStamp(self.meta_path)
+        self._snapshot_bytes = self._snapshot_stamp[0]
+        self._journal_bytes = 0
+        for op, size in readJournal(self.journal_path):
+            self._journal_bytes += size
+            if op is not None:
+                self._applyOp(op, replay=True)
+        self._journal_seen = self._journal_bytes
+
+    def pollExternal(self):
+        """合并其他进程写入的修改，返回 (是否重新读取了全部数据, 合并的修改)
+
+        见 JsonStorage.pollExternal()；涉及未读取年份的修改同样先记在 _overlay 中。
+        """
+        with self.lock:
+            stamp = fileStamp(self.meta_path)
+            if stamp is None:
+                return False, []
+            if stamp != self._snapshot_stamp or journalSize(self.journal_path) < self._journal_seen:
+                self._readFiles()
+                self.external_reloads += 1
+                reloaded, ops = True, []
+            else:
+                ops, self._journal_seen = readJournalFrom(self.journal_path, self._journal_seen)
+                reloaded = False
+                for op in ops:
+                    self._applyOp(op, replay=True)
+                ops = [op for op in ops if op['op'] != 'reserve']
+        for op in self._pending:
+            self._applyOp(op)
+        if reloaded:
+            self._shard(self.hot_year)
+        return reloaded, ops
+
+    def reserveTaskId(self):
+        """在锁内分配新的任务id并记到日志中，见 JsonStorage.reserveTaskId()"""
+        with self.lock:
+            offset, latest = self._journal_seen, 0
+            if fileStamp(self.meta_path) != self._snapshot_stamp or journalSize(self.journal_path) < offset:
+                latest = snapshotMaxTaskId(self.meta_path)
+                offset = 0
+            ops, _ = readJournalFrom(self.journal_path, offset)
+            task_id = max(self._max_id, self._reserved, latest, maxTaskIdIn(ops)) + 1
+            encoded = (json.dumps({'op': 'reserve', 'task': task_id}) + '\n').encode('utf-8')
+            size = journalSize(self.journal_path)
+            appendDurable(self.journal_path, encoded)
+            if size == self._journal_seen:
+                self._journal_seen = size + len(encoded)
+            self._reserved = task_id
+        self._max_id = task_id
+        return task_id
+
+    def _setMeta(self, meta):
+        self.meta = meta
+        meta.setdefault('unparsed', {})
+        self._by_id = {task['id']: task for task in meta['tasks']}
+        # 删除的任务id不再分配（见 JsonStorage._setData()），旧版本的 meta 没有记录
+        next_id = meta.pop('next_id', None)
+        if not isinstance(next_id, int):
+            next_id = 1
+        self._max_id = max([next_id - 1] + list(self._by_id))
+        self._years = set(meta.get('years', []))
+        self._shards.clear()
+        self._overlay.clear()
+        self._dirty.clear()
+        self._in_flight.clear()
+
+    def _metaJson(self):
+        return {
+            'start_date': self.meta['start_date'],
+            'tasks': [dict(task) for task in self.meta['tasks']],
+            'years': sorted(self._years),
+            'unparsed': {k: dict(v) if isinstance(v, dict) else list(v)
+                         for k, v in self.meta['unparsed'].items()},
+            'next_id': self._max_id + 1,
+        }
+
+    def _shard(self, year, create=False):
+        """返回某年的分片，需要时从文件读取；该年没有数据时返回 None"""
+        shard = self._shards.get(year)
+        if shard is not None:
+            self._shards.move_to_end(year)
+            return shard
+        if year not in self._years and not create:
+            return None
+
+        path = self.shardPath(year)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                shard = YearShard.fromJson(year, json.load(f))
+            self.shard_loads += 1
+        else:
+            shard = YearShard(year)
+        for op in self._overlay.pop(year, []):
+            shard.applyOp(op)
+            self._dirty.add(year)
+        self._years.add(year)
+        self._shards[year] = shard
+        self._evict()
+        return shard
+
+    def _evict(self):
+        """超过缓存容量时淘汰最久未使用、没有未写入修改的分片
+
+        最近使用的分片（刚读取、即将修改的）不会被淘汰。
+        """
+        # _snapshots_written 由写入线程在快照写完后更新
+        written = self._snapshots_written
+        for year in [y for y, queued in self._in_flight.items() if queued <= written]:
+            del self._in_flight[year]
+        while len(self._shards) > self.cache_shards:
+            candidates = list(self._shards)[:-1]
+            victim = next((y for y in candidates if y != self.hot_year
+                           and y not in self._dirty and y not in self._in_flight), None)
+            if victim is None:
+                return
+            del self._shards[victim]
+            self.shard_evictions += 1
+
+    def residentYears(self):
+        return list(self._shards)
+
+    def _applyOp(self, op, replay=False):
+        """把一条修改记录应用到内存数据上（所有操作都是幂等的）
+
+        回放日志时涉及未读取年份的修改先记下来，读取该年份时再应用。
+        """
+        kind = op['op']
+        if kind == 'batch':
+            for batch_op in op['ops']:
+                self._applyOp(batch_op, replay)
+            return
+        if kind == 'start':
+            self.meta['start_date'] = op['date']
+            return
+        if kind == 'reserve':
+            self._max_id = max(self._max_id, op['task'])
+            return
+        if kind in ('add', 'restore'):
+            if op['task'] not in self._by_id:
+                task = {'id': op['task'], 'name': op['name'], 'days': 0}
+                tasks = self.meta['tasks']
+                index = op.get('index')
+                tasks.insert(len(tasks) if index is None else index, task)
+                self._by_id[task['id']] = task
+                self._max_id = max(self._max_id, task['id'])
+            if kind == 'restore':
+                self._restoreHistory(op, replay)
+            return
+
+        task = self._by_id.get(op['task'])
+        if task is None:
+            return
+        if kind == 'rename':
+            task['name'] = op['name']
+        elif kind == 'delete':
+            self.meta['tasks'].remove(task)
+            del self._by_id[task['id']]
+            self.meta['unparsed'].pop(str(task['id']), None)
+            for year in self._years | set(self._shards):
+                self._applyToYear(year, op, load=False)
+        elif kind in ('check', 'uncheck', 'note'):
+            year = yearOf(op['date'])
+            self._years.add(year)
+            self._applyToYear(year, op, load=not replay)
+        else:
+            raise ValueError(f'未知的操作类型: {kind}')
+
+    def _restoreHistory(self, op, replay):
+        """撤销删除任务：把打卡记录和完成情况按年份放回，无法解析的日期放回 meta"""
+        task_id = op['task']
+        changes = [{'op': 'check', 'task': task_id, 'date': d} for d in op['completed']]
+        changes += [{'op': 'note', 'task': task_id, 'date': d, 'text': t} for d, t in op['notes'].items()]
+        for change in changes:
+            try:
+                year = yearOf(change['date'])
+            except (TypeError, ValueError):
+                entry = self.meta['unparsed'].setdefault(str(task_id), {})
+                if change['op'] == 'check':
+                    completed = entry.setdefault('completed', [])
+                    if change['date'] not in completed:
+                        completed.append(change['date'])
+                else:
+                    entry.setdefault('notes', {})[change['date']] = change['text']
+                continue
+            self._years.add(year)
+            self._applyToYear(year, change, load=not replay)
+
+    def _applyToYear(self, year, op, load):
+        if year in self._shards or load:
+            self._shard(year, create=True).applyOp(op)
+            self._dirty.add(year)
+        else:
+            self._overlay.setdefault(year, []).append(op)
+
+    def apply(self, op):
+        """应用修改并加入待写入队列"""
+        self._applyOp(op)
+        # 连续编辑同一条完成情况时只保留最后的内容
+        if (op['op'] == 'note' and self._pending
+                and self._pending[-1]['op'] == 'note'
+                and self._pending[-1]['task'] == op['task']
+                and self._pending[-1]['date'] == op['date']):
+            self._pending[-1] = op
+        else:
+            self._pending.append(op)
+
+    def hasPending(self):
+        return bool(self._pending)
+
+    def beginBatch(self):
+        self._batch_start = len(self._pending)
+
+    def endBatch(self):
+        """批量修改写成一条日志，崩溃时要么全部回放要么全部丢弃"""
+        start, self._batch_start = self._batch_start, None
+        if start is not None and len(self._pending) - start > 1:
+            self._pending[start:] = [{'op': 'batch', 'ops': self._pending[start:]}]
+
+    def snapshotData(self):
+        """生成需要重写的内容：meta 和有变化的年份"""
+        shards = {}
+        for year in sorted(self._dirty | set(self._overlay)):
+            shards[year] = self._shard(year, create=True).toJson()
+            # 调用前 _snapshots_queued 已经加一，就是这个快照的序号
+            self._in_flight[year] = self._snapshots_queued
+        self._dirty.clear()
+        self._evict()
+        return {'meta': self._metaJson(), 'shards': shards}
+
+    def takeWrites(self):
+        """取出待追加的日志；日志超过阈值时改为重写有变化的分片"""
+        if not self._pending:
+            return []
+        ops, self._pending = self._pending, []
+        threshold = max(self.compact_min_bytes, self._snapshot_bytes * self.compact_ratio)
+        # 有修改的分片不能淘汰，数量超过缓存容量时也提前合并
+        too_many_dirty = len(self._dirty) + len(self._overlay) > self.cache_shards
+        if ((self._journal_bytes > threshold or too_many_dirty)
+                and self._snapshots_queued == self._snapshots_written):
+            self._snapshots_queued += 1
+            return [('snapshot', dict(self.snapshotData(), ops=ops))]
+        return [('append', ops)]
+
+    def writeUnits(self, units):
+        """执行写入：最后一个快照之前的日志都已包含在快照中，可以跳过"""
+        with self.lock:
+            last_snapshot = None
+            for i, (kind, _) in enumerate(units):
+                if kind == 'snapshot':
+                    last_snapshot = i
+            if last_snapshot is not None:
+                if fileStamp(self.meta_path) == self._snapshot_stamp:
+                    # 之前的快照重写过的年份，在最后一个快照中可能没有变化，需要一起写入
+                    shards = {}
+                    for kind, snapshot in units[:last_snapshot + 1]:
+                        if kind == 'snapshot':
+                            shards.update(snapshot['shards'])
+                    self._writeSnapshot({'meta': units[last_snapshot][1]['meta'], 'shards': shards})
+                    units = units[last_snapshot + 1:]
+                else:
+                    # meta.json 被其他进程改写过，不能覆盖：改为追加日志，合并时重新读取
+                    self._snapshots_written = self._snapshots_queued
+            lines = ''.join(json.dumps(op, ensure_ascii=False) + '\n'
+                            for kind, payload in units for op in unitOps(kind, payload))
+            if lines:
+                encoded = lines.encode('utf-8')
+                size = journalSize(self.journal_path)
+                appendDurable(self.journal_path, encoded)
+                if size == self._journal_seen:
+                    self._journal_seen = size + len(encoded)
+                self._journal_bytes = size + len(encoded)
+                self.bytes_written += len(encoded)
+
+    def _writeSnapshot(self, snapshot):
+        written = 0
+        with self.lock:
+            # 其他进程追加、还没合并到内存的日志不在快照中，写完后保留下来
+            unseen = journalTail(self.journal_path, self._journal_seen)
+            for year, shard in snapshot['shards'].items():
+                encoded = json.dumps(shard, ensure_ascii=False).encode('utf-8')
+                atomicWrite(self.shardPath(year), encoded)
+                written += len(encoded)
+            # meta 最后写入：崩溃时日志仍在，回放后结果相同；
+            # 生成 meta 之后预留的id记录在日志中，日志删除前要记到 meta 里
+            meta = dict(snapshot['meta'], next_id=max(snapshot['meta']['next_id'], self._reserved + 1))
+            encoded = json.dumps(meta, ensure_ascii=False, indent=2).encode('utf-8')
+            atomicWrite(self.meta_path, encoded)
+            if unseen:
+                atomicWrite(self.journal_path, unseen)
+            elif os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+                fsyncDir(self.path)
+            self._journal_bytes = len(unseen)
+            self._journal_seen = 0
+            self._snapshot_stamp = fileStamp(self.meta_path)
+        self._snapshot_bytes = len(encoded) + written
+        self._snapshots_written = self._snapshots_queued
+        self.bytes_written += len(encoded) + written
+        self.compactions += 1
+
+    def compact(self):
+        """同步地重写有变化的分片并清空日志"""
+        self._pending = []
+        self._snapshots_queued += 1
+        self._writeSnapshot(self.snapshotData())
+
+    def startDate(self):
+        return self.meta['start_date']
+
+    def tasks(self):
+        return self.meta['tasks']
+
+    def task(self, task_id):
+        return self._by_id.get(task_id)
+
+    def nextTaskId(self):
+        return self._max_id + 1
+
+    def _shardFor(self, date_str):
+        try:
+            return self._shard(yearOf(date_str))
+        except ValueError:
+            return None
+
+    def isCompleted(self, task_id, date):
+        shard = self._shardFor(date)
+        return shard is not None and shard.index.test(task_id, date)
+
+    def note(self, task_id, date):
+        shard = self._shardFor(date)
+        if shard is None or task_id not in self._by_id:
+            return ''
+        return shard.notes.get(task_id, {}).get(date, '')
+
+    def completedDatesBetween(self, first, last):
+        dates = set()
+        first_year, last_year = yearOf(first), yearOf(last)
+        for year in sorted(self._years):
+            if not first_year <= year <= last_year:
+                continue
+            shard = self._shard(year)
+            if shard is not None:
+                dates |= shard.index.completedDatesBetween(max(first, f'{year:04d}-01-01'),
+                                                           min(last, f'{year:04d}-12-31'))
+        return dates
+
+    def tasksCompletedOn(self, date):
+        shard = self._shardFor(date)
+        if shard is None:
+            return []
+        return [t['name'] for t in self.meta['tasks'] if shard.index.test(t['id'], date)]
+
+    def completionOrdinals(self):
+        """依次读取全部年份（经过缓存，读完后只保留最近的几年）"""
+        result = {task['id']: [] for task in self.meta['tasks']}
+        for year in sorted(self._years):
+            shard = self._shard(year)
+            for task_id, ordinals in result.items():
+                ordinals.extend(shard.index.ordinals(task_id))
+        return result
+
+    def iterNotes(self):
+        """依次读取全部年份"""
+        for year in sorted(self._years):
+            shard = self._shard(year)
+            for task_id, notes in list(shard.notes.items()):
+                if task_id in self._by_id:
+                    for date_str, text in list(notes.items()):
+                        if text:
+                            yield task_id, date_str, text
+
+    def iterHistory(self):
+        """依次读取全部年份，每次只处理一年"""
+        tasks = self.meta['tasks']
+        for year in sorted(self._years):
+            shard = self._shard(year)
+            completed = {task['id']: shard.index.dates(task['id']) for task in tasks}
+            yield from historyRows(tasks, completed, shard.notes)
+        unparsed = {int(task_id): entry for task_id, entry in self.meta['unparsed'].items()}
+        yield from historyRows(tasks, {task_id: entry.get('completed', []) for task_id, entry in unparsed.items()},
+                               {task_id: entry.get('notes', {}) for task_id, entry in unparsed.items()})
+
+    def _taskInYear(self, year, task_id):
+        """某年中一个任务的分片（只含这个任务）；未读取的年份临时读文件，不放入缓存"""
+        shard = self._shards.get(year)
+        if shard is not None:
+            return shard
+        shard = YearShard(year)
+        path = self.shardPath(year)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            key = str(task_id)
+            shard = YearShard.fromJson(year, {'completed': {key: data.get('completed', {}).get(key, [])},
+                                              'notes': {key: data.get('notes', {}).get(key, {})}})
+        for op in self._overlay.get(year, []):
+            if op.get('task') == task_id:
+                shard.applyOp(op)
+        return shard
+
+    def exportTask(self, task_id):
+        """逐年取出一个任务的记录：已缓存的年份直接读取，其他年份读完就丢弃，不改变缓存"""
+        task = self._by_id.get(task_id)
+        if task is None:
+            return None
+        completed = []
+        notes = {}
+        for year in sorted(self._years):
+            shard = self._taskInYear(year, task_id)
+            completed.extend(shard.index.dates(task_id))
+            notes.update(shard.notes.get(task_id, {}))
+        unparsed = self.meta['unparsed'].get(str(task_id), {})
+        return {'id': task_id, 'name': task['name'], 'days': task.get('days', 0),
+                'completed': completed + unparsed.get('completed', []),
+                'notes': dict(notes, **unparsed.get('notes', {}))}
+
+    def exportData(self):
+        """导出成 clock_in_data.json 的格式（依次读取全部年份）"""
+        tasks = []
+        completed = {task['id']: [] for task in self.meta['tasks']}
+        notes = {task['id']: {} for task in self.meta['tasks']}
+        for year in sorted(self._years):
+            shard = self._shard(year)
+            for task_id in completed:
+                completed[task_id].extend(shard.index.dates(task_id))
+                notes[task_id].update(shard.notes.get(task_id, {}))
+        for task in self.meta['tasks']:
+            unparsed = self.meta['unparsed'].get(str(task['id']), {})
+            tasks.append({'id': task['id'], 'name': task['name'], 'days': task.get('days', 0),
+                          'completed': completed[task['id']] + unparsed.get('completed', []),
+                          'notes': dict(notes[task['id']], **unparsed.get('notes', {}))})
+        return {'start_date': self.meta['start_date'], 'tasks': tasks}
+
+    def importData(self, data):
+        """用导入的数据替换全部内容，按年份拆分后全部重写"""
+        data = normalizeData(json.loads(json.dumps(data)))
+        shards = {}
+        unparsed = {}
+        for task in data['tasks']:
+            for date_str in task['completed']:
+                try:
+                    year = yearOf(date_str)
+                except (TypeError, ValueError):
+                    # 无法解析的日期原样保留在 meta 中
+                    unparsed.setdefault(str(task['id']), {}).setdefault('completed', []).append(date_str)
+                    continue
+                if year not in shards:
+                    shards[year] = YearShard(year)
+                shards[year].index.mark(task['id'], date_str)
+            for date_str, text in task['notes'].items():
+                try:
+                    year = yearOf(date_str)
+                except (TypeError, ValueError):
+                    unparsed.setdefault(str(task['id']), {}).setdefault('notes', {})[date_str] = text
+                    continue
+                if year not in shards:
+                    shards[year] = YearShard(year)
+                shards[year].notes.setdefault(task['id'], {})[date_str] = text
+
+        self._setMeta({
+            'start_date': data['start_date'],
+            'tasks': [{'id': t['id'], 'name': t['name'], 'days': t.get('days', 0)}
+                      for t in data['tasks']],
+            'years': sorted(shards),
+            'unparsed': unparsed,
+            'next_id': data.get('next_id'),
+        })
+        self._shards.update(sorted(shards.items()))
+        self._dirty.update(shards)
+        os.makedirs(self.path, exist_ok=True)
+        self.compact()
+
+        # 删除导入数据中已不存在的年份
+        for name in os.listdir(self.path):
+            match = SHARD_PATTERN.match(name)
+            if match and int(match.group(1)) not in shards:
+                os.remove(os.path.join(self.path, name))
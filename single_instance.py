@@ -0,0 +1,112 @@
+import getpass
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from multiprocessing.connection import Client, Listener
+
+# 请求和回复都是一条JSON（send_bytes），不使用 pickle
+MAX_MESSAGE = 1 << 20
+# 等待正在运行的实例回复的时间（秒）
+REPLY_TIMEOUT = 30
+
+
+def addressFor(base_dir):
+    """同一个数据目录只运行一个实例：按目录生成本地套接字（Windows 上是命名管道）的地址"""
+    key = hashlib.sha1(os.path.abspath(base_dir).encode('utf-8')).hexdigest()[:12]
+    if sys.platform == 'win32':
+        return rf'\\.\pipe\clockin-{getpass.getuser()}-{key}'
+    # 套接字放在只有当前用户能访问的目录里
+    directory = os.path.join(tempfile.gettempdir(), f'clockin-{os.getuid()}')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return os.path.join(directory, f'{key}.sock')
+
+
+def forward(request, address):
+    """把请求交给正在运行的实例，返回它的回复；没有正在运行的实例时返回 None"""
+    try:
+        conn = Client(address)
+    except (OSError, EOFError):
+        return None
+    with conn:
+        try:
+            conn.send_bytes(json.dumps(request, ensure_ascii=False).encode('utf-8'))
+            if not conn.poll(REPLY_TIMEOUT):
+                return {'code': 1, 'error': '正在运行的程序没有响应\n'}
+            return json.loads(conn.recv_bytes(MAX_MESSAGE))
+        except (OSError, EOFError, ValueError):
+            return None
+
+
+class InstanceServer:
+    """单实例：第一个启动的进程监听本地地址，之后的启动把参数转发给它
+
+    listen() 在导入 PyQt 之前调用，地址已被正在运行的实例占用时返回 False；
+    serve(handler) 在后台线程中逐个接收请求，handler(request) 的返回值
+    （可以JSON序列化的对象）发回给对方，handler 在这个后台线程中被调用。
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self.listener = None
+        self.handler = None
+        self.requests = 0
+        self._closed = False
+        self._thread = None
+
+    def listen(self):
+        try:
+            self.listener = Listener(self.address)
+        except OSError:
+            if forward({'ping': True}, self.address) is not None or sys.platform == 'win32':
+                return False
+            # 上次异常退出残留的套接字文件，没有进程在监听
+            try:
+                os.remove(self.address)
+                self.listener = Listener(self.address)
+            except OSError:
+                return False
+        return True
+
+    def serve(self, handler):
+        self.handler = handler
+        self._thread = threading.Thread(target=self._run, name='single-instance', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError):
+                continue
+            with conn:
+                if self._closed:
+                    return
+                try:
+                    request = json.loads(conn.recv_bytes(MAX_MESSAGE))
+                    reply = {'code': 0} if request.get('ping') else self.handler(request)
+                    self.requests += 1
+                except (OSError, EOFError):
+                    continue
+                except Exception as e:
+                    reply = {'code': 1, 'error': f'{e}\n'}
+                try:
+                    conn.send_bytes(json.dumps(reply, ensure_ascii=False).encode('utf-8'))
+                except (OSError, EOFError):
+                    pass
+
+    def close(self):
+        """停止接收请求并删除监听地址"""
+        if self.listener is None or self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            # 连接一次，让阻塞在 accept() 中的线程退出
+            try:
+                Client(self.address).close()
+            except (OSError, EOFError):
+                pass
+            self._thread.join(1)
+        self.listener.close()
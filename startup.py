@@ -0,0 +1,63 @@
+import json
+import sys
+import time
+
+# 尽量早地记录起点：main.py 在导入 PyQt 之前先导入本模块
+PROCESS_START = time.perf_counter()
+
+FLAG = '--startup-timeline'
+
+
+class StartupTimeline:
+    """启动时间线：记录各阶段（导入、加载、首次绘制、可交互）距离启动的耗时
+
+    运行 `python main.py --startup-timeline` 时在结束后输出到标准错误；
+    `--startup-timeline=路径` 时还会把结果追加为一行JSON，方便按版本对比。
+    """
+
+    def __init__(self, enabled=False, log_path=None, origin=PROCESS_START):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.origin = origin
+        self.marks = []
+        self._finished = False
+
+    @classmethod
+    def fromArgv(cls, argv):
+        """从命令行参数中取出启动时间线选项，返回 (timeline, 剩余参数)"""
+        rest = []
+        enabled, log_path = False, None
+        for arg in argv:
+            if arg == FLAG:
+                enabled = True
+            elif arg.startswith(FLAG + '='):
+                enabled, log_path = True, arg[len(FLAG) + 1:]
+            else:
+                rest.append(arg)
+        return cls(enabled, log_path), rest
+
+    def mark(self, name):
+        """记录一个阶段结束的时间"""
+        if self.enabled and not self._finished:
+            self.marks.append((name, (time.perf_counter() - self.origin) * 1000))
+
+    def report(self):
+        lines = []
+        previous = 0.0
+        for name, at in self.marks:
+            lines.append(f'{name:<14}{at:>10.1f} ms  (+{at - previous:.1f})')
+            previous = at
+        return '\n'.join(lines)
+
+    def finish(self):
+        """启动完成，输出时间线（只输出一次）"""
+        if not self.enabled or self._finished:
+            return
+        self._finished = True
+        if sys.stderr is not None:
+            print('启动时间线:\n' + self.report(), file=sys.stderr)
+        if self.log_path:
+            record = {'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                      'marks': {name: round(at, 1) for name, at in self.marks}}
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
@@ -0,0 +1,1065 @@
+import json
+import os
+import re
+import sqlite3
+from datetime import date, datetime, timedelta
+from completion_index import CompletionIndex
+from fileio import FileLock, appendDurable, atomicWrite, fsyncDir
+from notes_archive import NotesArchive, archivePathFor
+
+DATE_FORMAT = '%Y-%m-%d'
+
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+DEFAULT_TASK_NAMES = ['醒了立刻起床', '锻炼身体一分钟', '阅读一页书']
+
+
+def defaultData():
+    """创建默认数据"""
+    return {
+        'start_date': datetime.now().strftime(DATE_FORMAT),
+        'tasks': [
+            {'id': i + 1, 'name': name, 'days': 0, 'completed': [], 'notes': {}}
+            for i, name in enumerate(DEFAULT_TASK_NAMES)
+        ]
+    }
+
+
+def historyRows(tasks, completed, notes):
+    """合并打卡记录和完成情况，按 (日期, 任务顺序) 生成 (任务id, 日期, 是否完成, 完成情况)
+
+    completed 是 {任务id: 日期列表}，notes 是 {任务id: {日期: 内容}}，不在 tasks 中的任务忽略。
+    """
+    order = {task['id']: i for i, task in enumerate(tasks)}
+    rows = {}
+    for task_id, dates in completed.items():
+        if task_id in order:
+            for date_str in dates:
+                rows[(date_str, order[task_id])] = [task_id, date_str, True, '']
+    for task_id, task_notes in notes.items():
+        if task_id in order:
+            for date_str, text in task_notes.items():
+                if text:
+                    rows.setdefault((date_str, order[task_id]), [task_id, date_str, False, ''])[3] = text
+    for key in sorted(rows):
+        yield tuple(rows[key])
+
+
+def readJournal(path):
+    """逐行读取修改日志，返回 (操作, 该行字节数)；残缺的行操作为 None"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            size = len(line.encode('utf-8'))
+            line = line.strip()
+            if not line:
+                yield None, size
+                continue
+            try:
+                yield json.loads(line), size
+            except ValueError:
+                # 写入中途崩溃留下的残缺行，忽略
+                yield None, size
+
+
+def journalSize(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def journalTail(path, offset):
+    """日志 offset 字节之后的内容"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            return f.read()
+    except FileNotFoundError:
+        return b''
+
+
+def readJournalFrom(path, offset):
+    """读取日志 offset 字节之后追加的内容，返回 (操作列表, 读到的位置)
+
+    只读到最后一个完整的行，写了一半的行留到下次再读。
+    """
+    data = journalTail(path, offset)
+    end = data.rfind(b'\n') + 1
+    ops = []
+    for line in data[:end].splitlines():
+        try:
+            if line.strip():
+                ops.append(json.loads(line))
+        except ValueError:
+            pass
+    return ops, offset + end
+
+
+def fileStamp(path):
+    """判断文件是否被整体改写用的 (大小, 修改时间, inode)，文件不存在时为 None"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def maxTaskIdIn(ops):
+    """修改记录中添加、放回或预留的最大任务id"""
+    result = 0
+    for op in ops:
+        if op['op'] == 'batch':
+            result = max(result, maxTaskIdIn(op['ops']))
+        elif op['op'] in ('add', 'restore', 'reserve'):
+            result = max(result, op['task'])
+    return result
+
+
+def snapshotMaxTaskId(path):
+    """快照（或分片存储的 meta.json）中用过的最大任务id"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return 0
+    next_id = data.get('next_id')
+    ids = [task['id'] for task in data['tasks'] if isinstance(task.get('id'), int)]
+    return max(ids + [next_id - 1 if isinstance(next_id, int) else 0])
+
+
+def unitOps(kind, payload):
+    """写入单元中的修改记录（快照单元也带着它包含的修改）"""
+    return payload['ops'] if kind == 'snapshot' else payload
+
+
+def normalizeData(data):
+    """补全旧版本文件缺少的字段（任务id、notes）"""
+    next_id = max([t.get('id', 0) for t in data['tasks']] + [0]) + 1
+    for task in data['tasks']:
+        if 'id' not in task:
+            task['id'] = next_id
+            next_id += 1
+        task.setdefault('days', 0)
+        task.setdefault('completed', [])
+        task.setdefault('notes', {})
+    return data
+
+
+class Storage:
+    """存储后端接口
+
+    界面只通过这些方法读取需要显示的数据，修改统一用 apply() 提交。
+    takeWrites() 在主线程取出待写入的内容（不做磁盘操作），
+    writeUnits() 负责真正的磁盘写入，可以在后台线程执行；
+    flush() 是两者的同步组合。
+    """
+
+    def load(self):
+        raise NotImplementedError
+
+    def apply(self, op):
+        raise NotImplementedError
+
+    def hasPending(self):
+        raise NotImplementedError
+
+    def takeWrites(self):
+        """取出待写入的内容，返回写入单元列表（只读数据，可交给其他线程）"""
+        raise NotImplementedError
+
+    def writeUnits(self, units):
+        """执行磁盘写入"""
+        raise NotImplementedError
+
+    def beginBatch(self):
+        """开始批量修改：之后的修改在 endBatch() 时合并成一次写入"""
+
+    def endBatch(self):
+        pass
+
+    def pollExternal(self):
+        """合并其他进程写入的修改，返回 (是否重新读取了全部数据, 合并的修改)
+
+        只能在没有排队中的后台写入时调用。
+        """
+        return False, []
+
+    def flush(self):
+        """同步写入全部待写入的修改"""
+        units = self.takeWrites()
+        if units:
+            self.writeUnits(units)
+
+    def close(self):
+        self.flush()
+
+    def startDate(self):
+        raise NotImplementedError
+
+    def tasks(self):
+        """按显示顺序返回任务列表，每项至少包含 id 和 name"""
+        raise NotImplementedError
+
+    def task(self, task_id):
+        """按id返回任务，找不到返回None"""
+        raise NotImplementedError
+
+    def nextTaskId(self):
+        """下一个新任务的id（只看本进程的数据，不做分配）"""
+        return max([t['id'] for t in self.tasks()] + [0]) + 1
+
+    def reserveTaskId(self):
+        """分配一个新的任务id，其他进程同时添加任务时不会分配到同一个id"""
+        return self.nextTaskId()
+
+    def isCompleted(self, task_id, date):
+        raise NotImplementedError
+
+    def note(self, task_id, date):
+        """返回某任务某天的完成情况，没有时返回空字符串"""
+        raise NotImplementedError
+
+    def notesOn(self, date):
+        """返回某天全部非空的完成情况 {任务id: 内容}"""
+        notes = {task['id']: self.note(task['id'], date) for task in self.tasks()}
+        return {task_id: text for task_id, text in notes.items() if text}
+
+    def completedDatesBetween(self, first, last):
+        """返回 [first, last] 范围内至少完成一个任务的日期集合"""
+        raise NotImplementedError
+
+    def tasksCompletedOn(self, date):
+        """返回某天完成的任务名称列表"""
+        raise NotImplementedError
+
+    def completionOrdinals(self):
+        """返回 {任务id: 按顺序排列的完成日期序号}，用于建立打卡统计"""
+        raise NotImplementedError
+
+    def iterNotes(self):
+        """依次返回全部非空的完成情况 (任务id, 日期, 内容)，用于建立搜索索引"""
+        for task in self.exportData()['tasks']:
+            for date_str, text in task['notes'].items():
+                if text:
+                    yield task['id'], date_str, text
+
+    def iterHistory(self):
+        """按日期顺序返回全部记录 (任务id, 日期, 是否完成, 完成情况)，用于逐行导出"""
+        tasks = self.exportData()['tasks']
+        yield from historyRows(tasks, {t['id']: t['completed'] for t in tasks},
+                               {t['id']: t['notes'] for t in tasks})
+
+    def exportTask(self, task_id):
+        """导出一个任务和它的全部打卡记录、完成情况（exportData() 中任务的格式），不存在时返回 None
+
+        撤销删除任务时用 restore 操作放回。
+        """
+        for task in self.exportData()['tasks']:
+            if task['id'] == task_id:
+                return task
+        return None
+
+    def archivedNotes(self, task_id):
+        """不在 exportTask() 中的归档完成情况 {日期: 内容}"""
+        return {}
+
+    def exportData(self):
+        """导出成 clock_in_data.json 的格式"""
+        raise NotImplementedError
+
+    def importData(self, data):
+        """用导入的数据替换全部内容"""
+        raise NotImplementedError
+
+
+class JsonStorage(Storage):
+    """JSON快照 + 追加日志的存储
+
+    每次修改只在日志文件末尾追加一行JSON，加载时在快照上回放日志；
+    日志超过阈值后合并成新的快照。内存中打卡记录保存在位图索引里，
+    写快照时再转换回日期字符串列表。
+
+    早于 archive_after_days 天的完成情况在加载时移到压缩归档
+    （见 NotesArchive），数据文件和内存中只保留最近的内容；
+    为 0 或 None 时不归档。
+
+    多个进程可以同时打开同一份数据：写入时持有锁文件的建议锁，
+    pollExternal() 只读取其他进程新追加的日志并合并；合并快照时
+    还没读取的日志保留下来，不会覆盖其他进程的修改。
+    """
+
+    def __init__(self, path, compact_min_bytes=64 * 1024, compact_ratio=0.5,
+                 archive_after_days=365):
+        self.path = path
+        self.journal_path = journalPathFor(path)
+        self.compact_min_bytes = compact_min_bytes
+        self.compact_ratio = compact_ratio
+        self.archive_after_days = archive_after_days
+        self.archive = NotesArchive(archivePathFor(path))
+        self.lock = FileLock(lockPathFor(path))
+        self.data = None
+        self.index = None
+        self._by_id = {}
+        self._max_id = 0
+        self._unparsed = {}
+        self._pending = []
+        self._batch_start = None
+        # 日志、快照大小和 _snapshots_written 只由执行写入的线程修改
+        self._journal_bytes = 0
+        self._snapshot_bytes = 0
+        self._snapshots_written = 0
+        self._snapshots_queued = 0
+        # 已经合并到内存的日志长度和快照的 fileStamp()，持有 lock 时读写
+        self._journal_seen = 0
+        self._snapshot_stamp = None
+        # reserveTaskId() 分配过的最大id，持有 lock 时读写
+        self._reserved = 0
+
+        # 统计信息
+        self.bytes_written = 0
+        self.compactions = 0
+        self.external_reloads = 0
+
+    def load(self):
+        """读取快照并回放日志"""
+        with self.lock:
+            if os.path.exists(self.path):
+                self._readFiles()
+            else:
+                self._setData(defaultData())
+                # 没有快照时残留的日志作废
+                self._journal_seen = journalSize(self.journal_path)
+                self.compact()
+
+            if self.archive_after_days:
+                self.archiveOldNotes()
+        return self.data
+
+    def _readFiles(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self._setData(json.load(f))
+        self._snapshot_stamp = fileStamp(self.path)
+        self._snapshot_bytes = self._snapshot_stamp[0]
+        self._journal_bytes = 0
+        for op, size in readJournal(self.journal_path):
+            self._journal_bytes += size
+            if op is not None:
+                self._applyOp(op)
+        self._journal_seen = self._journal_bytes
+
+    def pollExternal(self):
+        """合并其他进程写入的修改，返回 (是否重新读取了全部数据, 合并的修改)
+
+        日志只读取上次之后追加的部分；快照被改写（其他进程合并了日志、
+        同步盘替换了文件）时重新读取全部数据。还没写入的修改重新应用在
+        合并结果之上。只能在没有排队中的后台写入时调用。
+        """
+        with self.lock:
+            stamp = fileStamp(self.path)
+            if stamp is None:
+                # 文件暂时不存在（正在被替换），下次再检查
+                return False, []
+            if stamp != self._snapshot_stamp or journalSize(self.journal_path) < self._journal_seen:
+                self._readFiles()
+                self.archive.refresh()
+                self.external_reloads += 1
+                reloaded, ops = True, []
+            else:
+                ops, self._journal_seen = readJournalFrom(self.journal_path, self._journal_seen)
+                reloaded = False
+                for op in ops:
+                    self._applyOp(op)
+                ops = [op for op in ops if op['op'] != 'reserve']
+        for op in self._pending:
+            self._applyOp(op)
+        return reloaded, ops
+
+    def reserveTaskId(self):
+        """在锁内分配新的任务id，并立即在日志中追加一条 reserve 记录
+
+        其他进程追加、还没合并的日志和改写过的快照中的id也算在内；
+        其他进程分配id时持有同一把锁，能看到这条记录。
+        """
+        with self.lock:
+            offset, latest = self._journal_seen, 0
+            if fileStamp(self.path) != self._snapshot_stamp or journalSize(self.journal_path) < offset:
+                latest = snapshotMaxTaskId(self.path)
+                offset = 0
+            ops, _ = readJournalFrom(self.journal_path, offset)
+            task_id = max(self._max_id, self._reserved, latest, maxTaskIdIn(ops)) + 1
+            encoded = (json.dumps({'op': 'reserve', 'task': task_id}) + '\n').encode('utf-8')
+            size = journalSize(self.journal_path)
+            appendDurable(self.journal_path, encoded)
+            if size == self._journal_seen:
+                self._journal_seen = size + len(encoded)
+            self._reserved = task_id
+        self._max_id = task_id
+        return task_id
+
+    def archiveOldNotes(self, today=None):
+        """把早于 archive_after_days 天的完成情况移到归档，返回移动的条数
+
+        先写归档再写快照：两步之间崩溃时内容同时存在于两处，读取时以数据文件为准。
+        只能在没有排队中的后台写入时调用（加载、导入时）。
+        """
+        today = date.fromisoformat(today) if today else date.today()
+        cutoff = (today - timedelta(days=self.archive_after_days)).isoformat()
+        old = {}
+        for task in self.data['tasks']:
+            notes = task['notes']
+            for date_str in [d for d in notes if d < cutoff and ISO_DATE.match(d)]:
+                old.setdefault(date_str, {})[task['id']] = notes.pop(date_str)
+        if not old:
+            return 0
+        self.archive.add(old, keep_tasks=set(self._by_id))
+        self.compact()
+        return sum(len(notes) for notes in old.values())
+
+    def _setData(self, data):
+        """载入完整数据，把 completed 列表转换成位图索引"""
+        self.data = normalizeData(data)
+        self.index = CompletionIndex(self.data['start_date'])
+        self._by_id = {task['id']: task for task in self.data['tasks']}
+        # 删除的任务id不再分配：归档中可能还有它的完成情况（撤销删除时也要用到）
+        next_id = self.data.pop('next_id', None)
+        if not isinstance(next_id, int):
+            # 旧版本的文件没有记录，从归档中的任务id推算（只在第一次读取时）
+            next_id = self.archive.maxTaskId() + 1
+        self._max_id = max([next_id - 1] + list(self._by_id))
+        self._unparsed = {}
+        for task in self.data['tasks']:
+            self.index.addTask(task['id'])
+            self._markCompleted(task['id'], task.pop('completed'))
+
+    def _markCompleted(self, task_id, completed):
+        try:
+            self.index.markAll(task_id, completed)
+            return
+        except (TypeError, ValueError):
+            pass
+        for date in completed:
+            try:
+                self.index.mark(task_id, date)
+            except (TypeError, ValueError):
+                # 无法解析的日期原样保留，写快照时再放回去
+                unparsed = self._unparsed.setdefault(task_id, [])
+                if date not in unparsed:
+                    unparsed.append(date)
+
+    def _applyOp(self, op):
+        """把一条修改记录应用到内存数据上
+
+        所有操作都是幂等的，重复回放同一条日志不会改变结果。
+        """
+        kind = op['op']
+        if kind == 'batch':
+            for batch_op in op['ops']:
+                self._applyOp(batch_op)
+            return
+        if kind == 'start':
+            self.data['start_date'] = op['date']
+            return
+        if kind == 'reserve':
+            self._max_id = max(self._max_id, op['task'])
+            return
+        if kind in ('add', 'restore'):
+            task = self._by_id.get(op['task'])
+            if task is None:
+                task = {'id': op['task'], 'name': op['name'], 'days': 0, 'notes': {}}
+                tasks = self.data['tasks']
+                index = op.get('index')
+                tasks.insert(len(tasks) if index is None else index, task)
+                self._by_id[task['id']] = task
+                self._max_id = max(self._max_id, task['id'])
+                self.index.addTask(task['id'])
+            if kind == 'restore':
+                # 撤销删除：连同打卡记录和完成情况一起放回原来的位置
+                self._markCompleted(task['id'], op['completed'])
+                task['notes'].update(op['notes'])
+            return
+
+        task = self._by_id.get(op['task'])
+        if task is None:
+            return
+        if kind == 'delete':
+            self.data['tasks'].remove(task)
+            del self._by_id[task['id']]
+            self.index.removeTask(task['id'])
+            self._unparsed.pop(task['id'], None)
+        elif kind == 'check':
+            self.index.mark(task['id'], op['date'])
+        elif kind == 'uncheck':
+            self.index.unmark(task['id'], op['date'])
+        elif kind == 'note':
+            task['notes'][op['date']] = op['text']
+        elif kind == 'rename':
+            task['name'] = op['name']
+        else:
+            raise ValueError(f'未知的操作类型: {kind}')
+
+    def snapshotData(self):
+        """生成 clock_in_data.json 格式的完整数据"""
+        tasks = []
+        for task in self.data['tasks']:
+            snapshot_task = dict(task)
+            snapshot_task['notes'] = dict(task['notes'])
+            snapshot_task['completed'] = (self.index.dates(task['id'])
+                                          + self._unparsed.get(task['id'], []))
+            tasks.append(snapshot_task)
+        return {'start_date': self.data['start_date'], 'tasks': tasks, 'next_id': self._max_id + 1}
+
+    def apply(self, op):
+        """应用修改并加入待写入队列"""
+        self._applyOp(op)
+        # 连续编辑同一条完成情况时只保留最后的内容
+        if (op['op'] == 'note' and self._pending
+                and self._pending[-1]['op'] == 'note'
+                and self._pending[-1]['task'] == op['task']
+                and self._pending[-1]['date'] == op['date']):
+            self._pending[-1] = op
+        else:
+            self._pending.append(op)
+
+    def hasPending(self):
+        return bool(self._pending)
+
+    def beginBatch(self):
+        self._batch_start = len(self._pending)
+
+    def endBatch(self):
+        """批量修改写成一条日志，崩溃时要么全部回放要么全部丢弃"""
+        start, self._batch_start = self._batch_start, None
+        if start is not None and len(self._pending) - start > 1:
+            self._pending[start:] = [{'op': 'batch', 'ops': self._pending[start:]}]
+
+    def takeWrites(self):
+        """取出待追加的日志；日志超过阈值时改为写一份新的快照"""
+        if not self._pending:
+            return []
+        ops, self._pending = self._pending, []
+        threshold = max(self.compact_min_bytes, self._snapshot_bytes * self.compact_ratio)
+        if self._journal_bytes > threshold and self._snapshots_queued == self._snapshots_written:
+            # 快照已包含这些修改，不需要再追加日志（快照被其他进程改写时仍追加 ops）
+            self._snapshots_queued += 1
+            return [('snapshot', {'data': self.snapshotData(), 'ops': ops})]
+        return [('append', ops)]
+
+    def writeUnits(self, units):
+        """执行写入：最后一个快照之前的日志都已包含在快照中，可以跳过"""
+        with self.lock:
+            last_snapshot = None
+            for i, (kind, _) in enumerate(units):
+                if kind == 'snapshot':
+                    last_snapshot = i
+            if last_snapshot is not None:
+                if fileStamp(self.path) == self._snapshot_stamp:
+                    self._writeSnapshot(units[last_snapshot][1]['data'])
+                    units = units[last_snapshot + 1:]
+                else:
+                    # 快照被其他进程改写过，不能覆盖：改为追加日志，合并时重新读取
+                    self._snapshots_written = self._snapshots_queued
+            lines = ''.join(json.dumps(op, ensure_ascii=False) + '\n'
+                            for kind, payload in units for op in unitOps(kind, payload))
+            if lines:
+                self._append(lines.encode('utf-8'))
+
+    def _append(self, encoded):
+        size = journalSize(self.journal_path)
+        appendDurable(self.journal_path, encoded)
+        if size == self._journal_seen:
+            # 之前没有其他进程追加的内容，刚写入的修改内存中已经有了
+            self._journal_seen = size + len(encoded)
+        self._journal_bytes = size + len(encoded)
+        self.bytes_written += len(encoded)
+
+    def _writeSnapshot(self, snapshot):
+        with self.lock:
+            # 生成快照之后预留的id记录在日志中，日志删除前要记到快照里
+            snapshot = dict(snapshot, next_id=max(snapshot['next_id'], self._reserved + 1))
+            encoded = json.dumps(snapshot, ensure_ascii=False, indent=2).encode('utf-8')
+            # 其他进程追加、还没合并到内存的日志不在快照中，写完快照后保留下来
+            unseen = journalTail(self.journal_path, self._journal_seen)
+            atomicWrite(self.path, encoded)
+            # 快照已包含日志中的全部修改，日志只保留其他进程追加的部分
+            if unseen:
+                atomicWrite(self.journal_path, unseen)
+            elif os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+                fsyncDir(os.path.dirname(os.path.abspath(self.journal_path)))
+            self._journal_bytes = len(unseen)
+            self._journal_seen = 0
+            self._snapshot_stamp = fileStamp(self.path)
+        self._snapshot_bytes = len(encoded)
+        self._snapshots_written = self._snapshots_queued
+        self.bytes_written += len(encoded)
+        self.compactions += 1
+
+    def compact(self):
+        """同步地把当前数据写成新的快照并清空日志"""
+        self._pending = []
+        self._snapshots_queued += 1
+        self._writeSnapshot(self.snapshotData())
+
+    def startDate(self):
+        return self.data['start_date']
+
+    def tasks(self):
+        return self.data['tasks']
+
+    def task(self, task_id):
+        return self._by_id.get(task_id)
+
+    def nextTaskId(self):
+        # 本次运行中删除的id不会被重新分配
+        return self._max_id + 1
+
+    def isCompleted(self, task_id, date):
+        return self.index.test(task_id, date)
+
+    def note(self, task_id, date):
+        task = self._by_id.get(task_id)
+        if task is None:
+            return ''
+        text = task['notes'].get(date)
+        if text is None:
+            # 数据文件中没有时再查归档（只解压这一天）
+            text = self.archive.get(task_id, date) if ISO_DATE.match(date) else ''
+        return text
+
+    def notesOn(self, date):
+        # 归档中的这一天只解压一次
+        archived = self.archive.notesOn(date) if ISO_DATE.match(date) else {}
+        notes = {}
+        for task in self.data['tasks']:
+            text = task['notes'].get(date, archived.get(task['id'], ''))
+            if text:
+                notes[task['id']] = text
+        return notes
+
+    def completedDatesBetween(self, first, last):
+        return self.index.completedDatesBetween(first, last)
+
+    def tasksCompletedOn(self, date):
+        return [t['name'] for t in self.data['tasks'] if self.index.test(t['id'], date)]
+
+    def completionOrdinals(self):
+        return {task['id']: self.index.ordinals(task['id']) for task in self.data['tasks']}
+
+    def iterNotes(self):
+        for task in self.data['tasks']:
+            for date_str, text in task['notes'].items():
+                if text:
+                    yield task['id'], date_str, text
+        for date_str, task_id, text in self.archive.iterNotes():
+            # 数据文件中也有的以数据文件为准（见 archiveOldNotes）
+            task = self._by_id.get(task_id)
+            if task is not None and date_str not in task['notes']:
+                yield task_id, date_str, text
+
+    def iterHistory(self):
+        """按年份依次生成，同一时间只读取一年的归档"""
+        tasks = self.data['tasks']
+        years = self.index.completedYears() | set(self.archive.years())
+        for task in tasks:
+            years.update(int(d[:4]) for d in task['notes'] if ISO_DATE.match(d))
+        for year in sorted(years):
+            first, last = f'{year:04d}-01-01', f'{year:04d}-12-31'
+            completed = {task['id']: self.index.datesBetween(task['id'], first, last) for task in tasks}
+            notes = {}
+            for date_str, task_notes in self.archive.notesInYear(year).items():
+                for task_id, text in task_notes.items():
+                    notes.setdefault(task_id, {})[date_str] = text
+            for task in tasks:
+                # 数据文件中也有的以数据文件为准
+                recent = {d: text for d, text in task['notes'].items()
+                          if d.startswith(first[:5]) and ISO_DATE.match(d)}
+                if recent:
+                    notes.setdefault(task['id'], {}).update(recent)
+            yield from historyRows(tasks, completed, notes)
+        # 无法解析的日期原样放在最后
+        yield from historyRows(tasks, self._unparsed,
+                               {task['id']: {d: text for d, text in task['notes'].items()
+                                             if not ISO_DATE.match(d)} for task in tasks})
+
+    def exportTask(self, task_id):
+        """归档中的完成情况不导出（删除任务不会删除归档，放回时仍然有效）"""
+        task = self._by_id.get(task_id)
+        if task is None:
+            return None
+        return {'id': task_id, 'name': task['name'], 'days': task.get('days', 0),
+                'completed': self.index.dates(task_id) + self._unparsed.get(task_id, []),
+                'notes': dict(task['notes'])}
+
+    def archivedNotes(self, task_id):
+        """依次解压全部年份的归档（只在放回任务后更新搜索索引时使用）"""
+        return {date_str: text for date_str, archived_id, text in self.archive.iterNotes()
+                if archived_id == task_id}
+
+    def exportData(self):
+        """导出全部数据（包括归档中的完成情况）"""
+        data = json.loads(json.dumps(self.snapshotData()))
+        del data['next_id']
+        tasks = {task['id']: task for task in data['tasks']}
+        for date_str, task_id, text in self.archive.iterNotes():
+            task = tasks.get(task_id)
+            if task is not None and date_str not in task['notes']:
+                task['notes'][date_str] = text
+        for task in data['tasks']:
+            task['notes'] = dict(sorted(task['notes'].items()))
+        return data
+
+    def importData(self, data):
+        self.archive.clear()
+        self._setData(json.loads(json.dumps(data)))
+        self.compact()
+        if self.archive_after_days:
+            self.archiveOldNotes()
+
+    def close(self):
+        super().close()
+        self.archive.close()
+
+
+class SqliteStorage(Storage):
+    """SQLite存储，打卡记录和完成情况按 (任务, 日期) 建索引
+
+    界面只查询需要显示的行，加载时间与历史长度无关。
+
+    每次修改立即提交（WAL 模式下只追加WAL，不刷盘），不长时间占用写锁，
+    其他进程（命令行、无界面的接口）可以随时写入；batch 中的修改在
+    endBatch() 时作为一个事务提交。刷盘的检查点在后台线程执行。
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            days INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS completions (
+            task_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            PRIMARY KEY (task_id, date)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_completions_date ON completions (date);
+        CREATE TABLE IF NOT EXISTS notes (
+            task_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (task_id, date)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_notes_date ON notes (date);
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self._tasks = []
+        self._by_id = {}
+        self._start_date = None
+        self._pending = False
+        self._in_batch = False
+        self._checkpoint_conn = None
+        # 其他连接（其他进程）提交修改后 PRAGMA data_version 会变化
+        self._data_version = None
+
+    def load(self):
+        """打开数据库，只读取任务列表和初始日期"""
+        self.conn = sqlite3.connect(self.path)
+        # WAL + NORMAL：提交只追加WAL不刷盘，刷盘由检查点完成（可在后台线程执行）
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'start_date'").fetchone()
+        if row is None:
+            self._writeAll(defaultData())
+            self.conn.commit()
+        else:
+            self._start_date = row[0]
+            self._reloadTasks()
+        self._data_version = self._dataVersion()
+        return self
+
+    def _dataVersion(self):
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def pollExternal(self):
+        """其他进程提交过修改时重新读取任务列表和初始日期
+
+        打卡和完成情况每次都从数据库查询，不需要合并；SQLite 自己保证写入互斥。
+        """
+        version = self._dataVersion()
+        if version == self._data_version:
+            return False, []
+        self._data_version = version
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'start_date'").fetchone()
+        if row is not None:
+            self._start_date = row[0]
+        self._reloadTasks()
+        return True, []
+
+    def _reloadTasks(self):
+        rows = self.conn.execute('SELECT id, name, days FROM tasks ORDER BY position, id')
+        self._tasks = [{'id': r[0], 'name': r[1], 'days': r[2]} for r in rows]
+        self._by_id = {task['id']: task for task in self._tasks}
+
+    def _writeAll(self, data):
+        """清空数据库并写入完整数据（不提交）"""
+        data = normalizeData(data)
+        cur = self.conn.cursor()
+        for table in ('meta', 'tasks', 'completions', 'notes'):
+            cur.execute(f'DELETE FROM {table}')
+        cur.execute("INSERT INTO meta (key, value) VALUES ('start_date', ?)", (data['start_date'],))
+        # 删除的任务id不再分配，和 JsonStorage 快照中的 next_id 一样记下最大值
+        next_id = data.get('next_id')
+        if not isinstance(next_id, int):
+            next_id = 1
+        next_id = max([next_id] + [task['id'] + 1 for task in data['tasks']])
+        cur.execute("INSERT INTO meta (key, value) VALUES ('next_id', ?)", (next_id,))
+        for position, task in enumerate(data['tasks']):
+            cur.execute('INSERT INTO tasks (id, name, position, days) VALUES (?, ?, ?, ?)',
+                        (task['id'], task['name'], position, task.get('days', 0)))
+            cur.executemany('INSERT OR IGNORE INTO completions (task_id, date) VALUES (?, ?)',
+                            [(task['id'], d) for d in task['completed']])
+            cur.executemany('INSERT OR REPLACE INTO notes (task_id, date, text) VALUES (?, ?, ?)',
+                            [(task['id'], d, t) for d, t in task['notes'].items()])
+        self._start_date = data['start_date']
+        self._reloadTasks()
+
+    def apply(self, op):
+        """执行修改并提交（batch 中等到 endBatch() 再提交）"""
+        kind = op['op']
+        cur = self.conn.cursor()
+        if kind == 'start':
+            cur.execute("UPDATE meta SET value = ? WHERE key = 'start_date'", (op['date'],))
+            self._start_date = op['date']
+        elif kind in ('add', 'restore'):
+            index = op.get('index')
+            if index is not None and index < len(self._tasks) and op['task'] not in self._by_id:
+                # 放回原来的位置：后面的任务依次后移
+                position = cur.execute('SELECT position FROM tasks WHERE id = ?',
+                                       (self._tasks[index]['id'],)).fetchone()[0]
+                cur.execute('UPDATE tasks SET position = position + 1 WHERE position >= ?', (position,))
+                cur.execute('INSERT OR IGNORE INTO tasks (id, name, position) VALUES (?, ?, ?)',
+                            (op['task'], op['name'], position))
+            else:
+                cur.execute('INSERT OR IGNORE INTO tasks (id, name, position) '
+                            'VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM tasks))',
+                            (op['task'], op['name']))
+            if cur.rowcount and op['task'] not in self._by_id:
+                task = {'id': op['task'], 'name': op['name'], 'days': 0}
+                self._tasks.insert(len(self._tasks) if index is None else index, task)
+                self._by_id[task['id']] = task
+            cur.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('next_id', 1)")
+            cur.execute("UPDATE meta SET value = MAX(CAST(value AS INTEGER), ?) WHERE key = 'next_id'",
+                        (op['task'] + 1,))
+            if kind == 'restore':
+                cur.executemany('INSERT OR IGNORE INTO completions (task_id, date) VALUES (?, ?)',
+                                [(op['task'], d) for d in op['completed']])
+                cur.executemany('INSERT OR REPLACE INTO notes (task_id, date, text) VALUES (?, ?, ?)',
+                                [(op['task'], d, t) for d, t in op['notes'].items()])
+        elif kind == 'delete':
+            for table, column in (('tasks', 'id'), ('completions', 'task_id'), ('notes', 'task_id')):
+                cur.execute(f'DELETE FROM {table} WHERE {column} = ?', (op['task'],))
+            task = self._by_id.pop(op['task'], None)
+            if task is not None:
+                self._tasks.remove(task)
+        elif kind == 'rename':
+            cur.execute('UPDATE tasks SET name = ? WHERE id = ?', (op['name'], op['task']))
+            if op['task'] in self._by_id:
+                self._by_id[op['task']]['name'] = op['name']
+        elif kind == 'check':
+            cur.execute('INSERT OR IGNORE INTO completions (task_id, date) VALUES (?, ?)',
+                        (op['task'], op['date']))
+        elif kind == 'uncheck':
+            cur.execute('DELETE FROM completions WHERE task_id = ? AND date = ?',
+                        (op['task'], op['date']))
+        elif kind == 'note':
+            cur.execute('INSERT OR REPLACE INTO notes (task_id, date, text) VALUES (?, ?, ?)',
+                        (op['task'], op['date'], op['text']))
+        else:
+            raise ValueError(f'未知的操作类型: {kind}')
+        if not self._in_batch:
+            self.conn.commit()
+        self._pending = True
+
+    def beginBatch(self):
+        self._in_batch = True
+
+    def endBatch(self):
+        """批量修改作为一个事务提交"""
+        self._in_batch = False
+        self.conn.commit()
+
+    def hasPending(self):
+        return self._pending
+
+    def takeWrites(self):
+        """修改已经提交，只需要把刷盘的检查点交给 writeUnits"""
+        if not self._pending:
+            return []
+        self.conn.commit()
+        self._pending = False
+        return [('checkpoint', None)]
+
+    def writeUnits(self, units):
+        """执行WAL检查点并刷盘，使用单独的连接，不阻塞主线程的读写"""
+        if self._checkpoint_conn is None:
+            self._checkpoint_conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._checkpoint_conn.execute('PRAGMA synchronous=FULL')
+        self._checkpoint_conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+    def close(self):
+        if self.conn is not None:
+            self.flush()
+            self.conn.close()
+            self.conn = None
+        if self._checkpoint_conn is not None:
+            self._checkpoint_conn.close()
+            self._checkpoint_conn = None
+
+    def startDate(self):
+        return self._start_date
+
+    def tasks(self):
+        return self._tasks
+
+    def task(self, task_id):
+        return self._by_id.get(task_id)
+
+    def nextTaskId(self):
+        # 旧版本的数据库没有 next_id，只能从现有的任务推算
+        return self.conn.execute(
+            "SELECT MAX(COALESCE((SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'next_id'), 1), "
+            "(SELECT COALESCE(MAX(id), 0) + 1 FROM tasks))").fetchone()[0]
+
+    def reserveTaskId(self):
+        """在写事务中读取并增加 next_id，其他进程的分配由 SQLite 的写锁互斥"""
+        cur = self.conn.cursor()
+        cur.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('next_id', 1)")
+        cur.execute("UPDATE meta SET value = MAX(CAST(value AS INTEGER), "
+                    "(SELECT COALESCE(MAX(id), 0) + 1 FROM tasks)) + 1 WHERE key = 'next_id'")
+        task_id = cur.execute("SELECT CAST(value AS INTEGER) - 1 FROM meta WHERE key = 'next_id'").fetchone()[0]
+        if not self._in_batch:
+            self.conn.commit()
+        return task_id
+
+    def isCompleted(self, task_id, date):
+        row = self.conn.execute('SELECT 1 FROM completions WHERE task_id = ? AND date = ?',
+                                (task_id, date)).fetchone()
+        return row is not None
+
+    def note(self, task_id, date):
+        row = self.conn.execute('SELECT text FROM notes WHERE task_id = ? AND date = ?',
+                                (task_id, date)).fetchone()
+        return row[0] if row else ''
+
+    def completedDatesBetween(self, first, last):
+        rows = self.conn.execute('SELECT DISTINCT date FROM completions WHERE date BETWEEN ? AND ?',
+                                 (first, last))
+        return {r[0] for r in rows}
+
+    def tasksCompletedOn(self, date):
+        rows = self.conn.execute('SELECT t.name FROM completions c JOIN tasks t ON t.id = c.task_id '
+                                 'WHERE c.date = ? ORDER BY t.position, t.id', (date,))
+        return [r[0] for r in rows]
+
+    def completionOrdinals(self):
+        result = {task['id']: [] for task in self._tasks}
+        rows = self.conn.execute('SELECT task_id, date FROM completions ORDER BY task_id, date')
+        for task_id, date_str in rows:
+            if task_id in result:
+                try:
+                    result[task_id].append(date.fromisoformat(date_str).toordinal())
+                except ValueError:
+                    continue
+        return result
+
+    def iterNotes(self):
+        rows = self.conn.execute("SELECT n.task_id, n.date, n.text FROM notes n "
+                                 "JOIN tasks t ON t.id = n.task_id WHERE n.text != ''")
+        yield from rows
+
+    def iterHistory(self):
+        """由数据库排序后逐行读取"""
+        rows = self.conn.execute('''
+            SELECT h.task_id, h.date, MAX(h.done), MAX(h.text) FROM (
+                SELECT task_id, date, 1 AS done, '' AS text FROM completions
+                UNION ALL
+                SELECT task_id, date, 0, text FROM notes WHERE text != ''
+            ) h JOIN tasks t ON t.id = h.task_id
+            GROUP BY h.task_id, h.date
+            ORDER BY h.date, t.position, t.id
+        ''')
+        for task_id, date_str, done, text in rows:
+            yield task_id, date_str, bool(done), text
+
+    def exportTask(self, task_id):
+        task = self._by_id.get(task_id)
+        if task is None:
+            return None
+        completed = [r[0] for r in self.conn.execute(
+            'SELECT date FROM completions WHERE task_id = ? ORDER BY date', (task_id,))]
+        notes = {r[0]: r[1] for r in self.conn.execute(
+            'SELECT date, text FROM notes WHERE task_id = ? ORDER BY date', (task_id,))}
+        return {'id': task_id, 'name': task['name'], 'days': task['days'],
+                'completed': completed, 'notes': notes}
+
+    def exportData(self):
+        return {'start_date': self._start_date, 'tasks': [self.exportTask(task['id']) for task in self._tasks]}
+
+    def importData(self, data):
+        self._writeAll(json.loads(json.dumps(data)))
+        self.conn.commit()
+        self._pending = False
+
+
+def sqlitePathFor(json_path):
+    """与JSON数据文件对应的SQLite数据库路径"""
+    return os.path.splitext(json_path)[0] + '.db'
+
+
+def journalPathFor(json_path):
+    """JSON数据文件的修改日志路径"""
+    return os.path.splitext(json_path)[0] + '.journal.jsonl'
+
+
+def lockPathFor(json_path):
+    """多个进程写入同一份JSON数据时加锁用的文件"""
+    return os.path.splitext(json_path)[0] + '.lock'
+
+
+def dataFilesFor(json_path):
+    """与JSON数据文件对应的全部存储文件（不管使用哪种后端），用于判断数据是否变化"""
+    from sharded_storage import shardsPathFor
+
+    db_path = sqlitePathFor(json_path)
+    paths = [json_path, journalPathFor(json_path), db_path, db_path + '-wal']
+    for directory in (shardsPathFor(json_path), archivePathFor(json_path)):
+        if os.path.isdir(directory):
+            paths.extend(os.path.join(directory, name) for name in sorted(os.listdir(directory)))
+    return paths
+
+
+def openStorage(json_path):
+    """打开存储：已迁移到SQLite时使用数据库，已迁移到按年分片时使用分片目录，
+    否则使用JSON文件"""
+    from sharded_storage import ShardedStorage, shardsPathFor
+
+    db_path = sqlitePathFor(json_path)
+    shards_path = shardsPathFor(json_path)
+    if os.path.exists(db_path):
+        storage = SqliteStorage(db_path)
+    elif os.path.isdir(shards_path):
+        storage = ShardedStorage(shards_path)
+    else:
+        storage = JsonStorage(json_path)
+    storage.load()
+    return storage
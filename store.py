@@ -0,0 +1,495 @@
+from contextlib import contextmanager
+from datetime import date, datetime
+from analytics import CompletionMatrix, available as analyticsAvailable
+from search_index import SearchIndex, fileSignature, matches, readSignature, searchPathFor
+from sharded_storage import ShardedStorage, shardsPathFor
+from storage import DATE_FORMAT, JsonStorage, SqliteStorage, dataFilesFor, openStorage, sqlitePathFor
+from task_stats import StatsIndex
+from undo_log import UndoLog
+
+
+class ClockInStore:
+    """打卡数据的无界面接口
+
+    天数计算、打卡、完成情况、日历查询和持久化都在这里完成，不依赖 PyQt，
+    界面和性能测试都通过它读写数据。修改只进入内存，flush() 或
+    takeWrites()/writeUnits() 负责写入磁盘。
+    """
+
+    def __init__(self, data_file='clock_in_data.json'):
+        self.data_file = data_file
+        self.storage = None
+        # 打卡统计，buildStats() 之后随修改增量更新
+        self.stats = None
+        # 统计分析用的完成矩阵，第一次打开统计分析时建立
+        self.matrix = None
+        # 完成情况的搜索索引：保存的索引仍然有效时读取，否则第一次搜索时重建
+        self.search_path = searchPathFor(data_file)
+        self.search = None
+        self._search_current = False
+        # batch() 的嵌套层数
+        self._batch_depth = 0
+        # 撤销/重做，只记录界面上的修改；执行撤销时不记录
+        self.undo_log = UndoLog()
+        self._replaying = False
+        # externalChanges() 的嵌套层数，以及期间是否修改了数据
+        self._external_depth = 0
+        self._external_changed = False
+
+    @classmethod
+    def open(cls, data_file='clock_in_data.json'):
+        store = cls(data_file)
+        store.load()
+        return store
+
+    def load(self):
+        """读取数据（已迁移到SQLite时打开数据库）"""
+        # 在打开存储之前比较签名：加载时的归档等整理不改变内容
+        signature = fileSignature(dataFilesFor(self.data_file))
+        self._search_current = signature == readSignature(self.search_path)
+        self.storage = openStorage(self.data_file)
+        self.stats = None
+        self.matrix = None
+        self.search = None
+        self.undo_log.clear()
+        return self
+
+    def close(self):
+        if self.storage is not None:
+            self.storage.close()
+            self.storage = None
+            if self.search is not None:
+                # 数据文件全部写完之后再记录签名
+                self.search.save(self.search_path, fileSignature(dataFilesFor(self.data_file)))
+
+    def usesSqlite(self):
+        return isinstance(self.storage, SqliteStorage)
+
+    def usesJson(self):
+        """是否仍在使用单个JSON文件"""
+        return isinstance(self.storage, JsonStorage)
+
+    # 查询
+
+    def startDate(self):
+        return self.storage.startDate()
+
+    def daysPassed(self, today=None):
+        """今天是打卡的第几天（初始日期当天为第1天）"""
+        today = today or datetime.now().strftime(DATE_FORMAT)
+        start_date = datetime.strptime(self.startDate(), DATE_FORMAT)
+        return (datetime.strptime(today, DATE_FORMAT) - start_date).days + 1
+
+    def tasks(self):
+        return self.storage.tasks()
+
+    def task(self, task_id):
+        return self.storage.task(task_id)
+
+    def isCompleted(self, task_id, date):
+        return self.storage.isCompleted(task_id, date)
+
+    def note(self, task_id, date):
+        return self.storage.note(task_id, date)
+
+    def notesOn(self, date):
+        """某天全部非空的完成情况 {任务id: 内容}"""
+        return self.storage.notesOn(date)
+
+    def iterHistory(self):
+        """按日期顺序逐条返回 (任务id, 日期, 是否完成, 完成情况)"""
+        return self.storage.iterHistory()
+
+    def completedDatesBetween(self, first, last):
+        """日历高亮：[first, last] 内至少完成一个任务的日期"""
+        return self.storage.completedDatesBetween(first, last)
+
+    def isDateCompleted(self, date):
+        return bool(self.storage.completedDatesBetween(date, date))
+
+    def tasksCompletedOn(self, date):
+        return self.storage.tasksCompletedOn(date)
+
+    def buildStats(self):
+        """读取全部打卡记录建立统计（只需要一次，之后增量更新）"""
+        self.stats = StatsIndex(self.storage.completionOrdinals(), self.startDate())
+        return self.stats
+
+    def taskStats(self, task_id, today=None):
+        """任务的连续天数、最长连续天数、累计次数和完成率，统计未建立时返回 None"""
+        if self.stats is None:
+            return None
+        self.stats.setToday((date.fromisoformat(today) if today else date.today()).toordinal())
+        stats = self.stats.get(task_id)
+        return stats.summary() if stats is not None else None
+
+    def completionMatrix(self, today=None):
+        """任务 × 日期的完成矩阵（需要 numpy，没有安装时返回 None）
+
+        第一次调用时读取全部打卡记录建立，之后随打卡原地更新。
+        """
+        if not analyticsAvailable():
+            return None
+        today = (date.fromisoformat(today) if today else date.today()).toordinal()
+        if self.matrix is None:
+            self.matrix = CompletionMatrix(self.storage.completionOrdinals(), self.startDate(), today)
+        else:
+            self.matrix.setToday(today)
+        return self.matrix
+
+    def loadSearchIndex(self):
+        """读取保存的搜索索引（数据在索引保存之后改动过时返回 None，不重建）"""
+        if self.search is None and self._search_current:
+            self._search_current = False
+            try:
+                self.search = SearchIndex.load(self.search_path)
+            except (OSError, ValueError, KeyError):
+                self.search = None
+        return self.search
+
+    def searchNotes(self, query, limit=100):
+        """搜索完成情况，返回 (按日期从新到旧的 [{task_id, name, date, text}], 匹配总数)
+
+        第一次搜索时没有可用的索引就读取全部完成情况建立。
+        匹配总数由索引给出，可能略多于实际（只检查返回的结果）。
+        """
+        if self.loadSearchIndex() is None:
+            self.search = SearchIndex.build(self.storage.iterNotes())
+        hits, total = self.search.search(query, limit)
+        results = []
+        for task_id, date_str in hits:
+            task = self.storage.task(task_id)
+            text = self.storage.note(task_id, date_str)
+            if task is not None and matches(query, text):
+                results.append({'task_id': task_id, 'name': task['name'], 'date': date_str, 'text': text})
+        return results, total
+
+    # 修改
+
+    def setCompleted(self, task_id, date, done):
+        if not self._replaying and self.storage.isCompleted(task_id, date) != done:
+            self._record(('done', task_id, date, done))
+        self.storage.apply({'op': 'check' if done else 'uncheck', 'task': task_id, 'date': date})
+        if self.stats is not None:
+            self.stats.toggle(task_id, date, done)
+        if self.matrix is not None:
+            self.matrix.set(task_id, date, done)
+
+    def setCompletedRange(self, task_ids, first, last, done):
+        """把 first 到 last（包含）之间这些任务的打卡全部设为 done（补打卡 / 批量取消）
+
+        在一个 batch() 中执行，只修改状态不同的格子，最后只写入一次。
+        返回状态有变化的日期列表（按日期排序），日期格式不正确时抛出 ValueError。
+        """
+        first_day, last_day = date.fromisoformat(first), date.fromisoformat(last)
+        if first_day > last_day:
+            first_day, last_day = last_day, first_day
+        dates = [date.fromordinal(o).isoformat() for o in range(first_day.toordinal(), last_day.toordinal() + 1)]
+        changed = set()
+        with self.batch():
+            for task_id in task_ids:
+                if self.storage.task(task_id) is None:
+                    continue
+                for date_str in dates:
+                    if self.storage.isCompleted(task_id, date_str) != done:
+                        self.setCompleted(task_id, date_str, done)
+                        changed.add(date_str)
+        return sorted(changed)
+
+    def setNote(self, task_id, date, text):
+        if self._batch_depth and not self._replaying:
+            # 批量导入时不逐条更新搜索索引（需要读取旧内容），下次搜索时重建
+            self.search = None
+            self._search_current = False
+        search = self.loadSearchIndex()
+        old_text = self.storage.note(task_id, date)
+        if not self._replaying and old_text != text:
+            self._record(('note', task_id, date, old_text, text))
+        self.storage.apply({'op': 'note', 'task': task_id, 'date': date, 'text': text})
+        if search is not None:
+            search.update(task_id, date, old_text, text)
+
+    def addTask(self, name):
+        """添加任务，返回新任务的id"""
+        # 其他进程可能同时在添加任务，id 在存储的锁内分配
+        task_id = self.storage.reserveTaskId()
+        self.storage.apply({'op': 'add', 'task': task_id, 'name': name})
+        if not self._replaying:
+            self._record(('add', task_id, name))
+        if self.stats is not None:
+            self.stats.addTask(task_id)
+        if self.matrix is not None:
+            self.matrix.addTask(task_id)
+        return task_id
+
+    def deleteTask(self, task_id):
+        if self._external_depth:
+            self._external_changed = True
+        elif not self._replaying:
+            # 撤销时需要放回任务的全部记录和原来的位置
+            task = self.storage.exportTask(task_id)
+            if task is not None:
+                index = [t['id'] for t in self.storage.tasks()].index(task_id)
+                self.undo_log.record(('delete', task, index))
+        self.storage.apply({'op': 'delete', 'task': task_id})
+        if self.stats is not None:
+            self.stats.removeTask(task_id)
+        if self.matrix is not None:
+            self.matrix.removeTask(task_id)
+        if self.loadSearchIndex() is not None:
+            self.search.removeTask(task_id)
+
+    def renameTask(self, task_id, name):
+        task = self.storage.task(task_id)
+        if not self._replaying and task is not None and task['name'] != name:
+            self._record(('rename', task_id, task['name'], name))
+        self.storage.apply({'op': 'rename', 'task': task_id, 'name': name})
+
+    def setStartDate(self, date_str):
+        """修改初始日期，格式不正确时抛出 ValueError"""
+        datetime.strptime(date_str, DATE_FORMAT)
+        old_date = self.startDate()
+        if not self._replaying and old_date != date_str:
+            self._record(('start', old_date, date_str))
+        self.storage.apply({'op': 'start', 'date': date_str})
+        if self.stats is not None:
+            self.stats.setStart(date_str)
+        if self.matrix is not None:
+            self.matrix.setStart(date_str)
+
+    def _restoreTask(self, task, index=None):
+        """放回删除的任务（exportTask() 的格式）和它的全部记录，只增量更新这一个任务"""
+        self.storage.apply({'op': 'restore', 'task': task['id'], 'name': task['name'], 'index': index,
+                            'completed': task['completed'], 'notes': task['notes']})
+        if self.stats is not None or self.matrix is not None:
+            ordinals = set()
+            for date_str in task['completed']:
+                try:
+                    ordinals.add(date.fromisoformat(date_str).toordinal())
+                except (TypeError, ValueError):
+                    continue
+            ordinals = sorted(ordinals)
+            if self.stats is not None:
+                self.stats.addTask(task['id'], ordinals)
+            if self.matrix is not None:
+                self.matrix.addTask(task['id'], ordinals)
+        if self.loadSearchIndex() is not None:
+            notes = dict(self.storage.archivedNotes(task['id']), **task['notes'])
+            for date_str, text in notes.items():
+                if text:
+                    self.search.update(task['id'], date_str, '', text)
+
+    # 撤销和重做
+
+    def _record(self, delta):
+        if self._external_depth:
+            self._external_changed = True
+        else:
+            self.undo_log.record(delta)
+
+    @contextmanager
+    def externalChanges(self):
+        """HTTP接口、转发的命令行等不是在界面上做的修改：不记录撤销
+
+        期间修改了数据时清空撤销记录（和合并其他进程的修改一样），
+        否则撤销之前的命令可能覆盖这些修改。
+        """
+        if self._external_depth == 0:
+            self._external_changed = False
+        self._external_depth += 1
+        try:
+            yield self
+        finally:
+            self._external_depth -= 1
+            if self._external_depth == 0 and self._external_changed:
+                self.undo_log.clear()
+
+    def canUndo(self):
+        return self.undo_log.canUndo()
+
+    def canRedo(self):
+        return self.undo_log.canRedo()
+
+    def undo(self):
+        """撤销最近的一条命令，返回执行的修改列表（格式同 pollExternalChanges()），没有可撤销的返回 []"""
+        deltas = self.undo_log.popUndo()
+        if deltas is None:
+            return []
+        ops = self._replay(reversed(deltas), undo=True)
+        self.undo_log.pushRedo(deltas)
+        return ops
+
+    def redo(self):
+        """重做最近撤销的命令，返回执行的修改列表"""
+        deltas = self.undo_log.popRedo()
+        if deltas is None:
+            return []
+        ops = self._replay(deltas, undo=False)
+        self.undo_log.pushUndo(deltas)
+        return ops
+
+    def _replay(self, deltas, undo):
+        ops = []
+        self._replaying = True
+        try:
+            with self.batch():
+                for delta in deltas:
+                    kind = delta[0]
+                    if kind == 'done':
+                        _, task_id, date_str, done = delta
+                        done = done != undo
+                        self.setCompleted(task_id, date_str, done)
+                        ops.append({'op': 'check' if done else 'uncheck', 'task': task_id, 'date': date_str})
+                    elif kind == 'note':
+                        _, task_id, date_str, old_text, new_text = delta
+                        self.setNote(task_id, date_str, old_text if undo else new_text)
+                        ops.append({'op': 'note', 'task': task_id, 'date': date_str})
+                    elif kind == 'rename':
+                        _, task_id, old_name, new_name = delta
+                        self.renameTask(task_id, old_name if undo else new_name)
+                        ops.append({'op': 'rename', 'task': task_id})
+                    elif kind == 'start':
+                        self.setStartDate(delta[1] if undo else delta[2])
+                        ops.append({'op': 'start'})
+                    elif kind == 'add':
+                        _, task_id, name = delta
+                        if undo:
+                            self.deleteTask(task_id)
+                            ops.append({'op': 'delete', 'task': task_id})
+                        else:
+                            self._restoreTask({'id': task_id, 'name': name, 'completed': [], 'notes': {}})
+                            ops.append({'op': 'restore', 'task': task_id})
+                    elif kind == 'delete':
+                        _, task, index = delta
+                        if undo:
+                            self._restoreTask(task, index)
+                            ops.append({'op': 'restore', 'task': task['id']})
+                        else:
+                            self.deleteTask(task['id'])
+                            ops.append({'op': 'delete', 'task': task['id']})
+        finally:
+            self._replaying = False
+        return ops
+
+    def pollExternalChanges(self):
+        """合并其他进程对数据文件的修改，返回 (是否重新读取了全部数据, 合并的修改列表)
+
+        返回的修改已展开 batch。增量合并时统计和完成矩阵按涉及的 (任务, 日期)
+        与存储对齐；重新读取全部数据时和导入一样，统计、完成矩阵和搜索索引
+        在下次使用时重建。只能在没有排队中的后台写入时调用。
+        """
+        reloaded, ops = self.storage.pollExternal()
+        if reloaded:
+            self.stats = None
+            self.matrix = None
+            self.search = None
+            self._search_current = False
+            self.undo_log.clear()
+            return True, []
+        flat = []
+        stack = list(reversed(ops))
+        while stack:
+            op = stack.pop()
+            if op['op'] == 'batch':
+                stack.extend(reversed(op['ops']))
+            else:
+                flat.append(op)
+        for op in flat:
+            self._syncDerived(op)
+        return False, flat
+
+    def _syncDerived(self, op):
+        """其他进程的一条修改合并后，让统计、完成矩阵和搜索索引与存储一致"""
+        kind = op['op']
+        if kind == 'start':
+            if self.stats is not None:
+                self.stats.setStart(self.startDate())
+            if self.matrix is not None:
+                self.matrix.setStart(self.startDate())
+        elif kind in ('add', 'delete'):
+            exists = self.storage.task(op['task']) is not None
+            for derived in (self.stats, self.matrix):
+                if derived is None:
+                    continue
+                if exists:
+                    derived.addTask(op['task'])
+                else:
+                    derived.removeTask(op['task'])
+            if not exists and self.search is not None:
+                self.search.removeTask(op['task'])
+        elif kind in ('check', 'uncheck'):
+            done = self.storage.isCompleted(op['task'], op['date'])
+            if self.stats is not None:
+                self.stats.toggle(op['task'], op['date'], done)
+            if self.matrix is not None:
+                self.matrix.set(op['task'], op['date'], done)
+        elif kind == 'note':
+            # 不知道合并前的内容，无法增量更新搜索索引，下次搜索时重建
+            self.search = None
+            self._search_current = False
+
+    # 持久化
+
+    @contextmanager
+    def batch(self):
+        """批量修改（导入、补打卡）：期间不写入磁盘，结束后合并成一次写入
+
+        SQLite 中是一个事务，JSON 和分片存储中是一条日志，崩溃时要么全部生效
+        要么全部丢失。中途出错时已执行的修改保留，同样合并写入。
+        """
+        if self._batch_depth == 0:
+            self.storage.beginBatch()
+        self._batch_depth += 1
+        # 一次批量修改撤销时作为一条命令
+        self.undo_log.begin()
+        try:
+            yield self
+        finally:
+            self.undo_log.end()
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.storage.endBatch()
+
+    def hasPending(self):
+        return self.storage.hasPending()
+
+    def takeWrites(self):
+        if self._batch_depth:
+            return []
+        return self.storage.takeWrites()
+
+    def writeUnits(self, units):
+        self.storage.writeUnits(units)
+
+    def flush(self):
+        if not self._batch_depth:
+            self.storage.flush()
+
+    def exportData(self):
+        return self.storage.exportData()
+
+    def importData(self, data):
+        self.storage.importData(data)
+        self.stats = None
+        self.matrix = None
+        self.search = None
+        self._search_current = False
+        self.undo_log.clear()
+
+    def migrateToSqlite(self):
+        """把当前数据迁移到SQLite数据库，之后打开时自动使用数据库"""
+        return self._migrate(SqliteStorage(sqlitePathFor(self.data_file)))
+
+    def migrateToShards(self):
+        """把当前数据按年份拆分到分片目录，之后打开时自动使用分片存储"""
+        return self._migrate(ShardedStorage(shardsPathFor(self.data_file)))
+
+    def _migrate(self, storage):
+        data = self.storage.exportData()
+        # 已删除任务的id在新的存储中同样不再分配
+        data['next_id'] = self.storage.nextTaskId()
+        storage.load()
+        storage.importData(data)
+        self.storage.close()
+        self.storage = storage
+        return storage.path
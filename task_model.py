@@ -0,0 +1,353 @@
+from datetime import datetime
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle, QTextEdit
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QEvent, pyqtSignal
+from PyQt5.QtGui import QColor, QFont, QPen, QPainterPath, QFontMetrics
+from theme import EYE_CARE
+
+
+def formatStats(stats):
+    """任务行中显示的统计文字"""
+    rates = ' · '.join(f'{w}天 {r:.0%}' for w, r in stats['rates'].items())
+    return (f"连续 {stats['current']} 天 · 最长 {stats['longest']} 天 · "
+            f"共 {stats['total']} 次 · {rates}")
+
+
+class NotesEdit(QTextEdit):
+    """完成情况编辑框，失去焦点时发出信号"""
+    focusLost = pyqtSignal()
+
+    def focusOutEvent(self, event):
+        super().focusOutEvent(event)
+        self.focusLost.emit()
+
+
+class TaskListModel(QAbstractListModel):
+    """今日任务列表的数据模型，直接读取存储，不为每行创建控件"""
+
+    TaskIdRole = Qt.UserRole + 1
+    DaysRole = Qt.UserRole + 2
+    NotesRole = Qt.UserRole + 3
+    StatsRole = Qt.UserRole + 4
+
+    # 界面上的修改交给主窗口写入存储
+    completionToggled = pyqtSignal(int, str, bool)
+    notesEdited = pyqtSignal(int, str, str)
+
+    def __init__(self, storage, parent=None):
+        super().__init__(parent)
+        self.storage = storage
+        self.today = datetime.now().strftime('%Y-%m-%d')
+        self.days_passed = 0
+        self._tasks = []
+        self._rows = {}
+
+    def setStorage(self, storage):
+        self.storage = storage
+        self.reload()
+
+    def reload(self):
+        """重新读取全部任务"""
+        self.beginResetModel()
+        self.today = datetime.now().strftime('%Y-%m-%d')
+        self._computeDays()
+        self._tasks = list(self.storage.tasks())
+        self._rows = {task['id']: row for row, task in enumerate(self._tasks)}
+        self.endResetModel()
+
+    def appendTask(self, task_id):
+        """在末尾插入一行"""
+        task = self.storage.task(task_id)
+        if task is None or task_id in self._rows:
+            return
+        row = len(self._tasks)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._tasks.append(task)
+        self._rows[task_id] = row
+        self.endInsertRows()
+
+    def insertTask(self, task_id):
+        """在任务列表中的原位置插入一行（撤销删除任务）"""
+        if task_id in self._rows:
+            return
+        ids = [task['id'] for task in self.storage.tasks()]
+        if task_id not in ids:
+            return
+        # 按存储中的顺序，插在它前面最近的一个已显示任务之后
+        row = 0
+        for previous in reversed(ids[:ids.index(task_id)]):
+            if previous in self._rows:
+                row = self._rows[previous] + 1
+                break
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._tasks.insert(row, self.storage.task(task_id))
+        for later in range(row, len(self._tasks)):
+            self._rows[self._tasks[later]['id']] = later
+        self.endInsertRows()
+
+    def removeTask(self, task_id):
+        """删除一行，其他行（包括正在编辑的行）保持不变"""
+        row = self._rows.get(task_id)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._tasks[row]
+        del self._rows[task_id]
+        for later in range(row, len(self._tasks)):
+            self._rows[self._tasks[later]['id']] = later
+        self.endRemoveRows()
+
+    def updateTask(self, task_id):
+        """任务名或状态变化后只刷新这一行"""
+        row = self._rows.get(task_id)
+        if row is None:
+            return
+        task = self.storage.task(task_id)
+        if task is not None:
+            self._tasks[row] = task
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def refreshDays(self):
+        """初始日期变化后只刷新天数"""
+        self._computeDays()
+        if self._tasks:
+            self.dataChanged.emit(self.index(0), self.index(len(self._tasks) - 1), [self.DaysRole])
+
+    def refreshStats(self):
+        """统计建立后刷新所有行"""
+        if self._tasks:
+            self.dataChanged.emit(self.index(0), self.index(len(self._tasks) - 1), [self.StatsRole])
+
+    def refreshLayout(self):
+        """字体变化后重新计算行高"""
+        self.layoutAboutToBeChanged.emit()
+        self.layoutChanged.emit()
+
+    def rowOf(self, task_id):
+        return self._rows.get(task_id)
+
+    def _computeDays(self):
+        start_date = datetime.strptime(self.storage.startDate(), '%Y-%m-%d')
+        today_date = datetime.strptime(self.today, '%Y-%m-%d')
+        self.days_passed = (today_date - start_date).days + 1
+
+    def taskAt(self, row):
+        return self._tasks[row]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._tasks)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._tasks):
+            return None
+        task = self._tasks[index.row()]
+        if role == Qt.DisplayRole:
+            return task['name']
+        if role == Qt.CheckStateRole:
+            done = self.storage.isCompleted(task['id'], self.today)
+            return Qt.Checked if done else Qt.Unchecked
+        if role == self.TaskIdRole:
+            return task['id']
+        if role == self.DaysRole:
+            return self.days_passed
+        if role == self.NotesRole:
+            return self.storage.note(task['id'], self.today)
+        if role == self.StatsRole:
+            return self.storage.taskStats(task['id'], self.today)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+        task = self._tasks[index.row()]
+        if role == Qt.CheckStateRole:
+            self.completionToggled.emit(task['id'], self.today, value == Qt.Checked)
+            self.dataChanged.emit(index, index, [role, self.StatsRole])
+            return True
+        elif role in (Qt.EditRole, self.NotesRole):
+            if value == self.storage.note(task['id'], self.today):
+                return True
+            self.notesEdited.emit(task['id'], self.today, value)
+        else:
+            return False
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsEditable | Qt.ItemIsUserCheckable
+
+
+class TaskItemDelegate(QStyledItemDelegate):
+    """绘制任务行：复选框、任务名、天数和完成情况预览
+
+    只有正在编辑的那一行会创建真正的完成情况编辑框。
+    """
+
+    MARGIN = 5
+    SPACING = 10
+
+    # 通知主窗口编辑已结束，可以立即写入
+    editingFinished = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.font_size = 16
+        self.colors = EYE_CARE
+
+    def setFontSize(self, font_size):
+        self.font_size = font_size
+
+    def setColors(self, colors):
+        self.colors = colors
+
+    def _color(self, name):
+        return QColor(self.colors[name])
+
+    def _fonts(self):
+        name_font = QFont('Microsoft YaHei')
+        name_font.setPixelSize(self.font_size)
+        days_font = QFont(name_font)
+        days_font.setBold(True)
+        notes_font = QFont('Microsoft YaHei')
+        notes_font.setPixelSize(max(10, self.font_size - 2))
+        return name_font, days_font, notes_font
+
+    def _statsFont(self):
+        stats_font = QFont('Microsoft YaHei')
+        stats_font.setPixelSize(max(9, self.font_size - 5))
+        return stats_font
+
+    def _layout(self, rect):
+        """计算复选框、文字和完成情况框的位置"""
+        inner = rect.adjusted(self.MARGIN, self.MARGIN, -self.MARGIN, -self.MARGIN)
+        box = self.font_size + 6
+        check_rect = QRect(inner.left() + self.MARGIN, inner.center().y() - box // 2, box, box)
+        notes_width = max(250, inner.width() * 9 // 20)
+        notes_rect = QRect(inner.right() - notes_width + 1, inner.top(), notes_width, inner.height())
+        text_left = check_rect.right() + self.SPACING
+        text_rect = QRect(text_left, inner.top(), notes_rect.left() - self.SPACING - text_left, inner.height())
+        return check_rect, text_rect, notes_rect
+
+    def sizeHint(self, option, index):
+        _, _, notes_font = self._fonts()
+        notes_height = min(80, QFontMetrics(notes_font).lineSpacing() * 3 + 14)
+        # 任务名下面留一行显示统计
+        text_height = self.font_size + QFontMetrics(self._statsFont()).lineSpacing() + 16
+        height = max(notes_height, text_height) + self.MARGIN * 2
+        return QSize(option.rect.width(), height)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(painter.Antialiasing)
+        name_font, days_font, notes_font = self._fonts()
+
+        # 背景
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, self._color('task_selected'))
+        elif option.state & QStyle.State_MouseOver:
+            painter.fillRect(option.rect, self._color('task_hover'))
+
+        check_rect, text_rect, notes_rect = self._layout(option.rect)
+
+        # 复选框
+        checked = index.data(Qt.CheckStateRole) == Qt.Checked
+        painter.setPen(QPen(self._color('success' if checked else 'border'), 2))
+        painter.setBrush(self._color('success' if checked else 'base'))
+        painter.drawRoundedRect(check_rect, 3, 3)
+        if checked:
+            path = QPainterPath()
+            w, h = check_rect.width(), check_rect.height()
+            path.moveTo(check_rect.left() + w * 0.2, check_rect.top() + h * 0.5)
+            path.lineTo(check_rect.left() + w * 0.4, check_rect.top() + h * 0.7)
+            path.lineTo(check_rect.left() + w * 0.8, check_rect.top() + h * 0.3)
+            painter.setPen(QPen(QColor('white'), 2))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawPath(path)
+
+        # 有统计时任务名在上半部分，统计在下半部分
+        stats = index.data(TaskListModel.StatsRole)
+        if stats is not None:
+            stats_font = self._statsFont()
+            stats_height = QFontMetrics(stats_font).lineSpacing()
+            stats_rect = QRect(text_rect.left(), text_rect.center().y() + 2,
+                               text_rect.width(), stats_height)
+            text_rect = QRect(text_rect.left(), text_rect.top(), text_rect.width(),
+                              text_rect.height() // 2)
+            painter.setFont(stats_font)
+            painter.setPen(self._color('muted'))
+            stats_text = QFontMetrics(stats_font).elidedText(formatStats(stats), Qt.ElideRight,
+                                                             stats_rect.width())
+            painter.drawText(stats_rect, Qt.AlignLeft | Qt.AlignTop, stats_text)
+
+        # 任务名和天数（天数显示为红色加粗）
+        name = index.data(Qt.DisplayRole)
+        days_text = f" {index.data(TaskListModel.DaysRole)}天"
+        days_width = QFontMetrics(days_font).horizontalAdvance(days_text)
+        name_width = max(0, text_rect.width() - days_width)
+        painter.setFont(name_font)
+        painter.setPen(self._color('text'))
+        elided = QFontMetrics(name_font).elidedText(name, Qt.ElideRight, name_width)
+        painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignVCenter, elided)
+        used = QFontMetrics(name_font).horizontalAdvance(elided)
+        painter.setFont(days_font)
+        painter.setPen(self._color('danger'))
+        painter.drawText(text_rect.adjusted(used, 0, 0, 0), Qt.AlignLeft | Qt.AlignVCenter, days_text)
+
+        # 完成情况预览
+        painter.setPen(QPen(self._color('border'), 2))
+        painter.setBrush(self._color('base'))
+        painter.drawRoundedRect(notes_rect.adjusted(1, 1, -1, -1), 5, 5)
+        notes = index.data(TaskListModel.NotesRole)
+        painter.setFont(notes_font)
+        text_area = notes_rect.adjusted(8, 6, -8, -6)
+        if notes:
+            painter.setPen(self._color('text'))
+            painter.drawText(text_area, Qt.AlignLeft | Qt.AlignTop | Qt.TextWordWrap, notes)
+        else:
+            painter.setPen(self._color('muted'))
+            painter.drawText(text_area, Qt.AlignLeft | Qt.AlignTop, '完成情况...')
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        """点击复选框切换完成状态，点击完成情况框开始编辑"""
+        if event.type() not in (QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick):
+            return super().editorEvent(event, model, option, index)
+        if event.button() != Qt.LeftButton:
+            return False
+        check_rect, _, notes_rect = self._layout(option.rect)
+        if check_rect.adjusted(-4, -4, 4, 4).contains(event.pos()):
+            if event.type() == QEvent.MouseButtonRelease:
+                checked = index.data(Qt.CheckStateRole) == Qt.Checked
+                model.setData(index, Qt.Unchecked if checked else Qt.Checked, Qt.CheckStateRole)
+            return True
+        if notes_rect.contains(event.pos()) and option.widget is not None:
+            option.widget.setCurrentIndex(index)
+            option.widget.edit(index)
+            return True
+        return False
+
+    def createEditor(self, parent, option, index):
+        editor = NotesEdit(parent)
+        editor.setObjectName('notesEditor')
+        editor.setPlaceholderText('完成情况...')
+        # 输入时立即提交到模型（模型只标记脏数据，不写磁盘）
+        editor.textChanged.connect(lambda e=editor: self.commitData.emit(e))
+        editor.focusLost.connect(self.editingFinished)
+        return editor
+
+    def setEditorData(self, editor, index):
+        text = index.data(TaskListModel.NotesRole) or ''
+        if editor.toPlainText() != text:
+            editor.setPlainText(text)
+            editor.moveCursor(editor.textCursor().End)
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.toPlainText(), TaskListModel.NotesRole)
+
+    def updateEditorGeometry(self, editor, option, index):
+        _, _, notes_rect = self._layout(option.rect)
+        editor.setGeometry(notes_rect)
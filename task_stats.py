@@ -0,0 +1,209 @@
+from bisect import bisect_right
+from datetime import date
+
+# 统计完成率的时间窗口（天）
+WINDOWS = (7, 30, 365)
+
+
+def toOrdinal(date_str):
+    return date.fromisoformat(date_str).toordinal()
+
+
+class TaskStats:
+    """单个任务的打卡统计，增量维护
+
+    完成记录保存为按顺序排列的连续区间 starts/ends（日期序号，闭区间），
+    lengths 记录每种区间长度出现的次数，用来维护最长连续天数；
+    各时间窗口内的完成次数在打卡时直接加减。打卡和取消都只修改相邻的
+    一两个区间，不扫描历史。
+    """
+
+    def __init__(self, ordinals=(), today=None, start=None):
+        self.starts = []
+        self.ends = []
+        self.lengths = {}
+        self.longest = 0
+        self.total = 0
+        previous = None
+        for o in ordinals:
+            if o == previous:
+                continue
+            if previous is not None and o == previous + 1:
+                self.ends[-1] = o
+            else:
+                self.starts.append(o)
+                self.ends.append(o)
+            previous = o
+            self.total += 1
+        for s, e in zip(self.starts, self.ends):
+            self._addLength(e - s + 1)
+        self.start = start
+        self.setToday(today if today is not None else date.today().toordinal())
+
+    def setToday(self, today):
+        """日期变化后重新统计各时间窗口"""
+        self.today = today
+        self.window_counts = {w: self.countBetween(today - w + 1, today) for w in WINDOWS}
+
+    def _addLength(self, n):
+        self.lengths[n] = self.lengths.get(n, 0) + 1
+        if n > self.longest:
+            self.longest = n
+
+    def _removeLength(self, n):
+        count = self.lengths[n] - 1
+        if count:
+            self.lengths[n] = count
+        else:
+            del self.lengths[n]
+            if n == self.longest:
+                # 不同长度的个数很少，重新取最大值的代价可以忽略
+                self.longest = max(self.lengths, default=0)
+
+    def _find(self, o):
+        """包含 o 的区间下标，没有时返回 -1"""
+        i = bisect_right(self.starts, o) - 1
+        if i >= 0 and self.ends[i] >= o:
+            return i
+        return -1
+
+    def contains(self, o):
+        return self._find(o) >= 0
+
+    def _updateWindows(self, o, delta):
+        for w in WINDOWS:
+            if self.today - w < o <= self.today:
+                self.window_counts[w] += delta
+
+    def mark(self, o):
+        """标记某天完成，返回状态是否变化"""
+        if self._find(o) >= 0:
+            return False
+        i = bisect_right(self.starts, o)
+        joins_left = i > 0 and self.ends[i - 1] == o - 1
+        joins_right = i < len(self.starts) and self.starts[i] == o + 1
+        if joins_left and joins_right:
+            self._removeLength(self.ends[i - 1] - self.starts[i - 1] + 1)
+            self._removeLength(self.ends[i] - self.starts[i] + 1)
+            self.ends[i - 1] = self.ends[i]
+            del self.starts[i], self.ends[i]
+            self._addLength(self.ends[i - 1] - self.starts[i - 1] + 1)
+        elif joins_left:
+            self._removeLength(self.ends[i - 1] - self.starts[i - 1] + 1)
+            self.ends[i - 1] = o
+            self._addLength(o - self.starts[i - 1] + 1)
+        elif joins_right:
+            self._removeLength(self.ends[i] - self.starts[i] + 1)
+            self.starts[i] = o
+            self._addLength(self.ends[i] - o + 1)
+        else:
+            self.starts.insert(i, o)
+            self.ends.insert(i, o)
+            self._addLength(1)
+        self.total += 1
+        self._updateWindows(o, 1)
+        return True
+
+    def unmark(self, o):
+        """取消某天的完成，返回状态是否变化"""
+        i = self._find(o)
+        if i < 0:
+            return False
+        s, e = self.starts[i], self.ends[i]
+        self._removeLength(e - s + 1)
+        if s == e:
+            del self.starts[i], self.ends[i]
+        elif o == s:
+            self.starts[i] = o + 1
+        elif o == e:
+            self.ends[i] = o - 1
+        else:
+            # 从中间断开成两段
+            self.ends[i] = o - 1
+            self.starts.insert(i + 1, o + 1)
+            self.ends.insert(i + 1, e)
+        if o > s:
+            self._addLength(o - s)
+        if o < e:
+            self._addLength(e - o)
+        self.total -= 1
+        self._updateWindows(o, -1)
+        return True
+
+    def countBetween(self, first, last):
+        """[first, last] 内的完成天数"""
+        total = 0
+        i = max(bisect_right(self.starts, first) - 1, 0)
+        while i < len(self.starts) and self.starts[i] <= last:
+            lo, hi = max(self.starts[i], first), min(self.ends[i], last)
+            if lo <= hi:
+                total += hi - lo + 1
+            i += 1
+        return total
+
+    def currentStreak(self):
+        """到今天为止的连续天数；今天还没打卡时从昨天算起"""
+        for day in (self.today, self.today - 1):
+            i = self._find(day)
+            if i >= 0:
+                return day - self.starts[i] + 1
+        return 0
+
+    def rate(self, window):
+        """最近 window 天的完成率（初始日期之前的天数不计入）"""
+        days = window
+        if self.start is not None:
+            days = min(window, self.today - self.start + 1)
+        if days <= 0:
+            return 0.0
+        return self.window_counts[window] / days
+
+    def summary(self):
+        return {
+            'current': self.currentStreak(),
+            'longest': self.longest,
+            'total': self.total,
+            'rates': {w: self.rate(w) for w in WINDOWS},
+        }
+
+
+class StatsIndex:
+    """全部任务的统计，建立一次后随打卡增量更新"""
+
+    def __init__(self, completions, start_date, today=None):
+        # completions: {任务id: 按顺序排列的完成日期序号}
+        today = today if today is not None else date.today().toordinal()
+        self.start = toOrdinal(start_date)
+        self.today = today
+        self._stats = {task_id: TaskStats(ordinals, today, self.start)
+                       for task_id, ordinals in completions.items()}
+
+    def get(self, task_id):
+        return self._stats.get(task_id)
+
+    def setToday(self, today):
+        if today == self.today:
+            return
+        self.today = today
+        for stats in self._stats.values():
+            stats.setToday(today)
+
+    def setStart(self, start_date):
+        self.start = toOrdinal(start_date)
+        for stats in self._stats.values():
+            stats.start = self.start
+
+    def addTask(self, task_id, ordinals=()):
+        """添加任务（撤销删除时带上按顺序排列的完成日期序号）"""
+        if task_id not in self._stats:
+            self._stats[task_id] = TaskStats(ordinals, self.today, self.start)
+
+    def removeTask(self, task_id):
+        self._stats.pop(task_id, None)
+
+    def toggle(self, task_id, date_str, done):
+        stats = self._stats.get(task_id)
+        if stats is None:
+            return False
+        o = toOrdinal(date_str)
+        return stats.mark(o) if done else stats.unmark(o)
@@ -0,0 +1,343 @@
+from PyQt5.QtGui import QColor
+
+# 护眼配色
+EYE_CARE = {
+    'text': '#2C3E50',
+    'muted': '#95A5A6',
+    'border': '#BDC3C7',
+    'base': '#F0F4F8',
+    'accent': '#3498DB',
+    'accent_hover': '#2980B9',
+    'accent_pressed': '#1A5276',
+    'success': '#27AE60',
+    'success_hover': '#229954',
+    'danger': '#E74C3C',
+    'danger_hover': '#C0392B',
+    'warning': '#F39C12',
+    'warning_hover': '#D68910',
+    'calendar_hover': '#E67E22',
+    'task_frame': '#E8F6F3',
+    'task_title': '#16A085',
+    'task_list': '#D5F4E6',
+    'task_hover': '#B8E6D3',
+    'task_selected': '#A3E4D7',
+    'calendar_frame': '#FEF9E7',
+}
+
+THEMES = {
+    'eye_care': EYE_CARE,
+}
+
+
+def buildStyleSheet(c, font_size):
+    """根据配色和字体大小生成整个应用的样式表
+
+    控件通过 objectName 和 variant 动态属性选择样式，不再单独设置样式表。
+    """
+    small_size = max(10, font_size - 2)
+    return f'''
+        QMenuBar {{
+            background-color: {c['base']};
+            color: {c['text']};
+            font-size: 14px;
+            border-bottom: 1px solid {c['border']};
+        }}
+        QMenuBar::item {{
+            background-color: transparent;
+            padding: 5px 10px;
+            border-radius: 3px;
+        }}
+        QMenuBar::item:selected {{
+            background-color: {c['accent']};
+            color: white;
+        }}
+        QMenu {{
+            background-color: {c['base']};
+            color: {c['text']};
+            border: 1px solid {c['border']};
+            border-radius: 5px;
+            padding: 5px;
+        }}
+        QMenu::item {{
+            padding: 8px 20px;
+            border-radius: 3px;
+        }}
+        QMenu::item:selected {{
+            background-color: {c['accent']};
+            color: white;
+        }}
+        QMenu::separator {{
+            height: 1px;
+            background-color: {c['border']};
+            margin: 5px 0;
+        }}
+
+        QFrame#settingsFrame {{
+            background-color: {c['base']};
+            border-radius: 8px;
+            padding: 5px;
+        }}
+        QLabel#startDateLabel {{
+            color: {c['text']};
+            font-weight: bold;
+        }}
+        QLineEdit#startDateEdit {{
+            background-color: {c['base']};
+            border: 2px solid {c['border']};
+            border-radius: 5px;
+            padding: 5px;
+            color: {c['text']};
+        }}
+        QLabel#titleLabel {{
+            color: {c['text']};
+            padding: 5px;
+        }}
+        QLabel#dayCountLabel {{
+            color: {c['success']};
+            font-weight: bold;
+            padding: 5px;
+        }}
+
+        QFrame#taskFrame {{
+            background-color: {c['task_frame']};
+            border-radius: 8px;
+            padding: 10px;
+        }}
+        QLabel#taskTitle {{
+            color: {c['task_title']};
+            padding: 2px;
+        }}
+        QListView#taskList {{
+            background-color: {c['task_list']};
+            border: 2px solid {c['border']};
+            border-radius: 5px;
+            padding: 5px;
+        }}
+        QTextEdit#notesEditor {{
+            background-color: {c['base']};
+            border: 2px solid {c['accent']};
+            border-radius: 5px;
+            padding: 5px;
+            color: {c['text']};
+            font-size: {small_size}px;
+        }}
+
+        QPushButton[variant="success"], QPushButton[variant="danger"], QPushButton[variant="warning"] {{
+            color: white;
+            border: none;
+            border-radius: 5px;
+            padding: 10px 20px;
+            font-weight: bold;
+        }}
+        QPushButton[variant="success"] {{ background-color: {c['success']}; }}
+        QPushButton[variant="success"]:hover {{ background-color: {c['success_hover']}; }}
+        QPushButton[variant="danger"] {{ background-color: {c['danger']}; }}
+        QPushButton[variant="danger"]:hover {{ background-color: {c['danger_hover']}; }}
+        QPushButton[variant="warning"] {{ background-color: {c['warning']}; }}
+        QPushButton[variant="warning"]:hover {{ background-color: {c['warning_hover']}; }}
+
+        QFrame#calendarFrame {{
+            background-color: {c['calendar_frame']};
+            border-radius: 8px;
+            padding: 10px;
+        }}
+        QLabel#calendarTitle {{
+            color: {c['warning']};
+            padding: 0px;
+            margin: 0px;
+        }}
+        QCalendarWidget {{
+            background-color: {c['base']};
+            border: 2px solid {c['warning']};
+            border-radius: 5px;
+        }}
+        QCalendarWidget QTableView {{
+            background-color: {c['base']};
+            selection-background-color: {c['warning']};
+            selection-color: white;
+            alternate-background-color: {c['calendar_frame']};
+            font-size: {small_size}px;
+        }}
+        QCalendarWidget QToolButton {{
+            background-color: {c['warning']};
+            color: white;
+            border: none;
+            border-radius: 4px;
+            padding: 5px;
+            font-weight: bold;
+            font-size: {max(10, font_size - 1)}px;
+        }}
+        QCalendarWidget QToolButton:hover {{
+            background-color: {c['calendar_hover']};
+        }}
+        QCalendarWidget QSpinBox {{
+            background-color: {c['base']};
+            border: 1px solid {c['border']};
+            border-radius: 3px;
+            padding: 2px;
+            color: {c['text']};
+            font-size: {small_size}px;
+        }}
+
+        QMessageBox {{
+            background-color: {c['base']};
+        }}
+        QMessageBox QLabel {{
+            color: {c['text']};
+            font-size: 12px;
+        }}
+        QMessageBox QPushButton {{
+            background-color: {c['accent']};
+            color: white;
+            border: none;
+            border-radius: 5px;
+            padding: 8px 15px;
+            font-weight: bold;
+            min-width: 80px;
+        }}
+        QMessageBox QPushButton:hover {{
+            background-color: {c['accent_hover']};
+        }}
+        QMessageBox[variant="danger"] QPushButton {{
+            background-color: {c['danger']};
+        }}
+        QMessageBox[variant="danger"] QPushButton:hover {{
+            background-color: {c['danger_hover']};
+        }}
+
+        QInputDialog {{
+            background-color: {c['base']};
+        }}
+        QInputDialog QLabel {{
+            color: {c['text']};
+            font-size: 14px;
+            font-weight: bold;
+        }}
+        QInputDialog QLineEdit {{
+            background-color: {c['base']};
+            border: 2px solid {c['accent']};
+            border-radius: 5px;
+            padding: 8px;
+            color: {c['text']};
+            font-size: 14px;
+            min-height: 30px;
+        }}
+        QInputDialog QLineEdit:focus {{
+            border: 2px solid {c['accent_hover']};
+        }}
+        QInputDialog QDialogButtonBox QPushButton {{
+            background-color: {c['accent']};
+            color: white;
+            border: none;
+            border-radius: 5px;
+            padding: 10px 25px;
+            font-weight: bold;
+            font-size: 14px;
+            min-width: 80px;
+            min-height: 35px;
+        }}
+        QInputDialog QDialogButtonBox QPushButton:hover {{
+            background-color: {c['accent_hover']};
+        }}
+        QInputDialog QDialogButtonBox QPushButton:pressed {{
+            background-color: {c['accent_pressed']};
+        }}
+
+        QFontDialog {{
+            background-color: {c['base']};
+        }}
+        QFontDialog QLabel {{
+            color: {c['text']};
+        }}
+        QFontDialog QGroupBox {{
+            color: {c['text']};
+            border: 1px solid {c['border']};
+            border-radius: 5px;
+            margin-top: 10px;
+            padding-top: 10px;
+            font-weight: bold;
+        }}
+        QFontDialog QGroupBox::title {{
+            subcontrol-origin: margin;
+            left: 10px;
+            padding: 0 3px;
+        }}
+        QFontDialog QLineEdit, QFontDialog QComboBox {{
+            background-color: {c['base']};
+            border: 2px solid {c['border']};
+            border-radius: 5px;
+            padding: 5px;
+            color: {c['text']};
+        }}
+        QFontDialog QComboBox QAbstractItemView {{
+            background-color: {c['base']};
+            border: 2px solid {c['border']};
+            border-radius: 5px;
+            selection-background-color: {c['accent']};
+            selection-color: white;
+        }}
+        QFontDialog QListView {{
+            background-color: {c['base']};
+            border: 2px solid {c['border']};
+            border-radius: 5px;
+            color: {c['text']};
+        }}
+        QFontDialog QListView::item {{
+            padding: 5px;
+        }}
+        QFontDialog QListView::item:selected {{
+            background-color: {c['accent']};
+            color: white;
+        }}
+        QFontDialog QDialogButtonBox QPushButton {{
+            background-color: {c['accent']};
+            color: white;
+            border: none;
+            border-radius: 5px;
+            padding: 8px 15px;
+            font-weight: bold;
+            min-width: 80px;
+        }}
+        QFontDialog QDialogButtonBox QPushButton:hover {{
+            background-color: {c['accent_hover']};
+        }}
+    '''
+
+
+class ThemeManager:
+    """应用级样式表：只在配色或字体大小变化时重新生成并设置一次"""
+
+    def __init__(self, app, theme='eye_care', font_size=14):
+        self.app = app
+        self.theme = theme
+        self.font_size = font_size
+        self.rebuilds = 0
+        self._stylesheet = None
+
+    def colors(self):
+        return THEMES[self.theme]
+
+    def color(self, name):
+        return QColor(self.colors()[name])
+
+    def apply(self, theme=None, font_size=None):
+        """切换配色或字体大小，没有变化时不做任何事"""
+        theme = theme or self.theme
+        font_size = font_size or self.font_size
+        if self._stylesheet is not None and (theme, font_size) == (self.theme, self.font_size):
+            return False
+        self.theme = theme
+        self.font_size = font_size
+        self._stylesheet = buildStyleSheet(self.colors(), font_size)
+        self.app.setStyleSheet(self._stylesheet)
+        self.rebuilds += 1
+        return True
+
+    def stylesheet(self):
+        return self._stylesheet
+
+
+def setVariant(widget, variant):
+    """设置控件的样式变体（对应样式表中的 [variant="..."]）"""
+    widget.setProperty('variant', variant)
+    return widget
@@ -0,0 +1,149 @@
+from collections import deque
+
+# 每种修改的名称（撤销/重做菜单中显示）
+LABELS = {
+    'done': '打卡',
+    'note': '修改完成情况',
+    'add': '添加任务',
+    'delete': '删除任务',
+    'rename': '修改任务名',
+    'start': '修改初始日期',
+}
+
+
+class UndoLog:
+    """撤销/重做的命令日志，只记录修改前后的差异
+
+    每条差异是一个元组：
+        ('done', 任务id, 日期, 新状态)            原状态是 not 新状态
+        ('note', 任务id, 日期, 原内容, 新内容)
+        ('rename', 任务id, 原名称, 新名称)
+        ('start', 原日期, 新日期)
+        ('add', 任务id, 名称)
+        ('delete', 任务（exportTask() 的格式）, 位置)
+    一次用户操作（一次打卡、一次补打卡、一次删除）是一条命令，包含一条或多条差异。
+    删除任务要保存它的全部打卡记录和完成情况，其他差异只有几个字段。
+
+    最多保留 max_commands 条命令，差异（删除任务按记录条数计）超过 max_deltas
+    时丢掉最早的命令；单条命令超过 max_deltas 时（例如导入大量历史）不能撤销。
+    """
+
+    def __init__(self, max_commands=100, max_deltas=100000):
+        self.max_commands = max_commands
+        self.max_deltas = max_deltas
+        self._undo = deque()
+        self._redo = []
+        self._size = 0
+        self._group = None
+        self._group_size = 0
+        self._depth = 0
+        # 当前这组修改超过了 max_deltas，结束时不能作为一条命令撤销
+        self._oversized = False
+
+    @staticmethod
+    def _weight(deltas):
+        size = 0
+        for delta in deltas:
+            if delta[0] == 'delete':
+                size += 1 + len(delta[1]['completed']) + len(delta[1]['notes'])
+            else:
+                size += 1
+        return size
+
+    # 记录
+
+    def begin(self):
+        """开始一组修改（ClockInStore.batch()），end() 时合并成一条命令"""
+        if self._depth == 0:
+            self._group = []
+            self._group_size = 0
+            self._oversized = False
+        self._depth += 1
+
+    def end(self):
+        self._depth -= 1
+        if self._depth == 0:
+            group, self._group = self._group, None
+            if self._oversized:
+                # 只撤销一部分会留下不一致的数据，之前的命令也不再有效
+                self._oversized = False
+                self.clear()
+            elif group:
+                self._push(group)
+
+    def record(self, delta):
+        if self._group is not None:
+            if self._oversized:
+                return
+            self._group.append(delta)
+            self._group_size += self._weight((delta,))
+            if self._group_size > self.max_deltas:
+                self._oversized = True
+                self._group = []
+            return
+        last = self._undo[-1] if self._undo and not self._redo else None
+        if (delta[0] == 'note' and last is not None and len(last) == 1 and last[0][0] == 'note'
+                and last[0][1:3] == delta[1:3]):
+            # 连续编辑同一条完成情况合并成一条，撤销时回到编辑前的内容
+            last[0] = ('note', delta[1], delta[2], last[0][3], delta[4])
+            return
+        self._push([delta])
+
+    def _push(self, deltas):
+        self._redo.clear()
+        weight = self._weight(deltas)
+        if weight > self.max_deltas:
+            self.clear()
+            return
+        self._undo.append(deltas)
+        self._size += weight
+        while len(self._undo) > self.max_commands or self._size > self.max_deltas:
+            self._size -= self._weight(self._undo.popleft())
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._size = 0
+
+    # 撤销和重做
+
+    def canUndo(self):
+        return bool(self._undo)
+
+    def canRedo(self):
+        return bool(self._redo)
+
+    def undoLabel(self):
+        return self.label(self._undo[-1]) if self._undo else ''
+
+    def redoLabel(self):
+        return self.label(self._redo[-1]) if self._redo else ''
+
+    @staticmethod
+    def label(deltas):
+        kinds = {delta[0] for delta in deltas}
+        if len(kinds) > 1:
+            return '批量修改'
+        kind = kinds.pop()
+        if kind == 'done' and len(deltas) > 1:
+            return '批量打卡'
+        return LABELS[kind]
+
+    def popUndo(self):
+        """取出最近的命令（按记录顺序的差异列表），撤销后用 pushRedo() 放回"""
+        if not self._undo:
+            return None
+        deltas = self._undo.pop()
+        self._size -= self._weight(deltas)
+        return deltas
+
+    def pushRedo(self, deltas):
+        self._redo.append(deltas)
+
+    def popRedo(self):
+        return self._redo.pop() if self._redo else None
+
+    def pushUndo(self, deltas):
+        """重做后放回撤销列表（不清空重做列表）"""
+        self._undo.append(deltas)
+        self._size += self._weight(deltas)